@@ -1,17 +1,27 @@
 """
 Caching layer for harmony solutions.
+
+Uses redis.asyncio so cache round trips do not block the event loop.
 """
 import hashlib
-import json
-from typing import Optional, Dict, List
-import redis
+import struct
+import msgpack
+import orjson
+from array import array
+from typing import Optional, Dict, List, Tuple
+import redis.asyncio as redis
 import os
 from functools import lru_cache
+from collections import OrderedDict
 
 # Redis connection pool for better performance
 redis_pool = None
 redis_client = None
 
+# Connections per worker process; total connections to Redis are
+# REDIS_POOL_SIZE multiplied by the number of uvicorn workers
+REDIS_POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', '16'))
+
 def get_redis_pool():
     """Get or create Redis connection pool."""
     global redis_pool
@@ -19,9 +29,12 @@ def get_redis_pool():
         redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
         redis_pool = redis.ConnectionPool.from_url(
             redis_url,
-            decode_responses=True,
-            max_connections=50,
-            retry_on_timeout=True
+            decode_responses=False,
+            max_connections=REDIS_POOL_SIZE,
+            retry_on_timeout=True,
+            socket_keepalive=True,
+            socket_timeout=1.0,
+            health_check_interval=30
         )
     return redis_pool
 
@@ -33,50 +46,235 @@ def get_redis_client():
         redis_client = redis.Redis(connection_pool=pool)
     return redis_client
 
+async def close_redis_client():
+    """Close the Redis client and disconnect its connection pool."""
+    global redis_pool, redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+    redis_client = None
+    redis_pool = None
+
+
+# Bump the version whenever the stored value format changes so that
+# entries written in the old format are never decoded
+CACHE_KEY_PREFIX = "harmony:v2:"
+
+
+def _encode_value(value) -> bytes:
+    """Encode a cache key parameter into tagged, length-prefixed bytes.
+    
+    MIDI note lists (the common case) are packed as signed 16-bit ints,
+    strings as UTF-8. Anything else falls back to canonical JSON.
+    """
+    if isinstance(value, str):
+        data = value.encode()
+        return b's' + struct.pack('<I', len(data)) + data
+    if isinstance(value, (list, tuple)):
+        if all(type(v) is int for v in value):
+            try:
+                data = array('h', value).tobytes()
+                return b'i' + struct.pack('<I', len(value)) + data
+            except OverflowError:
+                pass
+        elif all(isinstance(v, str) for v in value):
+            return b'l' + struct.pack('<I', len(value)) + b''.join(_encode_value(v) for v in value)
+    data = orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    return b'j' + struct.pack('<I', len(data)) + data
+
+
+def _freeze(value):
+    """Convert a parameter into a hashable equivalent (lists become tuples)."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _cache_key_inner(operation: str, frozen_items: tuple) -> str:
+    """Hash an operation and its sorted, frozen parameters into a cache key."""
+    parts = [_encode_value(operation)]
+    for name, value in frozen_items:
+        parts.append(_encode_value(name))
+        parts.append(_encode_value(value))
+    key_bytes = b''.join(parts)
+    return f"{CACHE_KEY_PREFIX}{hashlib.blake2b(key_bytes, digest_size=16).hexdigest()}"
 
-# In-memory cache for cache keys (since they're already hashed strings)
-_cache_key_cache = {}
 
 def cache_key(operation: str, **kwargs) -> str:
     """Generate cache key from operation and parameters.
     
-    Note: We can't use @lru_cache with **kwargs because dicts are not hashable.
-    Instead, we use a simple in-memory cache keyed by the JSON string representation.
+    Parameters are written in sorted order into a compact binary form and
+    hashed with BLAKE2b, which avoids the JSON round trip for the usual
+    bass_line/chord_types payloads. Keys are memoized in a bounded LRU
+    keyed by the frozen parameters.
     """
-    key_data = {
-        'operation': operation,
-        **kwargs
-    }
-    key_string = json.dumps(key_data, sort_keys=True)
-    
-    # Simple in-memory cache for the final hash
-    if key_string not in _cache_key_cache:
-        _cache_key_cache[key_string] = f"harmony:{hashlib.md5(key_string.encode()).hexdigest()}"
+    frozen_items = tuple(sorted((name, _freeze(value)) for name, value in kwargs.items()))
+    return _cache_key_inner(operation, frozen_items)
+
+
+# Entries for prefixes of a bass line (see step_cache_keys) have their own
+# namespace, apart from the whole results keyed by cache_key
+STEP_KEY_PREFIX = f"{CACHE_KEY_PREFIX}step:"
+
+
+def step_cache_keys(operation: str, bass_line: List[int], chord_types: List[str],
+                    interval: int = 1) -> List[str]:
+    """Generate cache keys for every interval-th prefix of a bass line.
     
-    return _cache_key_cache[key_string]
+    Key k (0-based) identifies bass_line[:(k + 1) * interval] together with
+    the chord types of those steps. A single running BLAKE2b digest is
+    extended one step at a time and read at each key, so all keys cost
+    one pass over the bass line rather than hashing each prefix again.
+    """
+    hasher = hashlib.blake2b(_encode_value(operation), digest_size=16)
+    num_chord_types = len(chord_types)
+    keys = []
+    for i, bass_note in enumerate(bass_line):
+        # Steps past the end of chord_types are tagged apart from any type
+        hasher.update(_encode_value(bass_note))
+        hasher.update(_encode_value(chord_types[i] if i < num_chord_types else None))
+        if (i + 1) % interval == 0:
+            keys.append(f"{STEP_KEY_PREFIX}{hasher.hexdigest()}")
+    return keys
 
 
-def get_cached_solution(operation: str, **kwargs) -> Optional[Dict]:
-    """Get cached solution if exists."""
+# Process-local LRU of decoded solutions in front of Redis. Solutions are
+# deterministic for a given key, so entries never go stale. Step entries
+# stay in Redis only: one long bass line would otherwise evict every
+# whole result.
+L1_CACHE_SIZE = 1024
+_L1: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+def _l1_get(key: str) -> Optional[Dict]:
+    """Get a decoded solution from the local LRU."""
+    solution = _L1.get(key)
+    if solution is not None:
+        _L1.move_to_end(key)
+    return solution
+
+
+def _l1_put(key: str, solution: Dict):
+    """Store a decoded solution in the local LRU (step entries are not kept)."""
+    if key.startswith(STEP_KEY_PREFIX):
+        return
+    _L1[key] = solution
+    _L1.move_to_end(key)
+    if len(_L1) > L1_CACHE_SIZE:
+        _L1.popitem(last=False)
+
+
+def _pack(solution: Dict) -> bytes:
+    """Encode a solution for storage in Redis."""
+    return msgpack.packb(solution, use_bin_type=True)
+
+
+def _unpack(cached: bytes) -> Dict:
+    """Decode a solution stored in Redis."""
+    return msgpack.unpackb(cached, raw=False)
+
+
+async def get_by_key(key: str) -> Optional[Dict]:
+    """Get cached solution for a key computed with cache_key."""
+    solution = _l1_get(key)
+    if solution is not None:
+        return solution
     try:
         client = get_redis_client()
-        key = cache_key(operation, **kwargs)
-        cached = client.get(key)
+        cached = await client.get(key)
         if cached:
-            return json.loads(cached)
+            solution = _unpack(cached)
+            _l1_put(key, solution)
+            return solution
     except Exception as e:
         # If Redis fails, continue without cache
         print(f"Cache error: {e}")
     return None
 
 
-def cache_solution(operation: str, solution: Dict, ttl: int = 3600, **kwargs):
-    """Cache solution with TTL."""
+async def set_by_key(key: str, solution: Dict, ttl: int = 3600):
+    """Cache solution with TTL under a key computed with cache_key."""
+    _l1_put(key, solution)
     try:
         client = get_redis_client()
-        key = cache_key(operation, **kwargs)
-        client.setex(key, ttl, json.dumps(solution))
+        await client.set(key, _pack(solution), ex=ttl)
     except Exception as e:
         # If Redis fails, continue without cache
         print(f"Cache error: {e}")
 
+
+async def mget_by_keys(keys: List[str]) -> List[Optional[Dict]]:
+    """Get several cached solutions in a single pipelined round trip.
+    
+    Entries found in the local LRU are not requested from Redis.
+    
+    Args:
+        keys: cache keys computed with cache_key
+    
+    Returns:
+        List with the cached solution or None for each key
+    """
+    if not keys:
+        return []
+    results = [_l1_get(key) for key in keys]
+    missing = [i for i, solution in enumerate(results) if solution is None]
+    if not missing:
+        return results
+    try:
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for i in missing:
+            pipe.get(keys[i])
+        for i, cached in zip(missing, await pipe.execute()):
+            if cached:
+                results[i] = _unpack(cached)
+                _l1_put(keys[i], results[i])
+    except Exception as e:
+        # If Redis fails, continue without cache
+        print(f"Cache error: {e}")
+    return results
+
+
+async def mset_by_keys(items: List[Tuple[str, Dict]], ttl: int = 3600):
+    """Cache several solutions with TTL in a single pipelined round trip.
+    
+    Args:
+        items: list of (key, solution) pairs
+        ttl: time to live in seconds
+    """
+    if not items:
+        return
+    try:
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for key, solution in items:
+            _l1_put(key, solution)
+            pipe.set(key, _pack(solution), ex=ttl)
+        await pipe.execute()
+    except Exception as e:
+        # If Redis fails, continue without cache
+        print(f"Cache error: {e}")
+
+
+async def get_cached_solution(operation: str, **kwargs) -> Optional[Dict]:
+    """Get cached solution if exists."""
+    return await get_by_key(cache_key(operation, **kwargs))
+
+
+async def cache_solution(operation: str, solution: Dict, ttl: int = 3600, **kwargs):
+    """Cache solution with TTL."""
+    await set_by_key(cache_key(operation, **kwargs), solution, ttl)
+
+
+async def mget_cached(ops_and_kwargs: List[Tuple[str, Dict]]) -> List[Optional[Dict]]:
+    """Get several cached solutions by (operation, kwargs) pairs."""
+    return await mget_by_keys([cache_key(operation, **kwargs) for operation, kwargs in ops_and_kwargs])
+
+
+async def mset_cached(items: List[Tuple[str, Dict, Dict]], ttl: int = 3600):
+    """Cache several solutions given as (operation, solution, kwargs) triples."""
+    await mset_by_keys([(cache_key(operation, **kwargs), solution) for operation, solution, kwargs in items], ttl)
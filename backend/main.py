@@ -1,35 +1,104 @@
 """
 FastAPI backend for harmony exercise solver.
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Iterable, List, Optional, Dict
+import orjson
 import sys
 import os
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from harmonizer import Harmonizer
-from exercises import ExerciseSolver, ExerciseType
+from exercises import MelodyHarmonizer, CounterpointSolver
+from enhanced_validator import EnhancedValidator
+from harmonic_functions import parse_harmonic_sequence
+from prechecker import Prechecker
+from corrector import Corrector
+from solver import BeamSearchSolver, Solution
 from music_utils import Voice
 try:
-    from backend.middleware import RateLimitMiddleware, MonitoringMiddleware
-    from backend.cache import get_cached_solution, cache_solution
+    from backend.middleware import ObservabilityMiddleware
+    from backend.cache import (
+        get_redis_client, close_redis_client,
+        cache_key, step_cache_keys, get_by_key, mget_by_keys, mset_by_keys
+    )
 except ImportError:
     # Fallback for direct execution
-    from middleware import RateLimitMiddleware, MonitoringMiddleware
-    from cache import get_cached_solution, cache_solution
+    from middleware import ObservabilityMiddleware
+    from cache import (
+        get_redis_client, close_redis_client,
+        cache_key, step_cache_keys, get_by_key, mget_by_keys, mset_by_keys
+    )
 
 # Environment variables
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+
+# Solvers and validators keep no per-request state, so they are built
+# once per worker instead of on every request
+SOLVER = BeamSearchSolver()
+MELODY_HARMONIZER = MelodyHarmonizer()
+VALIDATOR = EnhancedValidator()
+PRECHECKER = Prechecker()
+CORRECTOR = Corrector()
+_COUNTERPOINT_SOLVERS: Dict[int, CounterpointSolver] = {}
+
+# Steps of a harmonization cached together under one bass line prefix; a
+# request writes one step entry per this many steps, not one per step
+STEP_CACHE_INTERVAL = 16
+
+
+def get_counterpoint_solver(species: int) -> CounterpointSolver:
+    """Get the shared counterpoint solver for a species."""
+    solver = _COUNTERPOINT_SOLVERS.get(species)
+    if solver is None:
+        solver = _COUNTERPOINT_SOLVERS[species] = CounterpointSolver(species=species)
+    return solver
+
+
+_S, _A, _T, _B = Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS
+
+
+def to_satb(voices: Dict[Voice, int]) -> Dict[str, int]:
+    """Convert internal voices to the API's S/A/T/B format (missing voices are 0)."""
+    return {"S": voices.get(_S, 0), "A": voices.get(_A, 0), "T": voices.get(_T, 0), "B": voices.get(_B, 0)}
+
+
+def from_satb(voices: Dict[str, int]) -> Dict[Voice, int]:
+    """Convert S/A/T/B voices from the API to the internal format (missing voices are 0)."""
+    return {_S: voices.get("S", 0), _A: voices.get("A", 0), _T: voices.get("T", 0), _B: voices.get("B", 0)}
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson."""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Redis pool at startup and close it at shutdown."""
+    # Pre-warm a pooled connection so the first request skips the handshake
+    try:
+        await get_redis_client().ping()
+    except Exception as e:
+        print(f"Redis unavailable at startup: {e}")
+    yield
+    await close_redis_client()
+
+
 app = FastAPI(
     title="Harmony Exercise Solver API",
+    lifespan=lifespan,
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if ENVIRONMENT != "production" else None,
     redoc_url="/redoc" if ENVIRONMENT != "production" else None
 )
@@ -58,40 +127,50 @@ else:
     )
 
 # Rate limiting and monitoring
-if ENVIRONMENT == "production":
-    app.add_middleware(RateLimitMiddleware)
-app.add_middleware(MonitoringMiddleware)
+app.add_middleware(ObservabilityMiddleware, rate_limit=ENVIRONMENT == "production")
+
+
+# MIDI note number; the lookup tables behind the constraint checks
+# (music_utils.PC_TABLE and the interval tables) only cover this range
+MidiNote = Annotated[int, Field(ge=0, le=127)]
+
+
+def check_midi_notes(notes: Iterable) -> None:
+    """Reject a request with a 422 unless every note is a MIDI note number (0-127)."""
+    for note in notes:
+        if not isinstance(note, int) or not 0 <= note <= 127:
+            raise HTTPException(status_code=422, detail=f"Invalid MIDI note: {note!r}")
 
 
 class VoiceInput(BaseModel):
     """Input for a single voice."""
-    notes: List[int]  # MIDI notes
+    notes: List[MidiNote]  # MIDI notes
     voice: str  # "S", "A", "T", "B"
 
 
 class HarmonizeRequest(BaseModel):
     """Request for harmonization."""
-    bass_line: List[int]  # MIDI notes for bass
+    bass_line: List[MidiNote]  # MIDI notes for bass
     chord_types: Optional[List[str]] = None
     exercise_type: str = "bass_figured"
 
 
 class MelodyHarmonizeRequest(BaseModel):
     """Request for melody harmonization."""
-    melody: List[int]  # MIDI notes for soprano
+    melody: List[MidiNote]  # MIDI notes for soprano
     chord_types: Optional[List[str]] = None
 
 
 class CounterpointRequest(BaseModel):
     """Request for counterpoint."""
-    cantus_firmus: List[int]  # MIDI notes
+    cantus_firmus: List[MidiNote]  # MIDI notes
     above: bool = True
     species: int = 1
 
 
 class ErrorCheckRequest(BaseModel):
     """Request for error checking."""
-    voices: List[Dict[str, List[int]]]  # List of voice dictionaries
+    voices: List[Dict[str, List[MidiNote]]]  # List of voice dictionaries
 
 
 class MusicSettings(BaseModel):
@@ -117,9 +196,8 @@ async def health_check():
     """Health check endpoint for load balancers."""
     try:
         # Check Redis connection
-        from cache import get_redis_client
         client = get_redis_client()
-        client.ping()
+        await client.ping()
         redis_status = "ok"
     except:
         redis_status = "unavailable"
@@ -140,27 +218,38 @@ async def harmonize(request: HarmonizeRequest):
             "bass_line": request.bass_line,
             "chord_types": request.chord_types or []
         }
-        cached = get_cached_solution("harmonize", **cache_key_data)
+        # The key is computed once and reused for the lookup and the write
+        result_key = cache_key("harmonize", **cache_key_data)
+        cached = await get_by_key(result_key)
         if cached:
-            return JSONResponse(content=cached, headers={"X-Cache": "HIT"})
-        
-        harmonizer = Harmonizer()
+            return ORJSONResponse(content=cached, headers={"X-Cache": "HIT"})
         
-        # Convert bass line to temporary MusicXML for processing
-        # For now, we'll work directly with MIDI notes
-        # In a full implementation, we'd create MusicXML from MIDI
-        
-        # Create a simple solution using the solver directly
-        from solver import BeamSearchSolver
-        solver = BeamSearchSolver()
+        # Work directly with MIDI notes using the shared solver
+        solver = SOLVER
         
         solutions = []
         prev_solutions = []
         
-        for bass_note in request.bass_line:
-            chord_type = "major"
-            if request.chord_types and len(solutions) < len(request.chord_types):
-                chord_type = request.chord_types[len(solutions)]
+        # Every STEP_CACHE_INTERVAL steps, the steps solved since the last
+        # such point are cached under the bass/chord prefix so far, so a
+        # request that extends an earlier one resumes from the longest
+        # cached prefix. All prefixes are looked up in one round trip.
+        chord_types = request.chord_types or []
+        step_keys = step_cache_keys("harmonize_step", request.bass_line, chord_types,
+                                    STEP_CACHE_INTERVAL)
+        for cached_steps in await mget_by_keys(step_keys):
+            if cached_steps is None:
+                break
+            solutions.extend(from_satb(voices) for voices in cached_steps["voices"])
+        cached_steps_count = len(solutions)
+        if solutions:
+            prev_solutions = [Solution(voices=solutions[-1], score=0.0, violations=[])]
+        
+        num_chord_types = len(chord_types)
+        bass_line = request.bass_line
+        for i in range(cached_steps_count, len(bass_line)):
+            bass_note = bass_line[i]
+            chord_type = chord_types[i] if i < num_chord_types else "major"
             
             step_solutions = solver.solve_step(bass_note, prev_solutions, chord_type)
             if step_solutions:
@@ -169,11 +258,8 @@ async def harmonize(request: HarmonizeRequest):
                 prev_solutions = step_solutions[:1]
             else:
                 # Fallback - create a solution and update prev_solutions
-                from solver import Solution
                 if prev_solutions:
-                    prev_voices = prev_solutions[0].voices.copy()
-                    prev_voices[Voice.BASS] = bass_note
-                    fallback_voices = prev_voices
+                    fallback_voices = {**prev_solutions[0].voices, Voice.BASS: bass_note}
                 else:
                     fallback_voices = {
                         Voice.SOPRANO: bass_note + 12,
@@ -194,14 +280,7 @@ async def harmonize(request: HarmonizeRequest):
                 prev_solutions = [fallback_solution]
         
         # Convert to response format
-        result = []
-        for sol in solutions:
-            result.append({
-                "S": sol.get(Voice.SOPRANO, 0),
-                "A": sol.get(Voice.ALTO, 0),
-                "T": sol.get(Voice.TENOR, 0),
-                "B": sol.get(Voice.BASS, 0)
-            })
+        result = [to_satb(sol) for sol in solutions]
         
         response_data = {
             "success": True,
@@ -209,10 +288,13 @@ async def harmonize(request: HarmonizeRequest):
             "explanations": "Harmonization completed successfully."
         }
         
-        # Cache the result
-        cache_solution("harmonize", response_data, ttl=3600, **cache_key_data)
+        # Cache the result and the newly solved steps in one pipeline
+        await mset_by_keys([(result_key, response_data)] + [
+            (step_keys[k], {"voices": result[k * STEP_CACHE_INTERVAL:(k + 1) * STEP_CACHE_INTERVAL]})
+            for k in range(cached_steps_count // STEP_CACHE_INTERVAL, len(step_keys))
+        ], ttl=3600)
         
-        return JSONResponse(content=response_data, headers={"X-Cache": "MISS"})
+        return ORJSONResponse(content=response_data, headers={"X-Cache": "MISS"})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -222,18 +304,9 @@ async def harmonize(request: HarmonizeRequest):
 async def harmonize_melody(request: MelodyHarmonizeRequest):
     """Harmonize a melody."""
     try:
-        from exercises import MelodyHarmonizer
-        harmonizer = MelodyHarmonizer()
-        solutions = harmonizer.harmonize_melody(request.melody, request.chord_types)
+        solutions = MELODY_HARMONIZER.harmonize_melody(request.melody, request.chord_types)
         
-        result = []
-        for sol in solutions:
-            result.append({
-                "S": sol.get(Voice.SOPRANO, 0),
-                "A": sol.get(Voice.ALTO, 0),
-                "T": sol.get(Voice.TENOR, 0),
-                "B": sol.get(Voice.BASS, 0)
-            })
+        result = [to_satb(sol) for sol in solutions]
         
         return {
             "success": True,
@@ -248,8 +321,7 @@ async def harmonize_melody(request: MelodyHarmonizeRequest):
 async def counterpoint(request: CounterpointRequest):
     """Generate counterpoint."""
     try:
-        from exercises import CounterpointSolver
-        solver = CounterpointSolver(species=request.species)
+        solver = get_counterpoint_solver(request.species)
         solutions = solver.solve_species_1(request.cantus_firmus, request.above)
         
         result = []
@@ -271,28 +343,21 @@ async def counterpoint(request: CounterpointRequest):
 @app.post("/api/check-errors")
 async def check_errors(request: Dict):
     """Enhanced error checking with detailed reports."""
+    voices_list = request.get("voices", [])
+    # Checked outside the try, which turns every error into a 500
+    for voice_dict in voices_list:
+        if isinstance(voice_dict, dict):
+            check_midi_notes(voice_dict[name] for name in "SATB" if name in voice_dict)
+    
     try:
-        from enhanced_validator import EnhancedValidator
-        from music_utils import Voice
-        
-        voices_list = request.get("voices", [])
-        
         # Convert to internal format
-        internal_voices = []
-        for voice_dict in voices_list:
-            # Initialize all four voices with default value 0 to maintain backward compatibility
-            internal_voice = {
-                Voice.SOPRANO: voice_dict.get("S", 0),
-                Voice.ALTO: voice_dict.get("A", 0),
-                Voice.TENOR: voice_dict.get("T", 0),
-                Voice.BASS: voice_dict.get("B", 0)
-            }
-            internal_voices.append(internal_voice)
+        # Initialize all four voices with default value 0 to maintain backward compatibility
+        internal_voices = [from_satb(voice_dict) for voice_dict in voices_list]
         
-        validator = EnhancedValidator()
+        validator = VALIDATOR
         result = validator.validate_harmony(internal_voices)
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "success": True,
             "valid": result["valid"],
             "errors": result["errors"],
@@ -309,11 +374,6 @@ async def check_errors(request: Dict):
 async def harmonize_functions(request: Dict):
     """Harmonize using harmonic functions (T, S, D notation)."""
     try:
-        from harmonic_functions import parse_harmonic_sequence
-        from prechecker import Prechecker
-        from corrector import Corrector
-        from solver import BeamSearchSolver
-        
         functions_str = request.get("functions", [])
         key_signature = request.get("key_signature", "C")
         
@@ -330,16 +390,15 @@ async def harmonize_functions(request: Dict):
         functions = parse_harmonic_sequence(sequence_str, key_pc)
         
         if not functions:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"success": False, "error": "No valid harmonic functions"},
                 status_code=400
             )
         
         # Precheck
-        prechecker = Prechecker()
-        errors = prechecker.check_sequence(functions)
+        errors = PRECHECKER.check_sequence(functions)
         if errors:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "success": False,
                     "error": "Precheck failed",
@@ -349,11 +408,10 @@ async def harmonize_functions(request: Dict):
             )
         
         # Correct
-        corrector = Corrector()
-        corrected_functions = corrector.correct_sequence(functions)
+        corrected_functions = CORRECTOR.correct_sequence(functions)
         
         # Solve
-        solver = BeamSearchSolver()
+        solver = SOLVER
         solutions = []
         prev_solutions = []
         
@@ -384,20 +442,12 @@ async def harmonize_functions(request: Dict):
                     Voice.BASS: bass_midi
                 }
                 solutions.append(fallback_voices)
-                from solver import Solution
                 prev_solutions = [Solution(voices=fallback_voices, score=100.0, violations=[])]
         
         # Convert to response format
-        result = []
-        for sol in solutions:
-            result.append({
-                "S": sol.get(Voice.SOPRANO, 0),
-                "A": sol.get(Voice.ALTO, 0),
-                "T": sol.get(Voice.TENOR, 0),
-                "B": sol.get(Voice.BASS, 0)
-            })
+        result = [to_satb(sol) for sol in solutions]
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "success": True,
             "voices": result,
             "explanations": "Harmonization from harmonic functions completed."
@@ -431,5 +481,15 @@ async def export_pdf(request: Dict):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop and httptools come with uvicorn[standard]; multiple workers
+    # need the app as an import string
+    uvicorn.run(
+        "backend.main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        log_level="warning"
+    )
 
@@ -7,76 +7,124 @@ from starlette.responses import Response
 import time
 import redis
 import os
-from collections import defaultdict
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
+try:
+    from backend.cache import get_redis_client
+except ImportError:
+    # Fallback for direct execution
+    from cache import get_redis_client
 
-# Simple in-memory rate limiter (for production, use Redis)
-rate_limit_store = defaultdict(list)
 rate_limit_window = 60  # seconds
 rate_limit_max_requests = 100  # per window
 
+# In-memory fallback used only while Redis is unreachable (per worker).
+# Maps client IP to its recent request timestamps, least recently seen first.
+rate_limit_store = OrderedDict()
+rate_limit_max_clients = 10000
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware."""
+# Paths that bypass rate limiting (health checks and API docs)
+_SKIP_PATHS = frozenset({"/health", "/", "/docs", "/openapi.json", "/redoc"})
+
+
+async def _redis_request_count(client_ip: str, current_time: float) -> int:
+    """Count a request in the client's current fixed window in Redis.
+    
+    INCR and EXPIRE go out in one MULTI/EXEC round trip, so the counter is
+    shared by all workers.
+    """
+    bucket = int(current_time // rate_limit_window)
+    key = f"rl:{client_ip}:{bucket}"
+    pipe = get_redis_client().pipeline()
+    pipe.incr(key)
+    pipe.expire(key, rate_limit_window)
+    count, _ = await pipe.execute()
+    return count
+
+
+def _memory_request_count(client_ip: str, current_time: float) -> int:
+    """Count a request in the client's in-memory sliding window.
+    
+    Timestamps live in a bounded deque, so expiring old entries only pops
+    from the left instead of rebuilding a list on every request.
+    """
+    timestamps = rate_limit_store.get(client_ip)
+    if timestamps is None:
+        timestamps = rate_limit_store[client_ip] = deque(maxlen=rate_limit_max_requests)
+        if len(rate_limit_store) > rate_limit_max_clients:
+            rate_limit_store.popitem(last=False)
+    else:
+        rate_limit_store.move_to_end(client_ip)
+    
+    # Drop expired entries
+    cutoff = current_time - rate_limit_window
+    while timestamps and timestamps[0] <= cutoff:
+        timestamps.popleft()
+    
+    # Rejected requests are not recorded
+    if len(timestamps) >= rate_limit_max_requests:
+        return len(timestamps) + 1
+    
+    timestamps.append(current_time)
+    return len(timestamps)
+
+
+def _client_ip(request: Request) -> str:
+    """Get client IP with fallback for production (behind reverse proxy)."""
+    if request.client is not None:
+        return request.client.host
+    # Fallback: try to get IP from headers (X-Forwarded-For, X-Real-IP)
+    client_ip = request.headers.get("X-Forwarded-For", "").split(",")[0].strip()
+    if not client_ip:
+        client_ip = request.headers.get("X-Real-IP", "unknown")
+    return client_ip
+
+
+class ObservabilityMiddleware(BaseHTTPMiddleware):
+    """Rate limiting and request monitoring in a single middleware.
+    
+    Args:
+        app: ASGI application
+        rate_limit: Whether to enforce the per-client rate limit
+    """
+    
+    def __init__(self, app, rate_limit: bool = False):
+        super().__init__(app)
+        self.rate_limit = rate_limit
     
     async def dispatch(self, request: Request, call_next):
-        # Skip rate limiting for health checks
-        if request.url.path in ["/health", "/", "/docs", "/openapi.json"]:
-            return await call_next(request)
+        path = request.url.path
         
-        # Get client IP with fallback for production (behind reverse proxy)
-        if request.client is not None:
-            client_ip = request.client.host
-        else:
-            # Fallback: try to get IP from headers (X-Forwarded-For, X-Real-IP)
-            client_ip = request.headers.get("X-Forwarded-For", "").split(",")[0].strip()
-            if not client_ip:
-                client_ip = request.headers.get("X-Real-IP", "unknown")
-        
-        current_time = time.time()
-        
-        # Clean old entries
-        rate_limit_store[client_ip] = [
-            t for t in rate_limit_store[client_ip]
-            if current_time - t < rate_limit_window
-        ]
-        
-        # Check rate limit
-        if len(rate_limit_store[client_ip]) >= rate_limit_max_requests:
-            return Response(
-                content='{"detail": "Rate limit exceeded"}',
-                status_code=429,
-                media_type="application/json",
-                headers={"Retry-After": str(rate_limit_window)}
-            )
-        
-        # Add current request
-        rate_limit_store[client_ip].append(current_time)
+        # Skip rate limiting for health checks
+        if self.rate_limit and path not in _SKIP_PATHS:
+            client_ip = _client_ip(request)
+            current_time = time.time()
+            
+            try:
+                request_count = await _redis_request_count(client_ip, current_time)
+            except Exception:
+                # If Redis fails, limit per worker instead
+                request_count = _memory_request_count(client_ip, current_time)
+            
+            # Check rate limit
+            if request_count > rate_limit_max_requests:
+                return Response(
+                    content='{"detail": "Rate limit exceeded"}',
+                    status_code=429,
+                    media_type="application/json",
+                    headers={"Retry-After": str(rate_limit_window)}
+                )
         
         # Process request
-        start_time = time.time()
+        start_time = time.monotonic()
         response = await call_next(request)
-        process_time = time.time() - start_time
+        process_time = time.monotonic() - start_time
         
         # Add timing header
         response.headers["X-Process-Time"] = str(process_time)
         
-        return response
-
-
-class MonitoringMiddleware(BaseHTTPMiddleware):
-    """Monitoring middleware for request tracking."""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        response = await call_next(request)
-        
-        process_time = time.time() - start_time
-        
         # Log slow requests
         if process_time > 1.0:
-            print(f"Slow request: {request.url.path} took {process_time:.2f}s")
+            print(f"Slow request: {path} took {process_time:.2f}s")
         
         return response
-
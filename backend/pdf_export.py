@@ -9,12 +9,17 @@ from typing import List, Dict, Union, BinaryIO
 import io
 
 
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+# Note names for the whole MIDI range, indexed by MIDI number
+_MIDI_NAMES = tuple(f"{NOTE_NAMES[midi % 12]}{(midi // 12) - 1}" for midi in range(128))
+
+
 def midi_to_note_name(midi: int) -> str:
     """Convert MIDI note to note name."""
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    octave = (midi // 12) - 1
-    note = note_names[midi % 12]
-    return f"{note}{octave}"
+    if 0 <= midi < 128:
+        return _MIDI_NAMES[midi]
+    return f"{NOTE_NAMES[midi % 12]}{(midi // 12) - 1}"
 
 
 def export_harmony_to_pdf(voices_list: List[Dict], settings: Dict, output_path: Union[str, BinaryIO]):
@@ -44,6 +49,7 @@ def export_harmony_to_pdf(voices_list: List[Dict], settings: Dict, output_path:
     y_start = height - 150
     staff_height = 100
     staff_spacing = 120
+    line_end_x = width - 50
     
     for staff_idx, voices in enumerate(voices_list):
         y_pos = y_start - (staff_idx * (staff_height * 4 + 50))
@@ -53,14 +59,16 @@ def export_harmony_to_pdf(voices_list: List[Dict], settings: Dict, output_path:
         label = "Original" if staff_idx == 0 else "Solution"
         c.drawString(50, y_pos + staff_height * 4 + 20, label)
         
-        # Draw staff lines
+        # Draw 5 staff lines for every voice in one call
+        voice_ys = [y_pos + (3 - voice_idx) * staff_spacing for voice_idx in range(4)]
+        c.lines([
+            (50, voice_y - line * 15, line_end_x, voice_y - line * 15)
+            for voice_y in voice_ys
+            for line in range(5)
+        ])
+        
         for voice_idx, voice_name in enumerate(['S', 'A', 'T', 'B']):
-            voice_y = y_pos + (3 - voice_idx) * staff_spacing
-            
-            # Draw 5 lines
-            for line in range(5):
-                line_y = voice_y - line * 15
-                c.line(50, line_y, width - 50, line_y)
+            voice_y = voice_ys[voice_idx]
             
             # Voice label
             c.setFont("Helvetica", 10)
@@ -78,13 +86,16 @@ def export_harmony_to_pdf(voices_list: List[Dict], settings: Dict, output_path:
                 x_start = 100
                 note_spacing = (width - 150) / max(len(notes), 1)
                 
-                for note_idx, note in enumerate(notes):
-                    x_pos = x_start + note_idx * note_spacing
-                    note_name = midi_to_note_name(note)
-                    
-                    # Draw note (simplified - just text for now)
-                    c.setFont("Helvetica", 12)
-                    c.drawString(x_pos, voice_y - 20, note_name)
+                # Draw notes (simplified - just text for now) in a single
+                # text object instead of one drawString per note
+                names = list(map(midi_to_note_name, notes))
+                note_y = voice_y - 20
+                text = c.beginText()
+                text.setFont("Helvetica", 12)
+                for note_idx, name in enumerate(names):
+                    text.setTextOrigin(x_start + note_idx * note_spacing, note_y)
+                    text.textOut(name)
+                c.drawText(text)
         
         # Page break if needed
         if y_pos < 100:
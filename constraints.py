@@ -1,9 +1,155 @@
 """
 Hard and soft constraint checking for four-part harmony.
 """
-from typing import List, Dict, Tuple, Optional, Set
-from music_utils import Voice, VOICE_RANGES, is_perfect_fifth, is_perfect_octave, get_interval_semitones, midi_to_pitch_class
+from typing import List, Dict, Tuple, Optional, Set, Union
+from music_utils import (
+    Voice, VoiceVec, S_IDX, A_IDX, T_IDX, ALL_VOICES, UPPER_VOICES, VOICE_RANGES, in_voice_range, PC_TABLE, INTERVAL_CLASS, IS_P5, IS_P8,
+    is_perfect_fifth, is_perfect_octave, get_interval_semitones, midi_to_pitch_class
+)
 from dataclasses import dataclass
+from enum import IntFlag
+from functools import lru_cache
+
+
+# Ordered pairs of distinct voice indices into ALL_VOICES
+_VOICE_INDEX_PAIRS = tuple((i, j) for i in range(4) for j in range(4) if i != j)
+
+
+# Voice members bound once; looking them up on the enum class costs about
+# as much as the dict reads of pack_voices themselves
+_SOPRANO, _ALTO, _TENOR, _BASS = ALL_VOICES
+
+
+# Chords are accepted either as {Voice: midi} dicts or as VoiceVecs
+ChordVoices = Union[Dict[Voice, int], VoiceVec]
+
+
+def pack_voices(voices: ChordVoices) -> Tuple[Optional[int], ...]:
+    """Packs a voice dict into an (S, A, T, B) tuple, None for missing voices.
+    
+    VoiceVecs already have that layout and are returned as is.
+    """
+    if isinstance(voices, tuple):
+        return voices
+    get = voices.get
+    return (get(_SOPRANO), get(_ALTO), get(_TENOR), get(_BASS))
+
+
+def _parallel_motion_pairs(prev: Tuple[Optional[int], ...],
+                           curr: Tuple[Optional[int], ...]) -> List[Tuple[int, int]]:
+    """Returns the ordered voice index pairs that move in the same direction.
+    
+    Each voice's motion is computed once; pairs with a missing note in
+    either chord are skipped.
+    """
+    motion = [
+        c - p if p is not None and c is not None else 0
+        for p, c in zip(prev, curr)
+    ]
+    return [(i, j) for i, j in _VOICE_INDEX_PAIRS if motion[i] * motion[j] > 0]
+
+
+class RuleCode(IntFlag):
+    """Bit codes of the constraint rules, combined into masks on the hot path."""
+    VOICE_RANGE = 1
+    VOICE_CROSSING = 2
+    SPACING = 4
+    PARALLEL_FIFTH = 8
+    PARALLEL_OCTAVE = 16
+    HIDDEN = 32
+    SEVENTH_RES = 64
+    LEADING_TONE = 128
+    
+    @staticmethod
+    def decode(mask: int) -> List["RuleCode"]:
+        """Returns the rule codes set in a mask, lowest bit first."""
+        return [code for code in RuleCode if mask & code.value]
+    
+    def rule_names(self) -> List[str]:
+        """Returns the ConstraintViolation rule names of the set rules."""
+        return [RULE_NAMES[code] for code in RuleCode.decode(self)]
+
+
+# Rule name used in ConstraintViolation for each code
+RULE_NAMES: Dict[RuleCode, str] = {
+    RuleCode.VOICE_RANGE: "voice_range",
+    RuleCode.VOICE_CROSSING: "voice_crossing",
+    RuleCode.SPACING: "spacing",
+    RuleCode.PARALLEL_FIFTH: "parallel_fifths",
+    RuleCode.PARALLEL_OCTAVE: "parallel_octaves",
+    RuleCode.HIDDEN: "hidden_fifths_octaves",
+    RuleCode.SEVENTH_RES: "seventh_resolution",
+    RuleCode.LEADING_TONE: "leading_tone_resolution",
+}
+
+# Plain int copies of the codes; bit operations on IntFlag members are much
+# slower than on ints, so masks are built from these
+_VOICE_RANGE = RuleCode.VOICE_RANGE.value
+_VOICE_CROSSING = RuleCode.VOICE_CROSSING.value
+_SPACING = RuleCode.SPACING.value
+_PARALLEL_FIFTH = RuleCode.PARALLEL_FIFTH.value
+_PARALLEL_OCTAVE = RuleCode.PARALLEL_OCTAVE.value
+_HIDDEN = RuleCode.HIDDEN.value
+
+
+def _transition_mask(prev: Tuple[Optional[int], ...], curr: Tuple[Optional[int], ...]) -> int:
+    """Returns the RuleCode bits of the parallel rules violated between two packed chords.
+    
+    Works on plain ints only, so the common no-violation case allocates
+    no ConstraintViolation objects.
+    """
+    mask = 0
+    for i, j in _parallel_motion_pairs(prev, curr):
+        curr_interval = INTERVAL_CLASS[curr[i] - curr[j]]
+        if curr_interval == 7:
+            mask |= _HIDDEN
+            if IS_P5[prev[i] - prev[j]]:
+                mask |= _PARALLEL_FIFTH
+        elif curr_interval == 0:
+            mask |= _HIDDEN
+            if IS_P8[prev[i] - prev[j]]:
+                mask |= _PARALLEL_OCTAVE
+    return mask
+
+
+# Position of each voice in a packed chord
+_VOICE_INDEX: Dict[Voice, int] = {voice: i for i, voice in enumerate(ALL_VOICES)}
+
+
+def _pack_with_note(voices: ChordVoices, voice: Voice, midi_note: int) -> Tuple[Optional[int], ...]:
+    """Packs a chord like pack_voices, reading midi_note for one voice.
+    
+    Saves copying the chord just to try a candidate note in it.
+    """
+    if isinstance(voices, tuple):
+        notes = list(voices)
+        notes[_VOICE_INDEX[voice]] = midi_note
+        return tuple(notes)
+    get = voices.get
+    return (
+        midi_note if voice is _SOPRANO else get(_SOPRANO),
+        midi_note if voice is _ALTO else get(_ALTO),
+        midi_note if voice is _TENOR else get(_TENOR),
+        midi_note if voice is _BASS else get(_BASS),
+    )
+
+
+def _order_and_spacing_mask(s: Optional[int], a: Optional[int],
+                            t: Optional[int], b: Optional[int]) -> int:
+    """Returns the RuleCode bits of the voice order and spacing rules for one chord.
+    
+    Same rules as check_voice_order and check_spacing, tested on the
+    same local notes.
+    """
+    mask = 0
+    if ((s is not None and a is not None and s < a)
+            or (a is not None and t is not None and a < t)
+            or (t is not None and b is not None and t < b)):
+        mask |= _VOICE_CROSSING
+    if ((s is not None and a is not None and abs(s - a) > 12)
+            or (a is not None and t is not None and abs(a - t) > 12)):
+        mask |= _SPACING
+    return mask
 
 
 @dataclass
@@ -12,6 +158,7 @@ class ConstraintViolation:
     rule_name: str
     description: str
     severity: str  # "hard" or "soft"
+    rule_kind: int = 0  # RuleCode bit of the rule, 0 for rules without one
 
 
 class ConstraintChecker:
@@ -22,53 +169,53 @@ class ConstraintChecker:
     
     def check_voice_range(self, voice: Voice, midi_note: int) -> Optional[ConstraintViolation]:
         """Checks voice range."""
-        min_note, max_note = VOICE_RANGES[voice]
-        if midi_note < min_note or midi_note > max_note:
+        if not in_voice_range(voice, midi_note):
+            min_note, max_note = VOICE_RANGES[voice]
             return ConstraintViolation(
                 rule_name="voice_range",
+                rule_kind=_VOICE_RANGE,
                 description=f"{voice.value} note {midi_note} outside range [{min_note}, {max_note}]",
                 severity="hard"
             )
         return None
     
-    def check_voice_order(self, voices: Dict[Voice, int]) -> Optional[ConstraintViolation]:
+    def check_voice_order(self, voices: ChordVoices) -> Optional[ConstraintViolation]:
         """Checks voice order: S >= A >= T >= B."""
-        s = voices.get(Voice.SOPRANO)
-        a = voices.get(Voice.ALTO)
-        t = voices.get(Voice.TENOR)
-        b = voices.get(Voice.BASS)
+        s, a, t, b = pack_voices(voices)
         
         if s is not None and a is not None and s < a:
             return ConstraintViolation(
                 rule_name="voice_crossing",
+                rule_kind=_VOICE_CROSSING,
                 description=f"Soprano ({s}) < Alto ({a})",
                 severity="hard"
             )
         if a is not None and t is not None and a < t:
             return ConstraintViolation(
                 rule_name="voice_crossing",
+                rule_kind=_VOICE_CROSSING,
                 description=f"Alto ({a}) < Tenor ({t})",
                 severity="hard"
             )
         if t is not None and b is not None and t < b:
             return ConstraintViolation(
                 rule_name="voice_crossing",
+                rule_kind=_VOICE_CROSSING,
                 description=f"Tenor ({t}) < Bass ({b})",
                 severity="hard"
             )
         return None
     
-    def check_spacing(self, voices: Dict[Voice, int]) -> Optional[ConstraintViolation]:
+    def check_spacing(self, voices: ChordVoices) -> Optional[ConstraintViolation]:
         """Checks intervals between upper voices (<= octave between S-A and A-T)."""
-        s = voices.get(Voice.SOPRANO)
-        a = voices.get(Voice.ALTO)
-        t = voices.get(Voice.TENOR)
+        s, a, t, _ = pack_voices(voices)
         
         if s is not None and a is not None:
             interval_sa = get_interval_semitones(s, a)
             if interval_sa > 12:  # More than octave
                 return ConstraintViolation(
                     rule_name="spacing",
+                    rule_kind=_SPACING,
                     description=f"Interval between Soprano ({s}) and Alto ({a}) is {interval_sa} semitones (> octave)",
                     severity="hard"
                 )
@@ -78,112 +225,95 @@ class ConstraintChecker:
             if interval_at > 12:
                 return ConstraintViolation(
                     rule_name="spacing",
+                    rule_kind=_SPACING,
                     description=f"Interval between Alto ({a}) and Tenor ({t}) is {interval_at} semitones (> octave)",
                     severity="hard"
                 )
         
         return None
     
-    def check_parallel_fifths(self, prev_voices: Dict[Voice, int], 
-                             curr_voices: Dict[Voice, int]) -> List[ConstraintViolation]:
+    def check_parallel_fifths(self, prev_voices: ChordVoices, 
+                             curr_voices: ChordVoices) -> List[ConstraintViolation]:
         """Checks parallel fifths between two time steps."""
         violations = []
+        prev, curr = pack_voices(prev_voices), pack_voices(curr_voices)
         
-        for voice1 in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-            for voice2 in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-                if voice1 == voice2:
-                    continue
-                
-                prev1 = prev_voices.get(voice1)
-                prev2 = prev_voices.get(voice2)
-                curr1 = curr_voices.get(voice1)
-                curr2 = curr_voices.get(voice2)
-                
-                if prev1 is None or prev2 is None or curr1 is None or curr2 is None:
-                    continue
-                
-                # Check if intervals are fifths
-                if is_perfect_fifth(prev1, prev2) and is_perfect_fifth(curr1, curr2):
-                    # Check motion direction
-                    motion1 = curr1 - prev1
-                    motion2 = curr2 - prev2
-                    
-                    if motion1 != 0 and motion2 != 0 and (motion1 * motion2 > 0):  # Same direction
-                        violations.append(ConstraintViolation(
-                            rule_name="parallel_fifths",
-                            description=f"Parallel fifths between {voice1.value} and {voice2.value}",
-                            severity="hard"
-                        ))
+        for i, j in _parallel_motion_pairs(prev, curr):
+            # Check if intervals are fifths
+            if IS_P5[prev[i] - prev[j]] and IS_P5[curr[i] - curr[j]]:
+                violations.append(ConstraintViolation(
+                    rule_name="parallel_fifths",
+                    rule_kind=_PARALLEL_FIFTH,
+                    description=f"Parallel fifths between {ALL_VOICES[i].value} and {ALL_VOICES[j].value}",
+                    severity="hard"
+                ))
         
         return violations
     
-    def check_parallel_octaves(self, prev_voices: Dict[Voice, int], 
-                              curr_voices: Dict[Voice, int]) -> List[ConstraintViolation]:
+    def check_parallel_octaves(self, prev_voices: ChordVoices, 
+                              curr_voices: ChordVoices) -> List[ConstraintViolation]:
         """Checks parallel octaves between two time steps."""
         violations = []
+        prev, curr = pack_voices(prev_voices), pack_voices(curr_voices)
         
-        for voice1 in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-            for voice2 in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-                if voice1 == voice2:
-                    continue
-                
-                prev1 = prev_voices.get(voice1)
-                prev2 = prev_voices.get(voice2)
-                curr1 = curr_voices.get(voice1)
-                curr2 = curr_voices.get(voice2)
-                
-                if prev1 is None or prev2 is None or curr1 is None or curr2 is None:
-                    continue
-                
-                if is_perfect_octave(prev1, prev2) and is_perfect_octave(curr1, curr2):
-                    motion1 = curr1 - prev1
-                    motion2 = curr2 - prev2
-                    
-                    if motion1 != 0 and motion2 != 0 and (motion1 * motion2 > 0):
-                        violations.append(ConstraintViolation(
-                            rule_name="parallel_octaves",
-                            description=f"Parallel octaves between {voice1.value} and {voice2.value}",
-                            severity="hard"
-                        ))
+        for i, j in _parallel_motion_pairs(prev, curr):
+            if IS_P8[prev[i] - prev[j]] and IS_P8[curr[i] - curr[j]]:
+                violations.append(ConstraintViolation(
+                    rule_name="parallel_octaves",
+                    rule_kind=_PARALLEL_OCTAVE,
+                    description=f"Parallel octaves between {ALL_VOICES[i].value} and {ALL_VOICES[j].value}",
+                    severity="hard"
+                ))
         
         return violations
     
-    def check_hidden_fifths_octaves(self, prev_voices: Dict[Voice, int], 
-                                   curr_voices: Dict[Voice, int]) -> List[ConstraintViolation]:
+    def check_hidden_fifths_octaves(self, prev_voices: ChordVoices, 
+                                   curr_voices: ChordVoices) -> List[ConstraintViolation]:
         """Checks hidden fifths and octaves in parallel motion."""
         violations = []
+        curr = pack_voices(curr_voices)
         
-        for voice1 in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-            for voice2 in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-                if voice1 == voice2:
-                    continue
-                
-                prev1 = prev_voices.get(voice1)
-                prev2 = prev_voices.get(voice2)
-                curr1 = curr_voices.get(voice1)
-                curr2 = curr_voices.get(voice2)
-                
-                if prev1 is None or prev2 is None or curr1 is None or curr2 is None:
-                    continue
-                
-                motion1 = curr1 - prev1
-                motion2 = curr2 - prev2
-                
-                # Parallel motion
-                if motion1 != 0 and motion2 != 0 and (motion1 * motion2 > 0):
-                    if is_perfect_fifth(curr1, curr2) or is_perfect_octave(curr1, curr2):
-                        violations.append(ConstraintViolation(
-                            rule_name="hidden_fifths_octaves",
-                            description=f"Hidden P5/P8 between {voice1.value} and {voice2.value} in parallel motion",
-                            severity="hard"
-                        ))
+        for i, j in _parallel_motion_pairs(pack_voices(prev_voices), curr):
+            if IS_P5[curr[i] - curr[j]] or IS_P8[curr[i] - curr[j]]:
+                violations.append(ConstraintViolation(
+                    rule_name="hidden_fifths_octaves",
+                    rule_kind=_HIDDEN,
+                    description=f"Hidden P5/P8 between {ALL_VOICES[i].value} and {ALL_VOICES[j].value} in parallel motion",
+                    severity="hard"
+                ))
         
         return violations
     
+    def hard_constraint_mask(self, voice: Voice, midi_note: int,
+                             curr_voices: Optional[Dict[Voice, int]] = None) -> int:
+        """Returns the RuleCode bits of the hard constraints violated by one note.
+        
+        Same checks as check_all_hard_constraints, for callers that only
+        need to know whether (and which) rules failed.
+        """
+        mask = 0 if in_voice_range(voice, midi_note) else _VOICE_RANGE
+        
+        if curr_voices:
+            mask |= _order_and_spacing_mask(*_pack_with_note(curr_voices, voice, midi_note))
+        
+        return mask
+    
+    def chord_mask(self, voices: ChordVoices) -> int:
+        """Returns the RuleCode bits of the voice order and spacing rules violated by one chord."""
+        return _order_and_spacing_mask(*pack_voices(voices))
+    
+    def parallels_mask(self, prev_voices: ChordVoices, curr_voices: ChordVoices) -> int:
+        """Returns the RuleCode bits of the parallel rules violated between two chords."""
+        return _transition_mask(pack_voices(prev_voices), pack_voices(curr_voices))
+    
     def check_all_hard_constraints(self, voice: Voice, midi_note: int,
                                   prev_voices: Optional[Dict[Voice, int]] = None,
                                   curr_voices: Optional[Dict[Voice, int]] = None) -> List[ConstraintViolation]:
         """Checks all hard constraints for one note."""
+        # Most notes pass every rule; those skip building the checks' messages
+        if not self.hard_constraint_mask(voice, midi_note, curr_voices):
+            return []
+        
         violations = []
         
         # Check range
@@ -193,8 +323,7 @@ class ConstraintChecker:
         
         # Check voice order (if current voices exist)
         if curr_voices:
-            temp_voices = curr_voices.copy()
-            temp_voices[voice] = midi_note
+            temp_voices = _pack_with_note(curr_voices, voice, midi_note)
             order_violation = self.check_voice_order(temp_voices)
             if order_violation:
                 violations.append(order_violation)
@@ -205,14 +334,151 @@ class ConstraintChecker:
         
         return violations
     
-    def check_parallels(self, prev_voices: Dict[Voice, int], 
-                       curr_voices: Dict[Voice, int]) -> List[ConstraintViolation]:
-        """Checks all parallelisms."""
-        violations = []
-        violations.extend(self.check_parallel_fifths(prev_voices, curr_voices))
-        violations.extend(self.check_parallel_octaves(prev_voices, curr_voices))
-        violations.extend(self.check_hidden_fifths_octaves(prev_voices, curr_voices))
-        return violations
+    def check_parallels(self, prev_voices: ChordVoices, 
+                       curr_voices: ChordVoices) -> List[ConstraintViolation]:
+        """Checks all parallelisms.
+        
+        Equivalent to check_parallel_fifths, check_parallel_octaves and
+        check_hidden_fifths_octaves in that order, but the voice pairs and
+        their intervals are computed once for all three rules.
+        """
+        prev, curr = pack_voices(prev_voices), pack_voices(curr_voices)
+        if not _transition_mask(prev, curr):
+            return []
+        
+        fifths, octaves, hidden = [], [], []
+        for i, j in _parallel_motion_pairs(prev, curr):
+            curr_interval = INTERVAL_CLASS[curr[i] - curr[j]]
+            if curr_interval != 7 and curr_interval != 0:
+                continue
+            
+            voice1, voice2 = ALL_VOICES[i].value, ALL_VOICES[j].value
+            if INTERVAL_CLASS[prev[i] - prev[j]] == curr_interval:
+                if curr_interval == 7:
+                    fifths.append(ConstraintViolation(
+                        rule_name="parallel_fifths",
+                        rule_kind=_PARALLEL_FIFTH,
+                        description=f"Parallel fifths between {voice1} and {voice2}",
+                        severity="hard"
+                    ))
+                else:
+                    octaves.append(ConstraintViolation(
+                        rule_name="parallel_octaves",
+                        rule_kind=_PARALLEL_OCTAVE,
+                        description=f"Parallel octaves between {voice1} and {voice2}",
+                        severity="hard"
+                    ))
+            hidden.append(ConstraintViolation(
+                rule_name="hidden_fifths_octaves",
+                rule_kind=_HIDDEN,
+                description=f"Hidden P5/P8 between {voice1} and {voice2} in parallel motion",
+                severity="hard"
+            ))
+        
+        return fifths + octaves + hidden
+
+
+def _motion_score(motion: int) -> float:
+    """Score of a voice moving by the given number of semitones."""
+    if motion == 0:
+        return 0.0  # Stays in place - excellent
+    elif motion <= 2:
+        return 1.0  # Stepwise motion - good
+    elif motion <= 7:
+        return 3.0  # Small leap
+    else:
+        return 10.0  # Large leap - bad
+
+
+# Voice motion score indexed by the size of the motion in semitones; larger
+# motions are clamped to the last entry, which scores like any large leap
+MOTION_SCORE: Tuple[float, ...] = tuple(_motion_score(motion) for motion in range(256))
+MAX_MOTION = len(MOTION_SCORE) - 1
+
+
+# The chord scores below depend only on the notes, and the same voicings
+# come up again and again across beam search steps, so they are memoized
+
+@lru_cache(maxsize=65536)
+def _doubling_score(s: Optional[int], a: Optional[int], t: Optional[int],
+                    b: Optional[int], root_pc: int) -> float:
+    """Doubling score of a chord (prefer root doubling)."""
+    root_count = sum(
+        1 for midi_note in (s, a, t, b)
+        if midi_note is not None and PC_TABLE[midi_note] == root_pc
+    )
+    
+    if root_count >= 2:
+        return -1.0  # Bonus for root doubling
+    elif root_count == 0:
+        return 5.0  # Penalty for no root
+    return 0.0
+
+
+@lru_cache(maxsize=65536)
+def _spacing_variance(s: Optional[int], a: Optional[int], t: Optional[int],
+                      b: Optional[int]) -> float:
+    """Spacing score of a chord (prefer even distribution)."""
+    if s is None or a is None or t is None or b is None:
+        return 0.0
+    
+    # Calculate intervals
+    sa = get_interval_semitones(s, a)
+    at = get_interval_semitones(a, t)
+    tb = get_interval_semitones(t, b)
+    
+    # Prefer even distribution
+    intervals = [sa, at, tb]
+    avg_interval = sum(intervals) / len(intervals)
+    variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
+    
+    return variance * 0.1  # Penalty for uneven spacing
+
+
+def total_score_kernel(prev: Optional[VoiceVec], curr: VoiceVec, bass_motion: int,
+                       root_pc: Optional[int], leading_tone_pc: Optional[int]) -> float:
+    """
+    Total soft score of a packed chord, as one function with no method calls.
+    
+    Args:
+        prev: previous chord packed with pack_voices, or None for the first chord
+        curr: current chord packed with pack_voices
+        bass_motion: bass motion into the current chord in semitones
+        root_pc: chord root pitch class, or None to skip the doubling score
+        leading_tone_pc: leading tone pitch class, or None to skip its check
+    
+    Returns:
+        Score (lower = better)
+    """
+    score = 0.0
+    
+    # Voice motion and counterpoint with bass, upper voices only
+    for i in (S_IDX, A_IDX, T_IDX):
+        curr_note = curr[i]
+        if not curr_note:
+            continue
+        prev_note = prev[i] if prev else None
+        if prev_note is None:
+            continue
+        motion = curr_note - prev_note
+        score += MOTION_SCORE[min(abs(motion), MAX_MOTION)]
+        if prev_note and bass_motion and motion:
+            score += -2.0 if (bass_motion * motion) < 0 else 2.0
+    
+    s, a, t, b = curr
+    if root_pc is not None:
+        score += _doubling_score(s, a, t, b, root_pc)
+    
+    if leading_tone_pc is not None:
+        lt_count = sum(
+            1 for midi_note in curr
+            if midi_note is not None and PC_TABLE[midi_note] == leading_tone_pc
+        )
+        if lt_count >= 2:
+            score += 10.0
+    
+    score += _spacing_variance(s, a, t, b)
+    return score
 
 
 class SoftConstraintScorer:
@@ -222,16 +488,7 @@ class SoftConstraintScorer:
         """Scores voice motion (lower = better)."""
         if prev_note is None:
             return 0.0
-        
-        motion = abs(curr_note - prev_note)
-        if motion == 0:
-            return 0.0  # Stays in place - excellent
-        elif motion <= 2:
-            return 1.0  # Stepwise motion - good
-        elif motion <= 7:
-            return 3.0  # Small leap
-        else:
-            return 10.0  # Large leap - bad
+        return MOTION_SCORE[min(abs(curr_note - prev_note), MAX_MOTION)]
     
     def score_contrary_motion_to_bass(self, bass_motion: int, voice_motion: int) -> float:
         """Scores contrapuntal motion relative to bass (lower = better)."""
@@ -243,30 +500,19 @@ class SoftConstraintScorer:
         else:
             return 2.0  # Penalty for parallel motion
     
-    def score_doubling(self, voices: Dict[Voice, int], root_pc: int) -> float:
+    def score_doubling(self, voices: ChordVoices, root_pc: int) -> float:
         """Scores doubling (prefer root doubling)."""
-        score = 0.0
-        root_count = 0
-        
-        for voice, midi_note in voices.items():
-            if midi_to_pitch_class(midi_note) == root_pc:
-                root_count += 1
-        
-        if root_count >= 2:
-            score = -1.0  # Bonus for root doubling
-        elif root_count == 0:
-            score = 5.0  # Penalty for no root
-        
-        return score
+        s, a, t, b = pack_voices(voices)
+        return _doubling_score(s, a, t, b, root_pc)
     
-    def score_leading_tone_doubling(self, voices: Dict[Voice, int], 
+    def score_leading_tone_doubling(self, voices: ChordVoices, 
                                    leading_tone_pc: int) -> float:
         """Penalizes leading tone doubling."""
         score = 0.0
         lt_count = 0
         
-        for voice, midi_note in voices.items():
-            if midi_to_pitch_class(midi_note) == leading_tone_pc:
+        for midi_note in pack_voices(voices):
+            if midi_note is not None and PC_TABLE[midi_note] == leading_tone_pc:
                 lt_count += 1
         
         if lt_count >= 2:
@@ -274,27 +520,10 @@ class SoftConstraintScorer:
         
         return score
     
-    def score_chord_spacing(self, voices: Dict[Voice, int]) -> float:
+    def score_chord_spacing(self, voices: ChordVoices) -> float:
         """Scores chord spacing (prefer even distribution)."""
-        s = voices.get(Voice.SOPRANO)
-        a = voices.get(Voice.ALTO)
-        t = voices.get(Voice.TENOR)
-        b = voices.get(Voice.BASS)
-        
-        if s is None or a is None or t is None or b is None:
-            return 0.0
-        
-        # Calculate intervals
-        sa = get_interval_semitones(s, a)
-        at = get_interval_semitones(a, t)
-        tb = get_interval_semitones(t, b)
-        
-        # Prefer even distribution
-        intervals = [sa, at, tb]
-        avg_interval = sum(intervals) / len(intervals)
-        variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
-        
-        return variance * 0.1  # Penalty for uneven spacing
+        s, a, t, b = pack_voices(voices)
+        return _spacing_variance(s, a, t, b)
     
     def total_score(self, prev_voices: Optional[Dict[Voice, int]], 
                    curr_voices: Dict[Voice, int],
@@ -302,29 +531,7 @@ class SoftConstraintScorer:
                    root_pc: Optional[int] = None,
                    leading_tone_pc: Optional[int] = None) -> float:
         """Calculates total score for current chord."""
-        score = 0.0
-        
-        # Voice motion
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-            prev_note = prev_voices.get(voice) if prev_voices else None
-            curr_note = curr_voices.get(voice)
-            if curr_note:
-                score += self.score_voice_motion(prev_note, curr_note)
-                
-                # Counterpoint with bass
-                if prev_note:
-                    voice_motion = curr_note - prev_note
-                    score += self.score_contrary_motion_to_bass(bass_motion, voice_motion)
-        
-        # Doubling
-        if root_pc is not None:
-            score += self.score_doubling(curr_voices, root_pc)
-        
-        if leading_tone_pc is not None:
-            score += self.score_leading_tone_doubling(curr_voices, leading_tone_pc)
-        
-        # Chord spacing
-        score += self.score_chord_spacing(curr_voices)
-        
-        return score
+        prev = pack_voices(prev_voices) if prev_voices else None
+        return total_score_kernel(prev, pack_voices(curr_voices), bass_motion,
+                                  root_pc, leading_tone_pc)
 
@@ -1,6 +1,7 @@
 """
 Corrector for harmonic functions - automatically fixes common issues.
 """
+from dataclasses import replace
 from typing import List, Optional
 from harmonic_functions import HarmonicFunction, HarmonicFunctionType
 
@@ -14,28 +15,20 @@ class Corrector:
         Correct harmonic function based on context.
         
         Returns:
-            Corrected HarmonicFunction
+            Corrected HarmonicFunction (func itself if nothing changes)
         """
-        corrected = HarmonicFunction(
-            func_type=func.func_type,
-            root_pc=func.root_pc,
-            position=func.position,
-            extra=func.extra.copy() if func.extra else None,
-            alterations=func.alterations.copy() if func.alterations else None,
-            is_related_backwards=func.is_related_backwards,
-            is_related_forwards=func.is_related_forwards,
-            is_minor=func.is_minor
-        )
+        position = func.position
+        extra = func.extra
         
         # Fix position notation (3> -> 3)
-        if corrected.position is not None and corrected.position > 3:
-            corrected.position = 3
+        if position is not None and position > 3:
+            position = 3
         
         # Chain dominants - omit fifth if needed
-        if prev_func and corrected.func_type == HarmonicFunctionType.DOMINANT:
+        if prev_func and func.func_type == HarmonicFunctionType.DOMINANT:
             if prev_func.func_type == HarmonicFunctionType.DOMINANT:
                 # Both root position - omit fifth to avoid parallel fifths
-                if corrected.position is None and prev_func.position is None:
+                if position is None and prev_func.position is None:
                     # Mark fifth for omission (handled in solver)
                     pass
         
@@ -43,16 +36,20 @@ class Corrector:
         if prev_func and prev_func.func_type == HarmonicFunctionType.DOMINANT:
             if prev_func.extra and 7 in prev_func.extra:
                 if prev_func.position == 3:  # 7th in bass
-                    if corrected.func_type == HarmonicFunctionType.TONIC:
-                        if corrected.position is None:
-                            corrected.position = 1  # Third in bass
+                    if func.func_type == HarmonicFunctionType.TONIC:
+                        if position is None:
+                            position = 1  # Third in bass
         
         # Chopin chord - add fifth to omit if not specified
-        if corrected.func_type == HarmonicFunctionType.CHOPIN:
-            if corrected.extra is None:
-                corrected.extra = [5]  # Omit fifth
+        if func.func_type == HarmonicFunctionType.CHOPIN:
+            if extra is None:
+                extra = (5,)  # Omit fifth
         
-        return corrected
+        # Functions that need no correction are returned as they are;
+        # a new object is only built when a field actually changes
+        if position == func.position and extra is func.extra:
+            return func
+        return replace(func, position=position, extra=extra)
     
     def correct_sequence(self, functions: List[HarmonicFunction]) -> List[HarmonicFunction]:
         """Correct entire sequence of harmonic functions."""
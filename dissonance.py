@@ -2,8 +2,52 @@
 Rules for dissonance resolution in four-part harmony.
 """
 from typing import List, Dict, Optional
-from music_utils import Voice, midi_to_pitch_class, get_interval_semitones
-from constraints import ConstraintViolation
+from music_utils import Voice, ALL_VOICES, PC_TABLE, IS_DISSONANT, midi_to_pitch_class, get_interval_semitones
+from constraints import ConstraintViolation, RuleCode, pack_voices
+
+
+# Whether a note lies a minor or major seventh above the root, indexed by
+# the difference of their pitch classes
+IS_SEVENTH = tuple(pc in (10, 11) for pc in PC_TABLE)
+
+_SEVENTH_RES = RuleCode.SEVENTH_RES.value
+_LEADING_TONE = RuleCode.LEADING_TONE.value
+
+
+# Layout of the per-voice bits returned by _dissonance_bits: one bit per
+# voice (soprano first) for each rule
+_SEVENTH_BITS = 0x0F
+_LEADING_TONE_BITS = 0xF0
+
+
+def _dissonance_bits(prev: tuple, curr: tuple, root_pc: int,
+                     key_root_pc: Optional[int]) -> int:
+    """
+    Checks seventh and leading-tone resolution of two packed chords in one pass.
+    
+    Returns:
+        Bit i set when voice i leaves a seventh unresolved, bit 4 + i when it
+        leaves the leading tone unresolved; 0 when everything resolves
+    """
+    bits = 0
+    leading_tone_pc = (key_root_pc + 11) % 12 if key_root_pc is not None else None
+    
+    for i in range(4):
+        prev_note = prev[i]
+        curr_note = curr[i]
+        if not prev_note or not curr_note:
+            continue
+        
+        prev_pc = PC_TABLE[prev_note]
+        motion = curr_note - prev_note
+        # Seventh must resolve down by one or two semitones
+        if IS_SEVENTH[prev_pc - root_pc] and not -2 <= motion < 0:
+            bits |= 1 << i
+        # Leading tone must resolve up to the tonic
+        if prev_pc == leading_tone_pc and (motion <= 0 or PC_TABLE[curr_note] != key_root_pc):
+            bits |= 16 << i
+    
+    return bits
 
 
 class DissonanceResolver:
@@ -14,15 +58,13 @@ class DissonanceResolver:
     
     def is_dissonance(self, note1: int, note2: int) -> bool:
         """Checks if an interval is dissonant."""
-        semitones = get_interval_semitones(note1, note2) % 12
-        dissonant_intervals = {1, 2, 6, 10, 11}  # m2, M2, TT, m7, M7
-        return semitones in dissonant_intervals
+        # m2, M2, TT, m7, M7
+        return IS_DISSONANT[note1 - note2]
     
     def is_seventh(self, note_pc: int, root_pc: int) -> bool:
         """Checks if a note is the seventh of a chord."""
         # Seventh is 10 semitones above root (minor 7th) or 11 (major 7th)
-        interval = (note_pc - root_pc) % 12
-        return interval in [10, 11]
+        return IS_SEVENTH[note_pc - root_pc]
     
     def check_seventh_resolution(self, prev_voices: Dict[Voice, int],
                                 curr_voices: Dict[Voice, int],
@@ -31,37 +73,44 @@ class DissonanceResolver:
         Checks if chordal sevenths resolve properly.
         Rule: Chordal 7th must resolve down by step in the same voice.
         """
-        violations = []
+        prev, curr = pack_voices(prev_voices), pack_voices(curr_voices)
         
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-            prev_note = prev_voices.get(voice)
-            curr_note = curr_voices.get(voice)
-            
-            if prev_note and curr_note:
-                prev_pc = midi_to_pitch_class(prev_note)
-                
-                # Check if previous note was a seventh
-                if self.is_seventh(prev_pc, root_pc):
-                    # Seventh should resolve down by step
-                    motion = curr_note - prev_note
-                    if motion > 0:  # Moved up
-                        violations.append(ConstraintViolation(
-                            rule_name="seventh_resolution",
-                            description=f"{voice.value} seventh ({prev_note}) should resolve down, but moved up to {curr_note}",
-                            severity="hard"
-                        ))
-                    elif motion < -2:  # Moved down more than a step
-                        violations.append(ConstraintViolation(
-                            rule_name="seventh_resolution",
-                            description=f"{voice.value} seventh ({prev_note}) should resolve down by step, but moved down {abs(motion)} semitones",
-                            severity="hard"
-                        ))
-                    elif motion == 0:  # Stayed the same
-                        violations.append(ConstraintViolation(
-                            rule_name="seventh_resolution",
-                            description=f"{voice.value} seventh ({prev_note}) should resolve down, but stayed the same",
-                            severity="hard"
-                        ))
+        # Voices whose seventh does not resolve down by step; the common
+        # case of no unresolved sevenths allocates no violations
+        unresolved = [
+            i for i in range(4)
+            if prev[i] and curr[i] and IS_SEVENTH[PC_TABLE[prev[i]] - root_pc]
+            and not -2 <= curr[i] - prev[i] < 0
+        ]
+        if not unresolved:
+            return []
+        
+        violations = []
+        for i in unresolved:
+            voice, prev_note, curr_note = ALL_VOICES[i], prev[i], curr[i]
+            # Seventh should resolve down by step
+            motion = curr_note - prev_note
+            if motion > 0:  # Moved up
+                violations.append(ConstraintViolation(
+                    rule_name="seventh_resolution",
+                    rule_kind=_SEVENTH_RES,
+                    description=f"{voice.value} seventh ({prev_note}) should resolve down, but moved up to {curr_note}",
+                    severity="hard"
+                ))
+            elif motion < -2:  # Moved down more than a step
+                violations.append(ConstraintViolation(
+                    rule_name="seventh_resolution",
+                    rule_kind=_SEVENTH_RES,
+                    description=f"{voice.value} seventh ({prev_note}) should resolve down by step, but moved down {abs(motion)} semitones",
+                    severity="hard"
+                ))
+            else:  # Stayed the same
+                violations.append(ConstraintViolation(
+                    rule_name="seventh_resolution",
+                    rule_kind=_SEVENTH_RES,
+                    description=f"{voice.value} seventh ({prev_note}) should resolve down, but stayed the same",
+                    severity="hard"
+                ))
         
         return violations
     
@@ -73,7 +122,7 @@ class DissonanceResolver:
         """
         violations = []
         
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
+        for voice in ALL_VOICES:
             prev_note = prev_voices.get(voice)
             curr_note = curr_voices.get(voice)
             
@@ -86,16 +135,16 @@ class DissonanceResolver:
                 # If note moved up, it might be a suspension that didn't resolve
                 # This is a heuristic - full implementation would require harmonic analysis
                 if motion > 0:
-                    # Check if it's a dissonant interval with another voice
-                    for other_voice, other_note in prev_voices.items():
-                        if other_voice != voice and self.is_dissonance(prev_note, other_note):
-                            # Potential suspension that should resolve down
-                            if motion > 0:
-                                violations.append(ConstraintViolation(
-                                    rule_name="suspension_resolution",
-                                    description=f"{voice.value} potential suspension ({prev_note}) should resolve down, but moved up",
-                                    severity="soft"  # Soft because we can't be sure it's a suspension
-                                ))
+                    # Check if it's a dissonant interval with another voice;
+                    # the scan stops at the first dissonance found
+                    if any(other_voice != voice and IS_DISSONANT[prev_note - other_note]
+                           for other_voice, other_note in prev_voices.items()):
+                        # Potential suspension that should resolve down
+                        violations.append(ConstraintViolation(
+                            rule_name="suspension_resolution",
+                            description=f"{voice.value} potential suspension ({prev_note}) should resolve down, but moved up",
+                            severity="soft"  # Soft because we can't be sure it's a suspension
+                        ))
         
         return violations
     
@@ -106,53 +155,76 @@ class DissonanceResolver:
         Checks if leading tone resolves properly.
         Rule: Leading tone (7th scale degree) should resolve up to tonic.
         """
-        violations = []
         leading_tone_pc = (key_root_pc + 11) % 12  # Semitone below root
+        prev, curr = pack_voices(prev_voices), pack_voices(curr_voices)
         
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-            prev_note = prev_voices.get(voice)
-            curr_note = curr_voices.get(voice)
+        # Voices that leave the leading tone without resolving up to the
+        # tonic; nothing else is allocated when every voice resolves
+        unresolved = [
+            i for i in range(4)
+            if prev[i] and curr[i] and PC_TABLE[prev[i]] == leading_tone_pc
+            and (curr[i] <= prev[i] or PC_TABLE[curr[i]] != key_root_pc)
+        ]
+        if not unresolved:
+            return []
+        
+        violations = []
+        for i in unresolved:
+            voice, prev_note, curr_note = ALL_VOICES[i], prev[i], curr[i]
+            motion = curr_note - prev_note
             
-            if prev_note:
-                prev_pc = midi_to_pitch_class(prev_note)
-                
-                # Check if previous note was leading tone
-                if prev_pc == leading_tone_pc:
-                    if curr_note:
-                        curr_pc = midi_to_pitch_class(curr_note)
-                        motion = curr_note - prev_note
-                        
-                        # Leading tone should resolve up to tonic
-                        if motion <= 0:
-                            violations.append(ConstraintViolation(
-                                rule_name="leading_tone_resolution",
-                                description=f"{voice.value} leading tone ({prev_note}) should resolve up to tonic, but moved {motion} semitones",
-                                severity="hard"
-                            ))
-                        elif curr_pc != key_root_pc:
-                            # Resolved but not to tonic
-                            violations.append(ConstraintViolation(
-                                rule_name="leading_tone_resolution",
-                                description=f"{voice.value} leading tone ({prev_note}) resolved to {curr_note} instead of tonic",
-                                severity="soft"
-                            ))
+            # Leading tone should resolve up to tonic
+            if motion <= 0:
+                violations.append(ConstraintViolation(
+                    rule_name="leading_tone_resolution",
+                    rule_kind=_LEADING_TONE,
+                    description=f"{voice.value} leading tone ({prev_note}) should resolve up to tonic, but moved {motion} semitones",
+                    severity="hard"
+                ))
+            else:
+                # Resolved but not to tonic
+                violations.append(ConstraintViolation(
+                    rule_name="leading_tone_resolution",
+                    rule_kind=_LEADING_TONE,
+                    description=f"{voice.value} leading tone ({prev_note}) resolved to {curr_note} instead of tonic",
+                    severity="soft"
+                ))
         
         return violations
     
+    def dissonance_mask(self, prev_voices: Dict[Voice, int],
+                        curr_voices: Dict[Voice, int],
+                        root_pc: int,
+                        key_root_pc: Optional[int] = None) -> int:
+        """Returns the RuleCode bits of the dissonance rules violated (hard or soft)."""
+        bits = _dissonance_bits(pack_voices(prev_voices), pack_voices(curr_voices),
+                                root_pc, key_root_pc)
+        mask = 0
+        if bits & _SEVENTH_BITS:
+            mask |= _SEVENTH_RES
+        if bits & _LEADING_TONE_BITS:
+            mask |= _LEADING_TONE
+        return mask
+    
     def check_all_dissonances(self, prev_voices: Dict[Voice, int],
                              curr_voices: Dict[Voice, int],
                              root_pc: int,
                              key_root_pc: Optional[int] = None) -> List[ConstraintViolation]:
         """Checks all dissonance resolution rules."""
+        bits = _dissonance_bits(pack_voices(prev_voices), pack_voices(curr_voices),
+                                root_pc, key_root_pc)
+        if not bits:
+            return []
+        
         violations = []
         
-        violations.extend(self.check_seventh_resolution(prev_voices, curr_voices, root_pc))
+        if bits & _SEVENTH_BITS:
+            violations.extend(self.check_seventh_resolution(prev_voices, curr_voices, root_pc))
         
-        if key_root_pc is not None:
+        if bits & _LEADING_TONE_BITS:
             violations.extend(self.check_leading_tone_resolution(prev_voices, curr_voices, key_root_pc))
         
         # Suspension resolution is soft constraint
         # violations.extend(self.check_suspension_resolution(prev_voices, curr_voices))
         
         return violations
-
@@ -2,8 +2,50 @@
 Enhanced validator with detailed error reports and visual indicators.
 """
 from typing import List, Dict, Optional, Tuple
-from constraints import ConstraintChecker, ConstraintViolation
-from music_utils import Voice, get_interval_semitones, is_perfect_fifth, is_perfect_octave
+from functools import lru_cache
+from collections import Counter
+from itertools import chain
+from constraints import ConstraintChecker, ConstraintViolation, RuleCode, pack_voices
+from music_utils import Voice, in_voice_range, get_interval_semitones, is_perfect_fifth, is_perfect_octave
+
+
+# Checker behind the memoized findings below; it keeps no per-call state
+_CHECKER = ConstraintChecker()
+
+_FIFTH_KINDS = RuleCode.PARALLEL_FIFTH.value | RuleCode.HIDDEN.value
+_PARALLEL_OCTAVE = RuleCode.PARALLEL_OCTAVE.value
+
+
+# Findings depend only on the packed chords, and re-validating a
+# progression after an edit mostly re-checks chords seen before, so they
+# are memoized by chord
+
+@lru_cache(maxsize=4096)
+def _chord_findings(packed: Tuple[Optional[int], ...]) -> Tuple[Optional[str], Optional[str]]:
+    """Voice-order and spacing messages for one packed chord (None where the rule holds)."""
+    chord_mask = _CHECKER.chord_mask(packed)
+    if not chord_mask:
+        return None, None
+    order_violation = (_CHECKER.check_voice_order(packed)
+                       if chord_mask & RuleCode.VOICE_CROSSING else None)
+    spacing_violation = (_CHECKER.check_spacing(packed)
+                         if chord_mask & RuleCode.SPACING else None)
+    return (order_violation.description if order_violation else None,
+            spacing_violation.description if spacing_violation else None)
+
+
+@lru_cache(maxsize=4096)
+def _parallel_findings(prev: Tuple[Optional[int], ...],
+                       curr: Tuple[Optional[int], ...]) -> Tuple[Tuple[str, str], ...]:
+    """(error type, message) of each parallel fifth or octave between two packed chords."""
+    findings = []
+    for violation in _CHECKER.check_parallels(prev, curr):
+        # Hidden fifths/octaves are reported with the parallel fifths
+        if violation.rule_kind & _FIFTH_KINDS:
+            findings.append(("parallel_fifths", violation.description))
+        elif violation.rule_kind == _PARALLEL_OCTAVE:
+            findings.append(("parallel_octaves", violation.description))
+    return tuple(findings)
 
 
 class EnhancedValidator:
@@ -31,16 +73,21 @@ class EnhancedValidator:
         errors = []
         warnings = []
         
-        # Statistics
-        parallel_fifths_count = 0
-        parallel_octaves_count = 0
-        voice_crossing_count = 0
-        spacing_issues_count = 0
-        range_violations_count = 0
+        # Pack every step once; the checks below read the packed chords and
+        # only build violation messages for the rules their masks flag
+        packed_list = [pack_voices(voices) for voices in voices_list]
+        
+        # The chord checks and the checks of each pair of neighbouring chords
+        # are independent of one another, so they run as two flat sweeps;
+        # the loop below only turns their findings into report rows
+        chord_findings = list(map(_chord_findings, packed_list))
+        pair_findings = [()] + list(map(_parallel_findings, packed_list, packed_list[1:]))
         
         for step_idx, voices in enumerate(voices_list):
             # Check voice ranges
             for voice, midi_note in voices.items():
+                if in_voice_range(voice, midi_note):
+                    continue
                 violation = self.constraint_checker.check_voice_range(voice, midi_note)
                 if violation:
                     errors.append({
@@ -52,71 +99,56 @@ class EnhancedValidator:
                         "message": violation.description,
                         "location": f"Step {step_idx + 1}, {voice.value}"
                     })
-                    range_violations_count += 1
+            
+            order_message, spacing_message = chord_findings[step_idx]
             
             # Check voice order
-            order_violation = self.constraint_checker.check_voice_order(voices)
-            if order_violation:
+            if order_message:
                 errors.append({
                     "step": step_idx,
                     "type": "voice_crossing",
                     "severity": "error",
-                    "message": order_violation.description,
+                    "message": order_message,
                     "location": f"Step {step_idx + 1}"
                 })
-                voice_crossing_count += 1
             
             # Check spacing
-            spacing_violation = self.constraint_checker.check_spacing(voices)
-            if spacing_violation:
+            if spacing_message:
                 warnings.append({
                     "step": step_idx,
                     "type": "spacing",
                     "severity": "warning",
-                    "message": spacing_violation.description,
+                    "message": spacing_message,
                     "location": f"Step {step_idx + 1}"
                 })
-                spacing_issues_count += 1
             
             # Check parallels with previous step
-            if step_idx > 0:
-                prev_voices = voices_list[step_idx - 1]
-                parallels = self.constraint_checker.check_parallels(prev_voices, voices)
-                
-                for violation in parallels:
-                    if "fifth" in violation.rule_name.lower():
-                        parallel_fifths_count += 1
-                        errors.append({
-                            "step": step_idx,
-                            "type": "parallel_fifths",
-                            "severity": "error",
-                            "message": violation.description,
-                            "location": f"Between steps {step_idx} and {step_idx + 1}",
-                            "prev_step": step_idx - 1,
-                            "curr_step": step_idx
-                        })
-                    elif "octave" in violation.rule_name.lower():
-                        parallel_octaves_count += 1
-                        errors.append({
-                            "step": step_idx,
-                            "type": "parallel_octaves",
-                            "severity": "error",
-                            "message": violation.description,
-                            "location": f"Between steps {step_idx} and {step_idx + 1}",
-                            "prev_step": step_idx - 1,
-                            "curr_step": step_idx
-                        })
+            parallels = pair_findings[step_idx]
+            if parallels:
+                location = f"Between steps {step_idx} and {step_idx + 1}"
+            
+            for error_type, message in parallels:
+                errors.append({
+                    "step": step_idx,
+                    "type": error_type,
+                    "severity": "error",
+                    "message": message,
+                    "location": location,
+                    "prev_step": step_idx - 1,
+                    "curr_step": step_idx
+                })
         
-        # Summary
+        # Summary, counted by type in one pass over the findings
+        counts = Counter(finding["type"] for finding in chain(errors, warnings))
         summary = {
             "total_steps": len(voices_list),
             "total_errors": len(errors),
             "total_warnings": len(warnings),
-            "parallel_fifths": parallel_fifths_count,
-            "parallel_octaves": parallel_octaves_count,
-            "voice_crossings": voice_crossing_count,
-            "spacing_issues": spacing_issues_count,
-            "range_violations": range_violations_count
+            "parallel_fifths": counts["parallel_fifths"],
+            "parallel_octaves": counts["parallel_octaves"],
+            "voice_crossings": counts["voice_crossing"],
+            "spacing_issues": counts["spacing"],
+            "range_violations": counts["range"]
         }
         
         return {
@@ -1,15 +1,29 @@
 """
 Different types of harmony and counterpoint exercises.
 """
-from typing import List, Dict, Optional, Tuple
-from music_utils import Voice, parse_musicxml, export_to_musicxml, midi_to_pitch_class
+from typing import List, Dict, Optional, Sequence, Tuple
+from music_utils import Voice, VoiceVec, ALL_VOICES, VOICE_RANGES, in_voice_range, parse_musicxml, export_to_musicxml, midi_to_pitch_class
 from solver import BeamSearchSolver, Solution
 from explanation import ExplanationEngine
-from constraints import ConstraintChecker, SoftConstraintScorer
+from constraints import ConstraintChecker, SoftConstraintScorer, RuleCode, pack_voices
 from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from collections import defaultdict
+from array import array
 from enum import Enum
 
 
+# Interval classes as 12-bit sets (bit n = n semitones) so membership
+# is a shift and a mask: unisons/octaves and dissonances (0, 1, 2, 6, 10,
+# 11) are avoided in first species, unisons and fifths (0, 7) preferred
+SPECIES_1_FORBIDDEN_MASK = 0b110001000111
+PERFECT_CONSONANCE_MASK = 0b000010000001
+
+# Lowest possible counterpoint motion score: no step bonus plus the
+# contrary motion bonus
+MOTION_SCORE_BOUND = -2.0
+
+
 class ExerciseType(Enum):
     """Types of harmony exercises."""
     BASS_FIGURED = "bass_figured"  # Generate upper voices from figured bass
@@ -30,6 +44,38 @@ class ExerciseResult:
     exercise_type: Optional[ExerciseType] = None
 
 
+# Preferred intervals above or below the cantus firmus: m3, M3, P4, P5, M6, m7
+COUNTERPOINT_INTERVALS = (3, 4, 5, 6, 8, 10)
+
+
+@lru_cache(maxsize=512)
+def _counterpoint_candidates(cf_note: int, above: bool, perfect: bool) -> Tuple[int, ...]:
+    """
+    Candidate counterpoint notes against one cantus firmus note.
+    
+    The candidates depend only on these arguments, so each combination is
+    built once; perfect adds the unison, fifth and octave used at the
+    start and end.
+    """
+    direction = 1 if above else -1
+    
+    # Check range (simplified - assume C4-C5 for counterpoint)
+    candidates = [
+        cf_note + direction * interval for interval in COUNTERPOINT_INTERVALS
+        if 60 <= cf_note + direction * interval <= 84
+    ]
+    
+    # Add octave
+    candidates.append(cf_note + direction * 12)
+    
+    # Start and end on perfect consonance
+    if perfect:
+        # Prefer unison, octave, or fifth
+        candidates = [cf_note, cf_note + direction * 7, cf_note + direction * 12] + candidates
+    
+    return tuple(set(candidates))  # Remove duplicates
+
+
 class CounterpointSolver:
     """Solver for counterpoint exercises (species counterpoint)."""
     
@@ -49,7 +95,7 @@ class CounterpointSolver:
         self.constraint_checker = ConstraintChecker()
         self.scorer = SoftConstraintScorer()
     
-    def solve_species_1(self, cantus_firmus: List[int], 
+    def solve_species_1(self, cantus_firmus: Sequence[int], 
                        above: bool = True) -> List[Dict[Voice, int]]:
         """
         Solve first species counterpoint (note against note).
@@ -61,8 +107,9 @@ class CounterpointSolver:
         Returns:
             List of voice dictionaries for each time step
         """
-        solutions = []
+        cp_notes = []
         prev_cp_note = None
+        prev_chord = None
         
         for i, cf_note in enumerate(cantus_firmus):
             # Generate candidates for counterpoint
@@ -70,88 +117,67 @@ class CounterpointSolver:
                 cf_note, prev_cp_note, above, i == 0, i == len(cantus_firmus) - 1
             )
             
-            # Filter by constraints
-            valid_candidates = []
+            # Filter by constraints; candidates are checked as packed
+            # (S, A, T, B) tuples and only the chosen notes become dicts.
+            # The lowest score wins, the earliest candidate on ties.
+            best_note = None
+            best_score = float('inf')
             for cp_note in candidates:
-                voices = {
-                    Voice.SOPRANO: cp_note if above else cf_note,
-                    Voice.BASS: cf_note if above else cp_note
-                }
-                
                 # Check intervals
                 interval = abs(cp_note - cf_note) % 12
-                if interval in [0, 1, 2, 6, 10, 11]:  # Avoid dissonances in species 1
+                if (SPECIES_1_FORBIDDEN_MASK >> interval) & 1:  # Avoid dissonances in species 1
+                    continue
+                
+                # Skip candidates that cannot beat the best so far even with
+                # the largest motion bonus, before the parallels check
+                consonance_score = self._consonance_score(cp_note, cf_note)
+                if consonance_score + (MOTION_SCORE_BOUND if prev_cp_note else 0.0) >= best_score:
                     continue
                 
                 # Check parallel motion
-                if prev_cp_note is not None and i > 0:
-                    prev_voices = {
-                        Voice.SOPRANO: prev_cp_note if above else cantus_firmus[i-1],
-                        Voice.BASS: cantus_firmus[i-1] if above else prev_cp_note
-                    }
-                    parallels = self.constraint_checker.check_parallels(prev_voices, voices)
-                    if parallels:
+                if prev_chord is not None:
+                    chord = (cp_note, None, None, cf_note) if above else (cf_note, None, None, cp_note)
+                    if self.constraint_checker.parallels_mask(prev_chord, chord):
                         continue
                 
                 # Score candidate
-                score = self._score_counterpoint_note(cp_note, prev_cp_note, cf_note, above)
-                valid_candidates.append((cp_note, score))
+                score = self._motion_score(cp_note, prev_cp_note, cf_note) + consonance_score
+                if score < best_score:
+                    best_note, best_score = cp_note, score
             
-            if not valid_candidates:
+            if best_note is None:
                 # Fallback: use consonant interval
                 if above:
                     cp_note = cf_note + 7  # Perfect fifth above
                 else:
                     cp_note = cf_note - 7  # Perfect fifth below
             else:
-                valid_candidates.sort(key=lambda x: x[1])
-                cp_note = valid_candidates[0][0]
+                cp_note = best_note
             
-            solutions.append({
-                Voice.SOPRANO: cp_note if above else cf_note,
-                Voice.BASS: cf_note if above else cp_note
-            })
+            cp_notes.append(cp_note)
             prev_cp_note = cp_note
+            prev_chord = (cp_note, None, None, cf_note) if above else (cf_note, None, None, cp_note)
         
-        return solutions
+        return [
+            {
+                Voice.SOPRANO: cp_note if above else cf_note,
+                Voice.BASS: cf_note if above else cp_note
+            }
+            for cp_note, cf_note in zip(cp_notes, cantus_firmus)
+        ]
     
     def _generate_counterpoint_candidates(self, cf_note: int, prev_cp: Optional[int],
-                                         above: bool, is_start: bool, is_end: bool) -> List[int]:
+                                         above: bool, is_start: bool, is_end: bool) -> Tuple[int, ...]:
         """Generate candidate notes for counterpoint."""
-        candidates = []
-        
-        # Preferred intervals: 3, 4, 5, 6, 8 (consonances)
-        intervals = [3, 4, 5, 6, 8, 10]  # m3, M3, P4, P5, M6, m7
-        
-        for interval in intervals:
-            if above:
-                note = cf_note + interval
-            else:
-                note = cf_note - interval
-            
-            # Check range (simplified - assume C4-C5 for counterpoint)
-            if 60 <= note <= 84:
-                candidates.append(note)
-        
-        # Add octave
-        if above:
-            candidates.append(cf_note + 12)
-        else:
-            candidates.append(cf_note - 12)
-        
-        # Start and end on perfect consonance
-        if is_start or is_end:
-            # Prefer unison, octave, or fifth
-            if above:
-                candidates = [cf_note, cf_note + 7, cf_note + 12] + candidates
-            else:
-                candidates = [cf_note, cf_note - 7, cf_note - 12] + candidates
-        
-        return list(set(candidates))  # Remove duplicates
+        return _counterpoint_candidates(cf_note, above, is_start or is_end)
     
     def _score_counterpoint_note(self, cp_note: int, prev_cp: Optional[int],
                                 cf_note: int, above: bool) -> float:
         """Score a counterpoint note."""
+        return self._motion_score(cp_note, prev_cp, cf_note) + self._consonance_score(cp_note, cf_note)
+    
+    def _motion_score(self, cp_note: int, prev_cp: Optional[int], cf_note: int) -> float:
+        """Score the motion into a counterpoint note (never below MOTION_SCORE_BOUND)."""
         score = 0.0
         
         # Prefer stepwise motion
@@ -169,12 +195,15 @@ class CounterpointSolver:
             if (cf_motion * cp_motion) < 0:
                 score -= 2.0  # Bonus for contrary motion
         
+        return score
+    
+    def _consonance_score(self, cp_note: int, cf_note: int) -> float:
+        """Score the interval between a counterpoint note and the cantus firmus."""
         # Prefer perfect consonances
         interval = abs(cp_note - cf_note) % 12
-        if interval in [0, 7]:  # Unison or fifth
-            score -= 1.0
-        
-        return score
+        if (PERFECT_CONSONANCE_MASK >> interval) & 1:  # Unison or fifth
+            return -1.0
+        return 0.0
 
 
 class MelodyHarmonizer:
@@ -183,8 +212,9 @@ class MelodyHarmonizer:
     def __init__(self):
         self.solver = BeamSearchSolver()
         self.constraint_checker = ConstraintChecker()
+        self.scorer = SoftConstraintScorer()
     
-    def harmonize_melody(self, melody: List[int],
+    def harmonize_melody(self, melody: Sequence[int],
                         chord_types: Optional[List[str]] = None) -> List[Dict[Voice, int]]:
         """
         Generate harmony for a given melody.
@@ -196,8 +226,10 @@ class MelodyHarmonizer:
         Returns:
             List of voice dictionaries
         """
-        solutions = []
-        prev_voices = None
+        # Chords are kept as VoiceVecs while searching and only turned into
+        # voice dicts on return
+        solutions: List[VoiceVec] = []
+        prev_voices: Optional[VoiceVec] = None
         
         for i, soprano_note in enumerate(melody):
             # Determine possible bass notes based on melody note
@@ -216,46 +248,36 @@ class MelodyHarmonizer:
             best_solution = None
             best_score = float('inf')
             
+            chord_type = chord_types[i] if chord_types and i < len(chord_types) else "major"
+            
             for bass_candidate in possible_roots:
+                # Alto and tenor candidates are generated inside their ranges,
+                # so the bass is the only note whose range needs checking
+                if self.constraint_checker.hard_constraint_mask(Voice.BASS, bass_candidate):
+                    continue
+                
                 # Generate A and T
-                chord_type = chord_types[i] if chord_types and i < len(chord_types) else "major"
                 chord_tones = self.solver.generate_candidate_notes(Voice.ALTO, bass_candidate, chord_type)
                 tenor_candidates = self.solver.generate_candidate_notes(Voice.TENOR, bass_candidate, chord_type)
+                bass_motion = bass_candidate - prev_voices.b if prev_voices else 0
+                bass_pc = midi_to_pitch_class(bass_candidate)
                 
                 for alto_note in chord_tones[:5]:  # Limit candidates
                     for tenor_note in tenor_candidates[:5]:
-                        voices = {
-                            Voice.SOPRANO: soprano_note,
-                            Voice.ALTO: alto_note,
-                            Voice.TENOR: tenor_note,
-                            Voice.BASS: bass_candidate
-                        }
+                        packed = VoiceVec(soprano_note, alto_note, tenor_note, bass_candidate)
                         
                         # Check constraints
-                        violations = []
-                        for voice, note_val in voices.items():
-                            if voice != Voice.SOPRANO:
-                                vs = self.constraint_checker.check_all_hard_constraints(
-                                    voice, note_val, prev_voices, voices
-                                )
-                                violations.extend(vs)
-                        
-                        if prev_voices:
-                            parallels = self.constraint_checker.check_parallels(prev_voices, voices)
-                            violations.extend(parallels)
-                        
-                        hard_violations = [v for v in violations if v.severity == "hard"]
-                        if hard_violations:
+                        if self.constraint_checker.chord_mask(packed):
+                            continue
+                        if prev_voices and self.constraint_checker.parallels_mask(prev_voices, packed):
                             continue
                         
                         # Score
-                        scorer = SoftConstraintScorer()
-                        bass_motion = bass_candidate - prev_voices[Voice.BASS] if prev_voices else 0
-                        score = scorer.total_score(prev_voices, voices, bass_motion, midi_to_pitch_class(bass_candidate))
+                        score = self.scorer.total_score(prev_voices, packed, bass_motion, bass_pc)
                         
                         if score < best_score:
                             best_score = score
-                            best_solution = voices
+                            best_solution = packed
             
             if best_solution:
                 solutions.append(best_solution)
@@ -263,18 +285,20 @@ class MelodyHarmonizer:
             else:
                 # Fallback
                 if prev_voices:
-                    solutions.append(prev_voices.copy())
-                    solutions[-1][Voice.SOPRANO] = soprano_note
+                    solutions.append(prev_voices._replace(s=soprano_note))
                 else:
-                    solutions.append({
-                        Voice.SOPRANO: soprano_note,
-                        Voice.ALTO: soprano_note - 4,
-                        Voice.TENOR: soprano_note - 7,
-                        Voice.BASS: soprano_note - 12
-                    })
+                    solutions.append(VoiceVec(
+                        soprano_note, soprano_note - 4, soprano_note - 7, soprano_note - 12
+                    ))
                 prev_voices = solutions[-1]
         
-        return solutions
+        return [solution.to_dict() for solution in solutions]
+
+
+def _clip_to_range(voice: Voice, midi_note: int) -> int:
+    """Moves a note to the nearest end of its voice range if it lies outside."""
+    min_note, max_note = VOICE_RANGES[voice]
+    return min(max(midi_note, min_note), max_note)
 
 
 class ErrorCorrector:
@@ -292,48 +316,65 @@ class ErrorCorrector:
             List of error dictionaries with location and description
         """
         errors = []
+        packed_list = [pack_voices(step_voices) for step_voices in voices]
         
         for i in range(len(voices)):
-            curr_voices = voices[i]
-            
-            # Check voice ranges
-            for voice, note_val in curr_voices.items():
-                violation = self.constraint_checker.check_voice_range(voice, note_val)
-                if violation:
-                    errors.append({
-                        "step": i,
-                        "voice": voice.value,
-                        "type": "range",
-                        "description": violation.description
-                    })
-            
-            # Check voice order
-            order_violation = self.constraint_checker.check_voice_order(curr_voices)
-            if order_violation:
+            errors.extend(self._find_step_errors(voices, packed_list, i))
+        
+        return errors
+    
+    def _find_step_errors(self, voices: List[Dict[Voice, int]],
+                          packed_list: List[Tuple[Optional[int], ...]],
+                          i: int) -> List[Dict]:
+        """Find the errors of step i (parallels are checked against step i - 1)."""
+        errors = []
+        curr_voices = voices[i]
+        packed = packed_list[i]
+        
+        # Check voice ranges
+        for voice, note_val in curr_voices.items():
+            if in_voice_range(voice, note_val):
+                continue
+            violation = self.constraint_checker.check_voice_range(voice, note_val)
+            if violation:
                 errors.append({
                     "step": i,
-                    "type": "voice_crossing",
-                    "description": order_violation.description
+                    "voice": voice.value,
+                    "type": "range",
+                    "description": violation.description
                 })
-            
-            # Check spacing
-            spacing_violation = self.constraint_checker.check_spacing(curr_voices)
-            if spacing_violation:
+        
+        chord_mask = self.constraint_checker.chord_mask(packed)
+        
+        # Check voice order
+        order_violation = (self.constraint_checker.check_voice_order(packed)
+                           if chord_mask & RuleCode.VOICE_CROSSING else None)
+        if order_violation:
+            errors.append({
+                "step": i,
+                "type": "voice_crossing",
+                "description": order_violation.description
+            })
+        
+        # Check spacing
+        spacing_violation = (self.constraint_checker.check_spacing(packed)
+                             if chord_mask & RuleCode.SPACING else None)
+        if spacing_violation:
+            errors.append({
+                "step": i,
+                "type": "spacing",
+                "description": spacing_violation.description
+            })
+        
+        # Check parallels with previous step
+        if i > 0:
+            parallels = self.constraint_checker.check_parallels(packed_list[i-1], packed)
+            for violation in parallels:
                 errors.append({
                     "step": i,
-                    "type": "spacing",
-                    "description": spacing_violation.description
+                    "type": "parallelism",
+                    "description": violation.description
                 })
-            
-            # Check parallels with previous step
-            if i > 0:
-                parallels = self.constraint_checker.check_parallels(voices[i-1], curr_voices)
-                for violation in parallels:
-                    errors.append({
-                        "step": i,
-                        "type": "parallelism",
-                        "description": violation.description
-                    })
         
         return errors
     
@@ -352,48 +393,106 @@ class ErrorCorrector:
         corrected = voices.copy()
         
         # Group errors by step
-        errors_by_step = {}
+        errors_by_step = defaultdict(list)
         for error in errors:
-            step = error["step"]
-            if step not in errors_by_step:
-                errors_by_step[step] = []
-            errors_by_step[step].append(error)
+            errors_by_step[error["step"]].append(error)
         
         # Correct each step
-        for step, step_errors in errors_by_step.items():
-            # Try to fix by adjusting notes
-            curr_voices = corrected[step].copy()
+        for step in sorted(errors_by_step):
+            # Try to fix by adjusting notes; the step is only copied once a
+            # note actually changes
+            curr_voices = corrected[step]
             
-            for error in step_errors:
+            for error in errors_by_step[step]:
                 if error["type"] == "range":
-                    voice = Voice[error["voice"]]
+                    voice = Voice(error["voice"])
                     note_val = curr_voices[voice]
-                    min_note, max_note = {
-                        Voice.SOPRANO: (60, 84),
-                        Voice.ALTO: (55, 72),
-                        Voice.TENOR: (48, 69),
-                        Voice.BASS: (40, 60)
-                    }[voice]
+                    clipped = _clip_to_range(voice, note_val)
                     
-                    if note_val < min_note:
-                        curr_voices[voice] = min_note
-                    elif note_val > max_note:
-                        curr_voices[voice] = max_note
+                    if clipped != note_val:
+                        if curr_voices is corrected[step]:
+                            curr_voices = curr_voices.copy()
+                        curr_voices[voice] = clipped
                 
                 # Other error types would need more sophisticated correction
                 # For now, just log them
+            
+            corrected[step] = curr_voices
         
         return corrected
+    
+    def auto_fix(self, voices: List[Dict[Voice, int]]) -> Tuple[List[Dict], List[Dict[Voice, int]]]:
+        """
+        Find and correct errors in a single pass over the steps.
+        
+        Same result as find_errors followed by correct_errors, without
+        grouping the error list by step in between.
+        
+        Returns:
+            (errors, corrected voices)
+        """
+        errors = []
+        corrected = []
+        packed_list = [pack_voices(step_voices) for step_voices in voices]
+        
+        for i, curr_voices in enumerate(voices):
+            errors.extend(self._find_step_errors(voices, packed_list, i))
+            
+            # Range errors are the only ones corrected: clip out-of-range notes
+            fixed_voices = curr_voices
+            for voice, note_val in curr_voices.items():
+                clipped = _clip_to_range(voice, note_val)
+                if clipped == note_val:
+                    continue
+                if fixed_voices is curr_voices:
+                    fixed_voices = curr_voices.copy()
+                fixed_voices[voice] = clipped
+            corrected.append(fixed_voices)
+        
+        return errors, corrected
+
+
+# Voices written out by the two-voice counterpoint exercise
+OUTER_VOICES: Tuple[Voice, ...] = (Voice.SOPRANO, Voice.BASS)
+
+
+def _voice_lines(solutions: List[Dict[Voice, int]],
+                 voices: Tuple[Voice, ...]) -> Dict[Voice, List[int]]:
+    """Regroups per-step solutions into one note list per voice (missing notes are 0)."""
+    return {voice: [solution.get(voice, 0) for solution in solutions] for voice in voices}
+
+
+def _extract_top_line(time_steps: List[Tuple[int, List[int]]]) -> Sequence[int]:
+    """Returns the first note of every non-empty time step, packed as 16-bit ints."""
+    return array('h', [notes[0] for _, notes in time_steps if notes])
 
 
 class ExerciseSolver:
-    """Main class for solving different types of harmony exercises."""
+    """Main class for solving different types of harmony exercises.
     
-    def __init__(self):
-        self.counterpoint_solver = CounterpointSolver()
-        self.melody_harmonizer = MelodyHarmonizer()
-        self.error_corrector = ErrorCorrector()
-        self.explanation_engine = ExplanationEngine()
+    The sub-solvers are built on first use, so solving one exercise only
+    constructs the helper that exercise needs.
+    """
+    
+    @cached_property
+    def counterpoint_solver(self) -> CounterpointSolver:
+        """Solver for counterpoint exercises."""
+        return CounterpointSolver()
+    
+    @cached_property
+    def melody_harmonizer(self) -> MelodyHarmonizer:
+        """Harmonizer for melody exercises."""
+        return MelodyHarmonizer()
+    
+    @cached_property
+    def error_corrector(self) -> ErrorCorrector:
+        """Corrector for error-correction exercises."""
+        return ErrorCorrector()
+    
+    @cached_property
+    def explanation_engine(self) -> ExplanationEngine:
+        """Engine for exercise explanations."""
+        return ExplanationEngine()
     
     def solve_exercise(self, exercise_type: ExerciseType,
                       input_file: str,
@@ -411,101 +510,9 @@ class ExerciseSolver:
         Returns:
             ExerciseResult
         """
+        handler = self._HANDLERS.get(exercise_type)
         try:
-            if exercise_type == ExerciseType.BASS_FIGURED:
-                # This is the default harmonization
-                from harmonizer import Harmonizer
-                harmonizer = Harmonizer()
-                result = harmonizer.harmonize(input_file, output_file)
-                return ExerciseResult(
-                    voices=result.voices,
-                    explanations=result.explanations,
-                    success=result.success,
-                    error_message=result.error_message,
-                    exercise_type=exercise_type
-                )
-            
-            elif exercise_type == ExerciseType.MELODY_HARMONIZATION:
-                time_steps = parse_musicxml(input_file)
-                melody = []
-                for _, notes in time_steps:
-                    if notes:
-                        melody.append(notes[0])  # Assume melody is first voice
-                
-                solutions = self.melody_harmonizer.harmonize_melody(melody)
-                
-                if output_file:
-                    all_voices = {voice: [] for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]}
-                    for solution in solutions:
-                        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-                            all_voices[voice].append(solution.get(voice, 0))
-                    export_to_musicxml(all_voices, output_file)
-                
-                return ExerciseResult(
-                    voices=solutions,
-                    explanations="Melody harmonization completed.",
-                    success=True,
-                    exercise_type=exercise_type
-                )
-            
-            elif exercise_type == ExerciseType.COUNTERPOINT:
-                time_steps = parse_musicxml(input_file)
-                cantus_firmus = []
-                for _, notes in time_steps:
-                    if notes:
-                        cantus_firmus.append(notes[0])
-                
-                above = kwargs.get("above", True)
-                solutions = self.counterpoint_solver.solve_species_1(cantus_firmus, above)
-                
-                if output_file:
-                    all_voices = {Voice.SOPRANO: [], Voice.BASS: []}
-                    for solution in solutions:
-                        all_voices[Voice.SOPRANO].append(solution.get(Voice.SOPRANO, 0))
-                        all_voices[Voice.BASS].append(solution.get(Voice.BASS, 0))
-                    export_to_musicxml(all_voices, output_file)
-                
-                return ExerciseResult(
-                    voices=solutions,
-                    explanations="Counterpoint exercise completed.",
-                    success=True,
-                    exercise_type=exercise_type
-                )
-            
-            elif exercise_type == ExerciseType.ERROR_CORRECTION:
-                time_steps = parse_musicxml(input_file)
-                voices = []
-                for _, notes in time_steps:
-                    # Parse all voices (simplified - would need proper parsing)
-                    voices.append({
-                        Voice.SOPRANO: notes[0] if len(notes) > 0 else 0,
-                        Voice.ALTO: notes[1] if len(notes) > 1 else 0,
-                        Voice.TENOR: notes[2] if len(notes) > 2 else 0,
-                        Voice.BASS: notes[3] if len(notes) > 3 else 0,
-                    })
-                
-                errors = self.error_corrector.find_errors(voices)
-                corrected = self.error_corrector.correct_errors(voices, errors)
-                
-                error_report = f"Found {len(errors)} errors:\n"
-                for error in errors:
-                    error_report += f"Step {error['step']}: {error['description']}\n"
-                
-                if output_file:
-                    all_voices = {voice: [] for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]}
-                    for solution in corrected:
-                        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
-                            all_voices[voice].append(solution.get(voice, 0))
-                    export_to_musicxml(all_voices, output_file)
-                
-                return ExerciseResult(
-                    voices=corrected,
-                    explanations=error_report,
-                    success=True,
-                    exercise_type=exercise_type
-                )
-            
-            else:
+            if handler is None:
                 return ExerciseResult(
                     voices=[],
                     explanations="",
@@ -513,6 +520,7 @@ class ExerciseSolver:
                     error_message=f"Exercise type {exercise_type} not yet implemented",
                     exercise_type=exercise_type
                 )
+            return handler(self, exercise_type, input_file, output_file, **kwargs)
         
         except Exception as e:
             return ExerciseResult(
@@ -522,4 +530,90 @@ class ExerciseSolver:
                 error_message=f"Error: {str(e)}",
                 exercise_type=exercise_type
             )
-
+    
+    def _solve_bass_figured(self, exercise_type: ExerciseType, input_file: str,
+                            output_file: Optional[str], **kwargs) -> ExerciseResult:
+        """Harmonize a figured bass (the default harmonization)."""
+        from harmonizer import Harmonizer
+        harmonizer = Harmonizer()
+        result = harmonizer.harmonize(input_file, output_file)
+        return ExerciseResult(
+            voices=result.voices,
+            explanations=result.explanations,
+            success=result.success,
+            error_message=result.error_message,
+            exercise_type=exercise_type
+        )
+    
+    def _solve_melody_harmonization(self, exercise_type: ExerciseType, input_file: str,
+                                    output_file: Optional[str], **kwargs) -> ExerciseResult:
+        """Harmonize the top line of the input as a soprano melody."""
+        melody = _extract_top_line(parse_musicxml(input_file))  # Assume melody is first voice
+        
+        solutions = self.melody_harmonizer.harmonize_melody(melody)
+        
+        if output_file:
+            export_to_musicxml(_voice_lines(solutions, ALL_VOICES), output_file)
+        
+        return ExerciseResult(
+            voices=solutions,
+            explanations="Melody harmonization completed.",
+            success=True,
+            exercise_type=exercise_type
+        )
+    
+    def _solve_counterpoint(self, exercise_type: ExerciseType, input_file: str,
+                            output_file: Optional[str], **kwargs) -> ExerciseResult:
+        """Write first species counterpoint to the top line of the input."""
+        cantus_firmus = _extract_top_line(parse_musicxml(input_file))
+        
+        above = kwargs.get("above", True)
+        solutions = self.counterpoint_solver.solve_species_1(cantus_firmus, above)
+        
+        if output_file:
+            export_to_musicxml(_voice_lines(solutions, OUTER_VOICES), output_file)
+        
+        return ExerciseResult(
+            voices=solutions,
+            explanations="Counterpoint exercise completed.",
+            success=True,
+            exercise_type=exercise_type
+        )
+    
+    def _solve_error_correction(self, exercise_type: ExerciseType, input_file: str,
+                                output_file: Optional[str], **kwargs) -> ExerciseResult:
+        """Find and correct errors in the four-part harmony of the input."""
+        time_steps = parse_musicxml(input_file)
+        voices = []
+        for _, notes in time_steps:
+            # Parse all voices (simplified - would need proper parsing)
+            voices.append({
+                Voice.SOPRANO: notes[0] if len(notes) > 0 else 0,
+                Voice.ALTO: notes[1] if len(notes) > 1 else 0,
+                Voice.TENOR: notes[2] if len(notes) > 2 else 0,
+                Voice.BASS: notes[3] if len(notes) > 3 else 0,
+            })
+        
+        errors, corrected = self.error_corrector.auto_fix(voices)
+        
+        error_report = f"Found {len(errors)} errors:\n"
+        for error in errors:
+            error_report += f"Step {error['step']}: {error['description']}\n"
+        
+        if output_file:
+            export_to_musicxml(_voice_lines(corrected, ALL_VOICES), output_file)
+        
+        return ExerciseResult(
+            voices=corrected,
+            explanations=error_report,
+            success=True,
+            exercise_type=exercise_type
+        )
+    
+    # Exercise handlers by type; types without one are not implemented yet
+    _HANDLERS = {
+        ExerciseType.BASS_FIGURED: _solve_bass_figured,
+        ExerciseType.MELODY_HARMONIZATION: _solve_melody_harmonization,
+        ExerciseType.COUNTERPOINT: _solve_counterpoint,
+        ExerciseType.ERROR_CORRECTION: _solve_error_correction,
+    }
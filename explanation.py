@@ -1,24 +1,101 @@
 """
 Explanation engine for harmonization decisions.
 """
-from typing import List, Dict, Optional
-from music_utils import Voice, pitch_class_to_name, get_interval_type
-from constraints import ConstraintViolation, ConstraintChecker, SoftConstraintScorer
+import io
+from typing import List, Dict, Optional, NamedTuple, Tuple, TextIO
+from music_utils import Voice, ALL_VOICES, UPPER_VOICES, VOICE_RANGES, PC_TABLE, B_IDX, midi_to_note_name, get_interval_type
+from constraints import ChordVoices, ConstraintViolation, ConstraintChecker, SoftConstraintScorer, pack_voices
 from solver import Solution
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
+
+
+# Section headers of the formatted explanation
+_BANNER = "=" * 50
+_WHY_CHOSEN_HEADER = f"\n\n{_BANNER}\nWHY THIS SOLUTION WAS CHOSEN:\n{_BANNER}"
+_TRADEOFFS_HEADER = f"\n\n{_BANNER}\nTRADEOFFS AND COMPROMISES:\n{_BANNER}"
+_POTENTIAL_ERRORS_HEADER = f"\n\n{_BANNER}\n⚠ POTENTIAL ERRORS TO WATCH FOR:\n{_BANNER}"
+
+
+# Notes at or beyond these (low, high) limits are warned about as close to
+# the edge of the voice range, for each upper voice in UPPER_VOICES order
+_NEAR_RANGE_LIMITS = tuple(
+    (VOICE_RANGES[voice][0] + 2, VOICE_RANGES[voice][1] - 2) for voice in UPPER_VOICES
+)
+
+
+def _root_count(chord: Tuple[Optional[int], ...]) -> int:
+    """Number of notes of a packed chord on the bass's pitch class (the bass included)."""
+    s, a, t, b = chord
+    root_pc = PC_TABLE[b]
+    return (1
+            + (s is not None and PC_TABLE[s] == root_pc)
+            + (a is not None and PC_TABLE[a] == root_pc)
+            + (t is not None and PC_TABLE[t] == root_pc))
 
 
 @dataclass
 class DecisionExplanation:
-    """Explanation of decision for one time step."""
+    """
+    Explanation of decision for one time step.
+    
+    The sections below are computed by the engine on first access and
+    kept, so callers only pay for the ones they read.
+    """
     time_step: int
     chosen_voices: Dict[Voice, int]
-    rejected_alternatives: List[Dict[str, any]]
-    positive_factors: List[str]
-    active_constraints: List[str]
-    why_chosen: List[str]  # Why this solution was chosen
-    potential_errors: List[str]  # Where errors can be made
-    tradeoffs: List[str]  # Tradeoffs between factors
+    engine: "ExplanationEngine" = field(repr=False)
+    chosen_solution: Solution = field(repr=False)
+    all_candidates: List[Solution] = field(repr=False)
+    prev_voices: Optional[Dict[Voice, int]] = field(default=None, repr=False)
+    
+    @cached_property
+    def rejected_alternatives(self) -> List[Dict[str, any]]:
+        return self.engine._get_rejected_alternatives(
+            self.chosen_solution, self.all_candidates, self.prev_voices)
+    
+    @cached_property
+    def positive_factors(self) -> List[str]:
+        return self.engine._get_positive_factors(self.chosen_solution, self.prev_voices)
+    
+    @cached_property
+    def active_constraints(self) -> List[str]:
+        return self.engine._get_active_constraints(self.chosen_solution, self.prev_voices)
+    
+    @cached_property
+    def why_chosen(self) -> List[str]:
+        """Why this solution was chosen."""
+        return self.engine._explain_why_chosen(
+            self.chosen_solution, self._candidate_stats, self.prev_voices)
+    
+    @cached_property
+    def potential_errors(self) -> List[str]:
+        """Where errors can be made."""
+        return self.engine._identify_potential_errors(
+            self.chosen_solution, self.prev_voices, self.all_candidates)
+    
+    @cached_property
+    def tradeoffs(self) -> List[str]:
+        """Tradeoffs between factors."""
+        return self.engine._explain_tradeoffs(
+            self.chosen_solution, self._candidate_stats, self.prev_voices)
+    
+    @cached_property
+    def _candidate_stats(self) -> List["_CandidateStats"]:
+        # Motion statistics of the alternatives, computed in one pass and
+        # shared by why_chosen and tradeoffs
+        if not self.prev_voices:
+            return []
+        return self.engine._candidate_stats(
+            self.chosen_solution, self.all_candidates, self.prev_voices)
+
+
+class _CandidateStats(NamedTuple):
+    """What the explanations compare about one alternative to the chosen chord."""
+    candidate: Solution
+    same_notes: int  # Upper voices sharing the chosen note
+    motion: int  # Total upper-voice motion from the previous chord
+    contrary: int  # Upper voices moving against the bass
 
 
 class ExplanationEngine:
@@ -34,6 +111,8 @@ class ExplanationEngine:
         """
         Generates explanation for chosen solution.
         
+        The explanation sections are computed lazily, on first access.
+        
         Args:
             time_step: time step number
             chosen_solution: chosen solution
@@ -43,31 +122,44 @@ class ExplanationEngine:
         Returns:
             DecisionExplanation
         """
-        # Get rejected alternatives
+        return DecisionExplanation(
+            time_step=time_step,
+            chosen_voices=chosen_solution.voices,
+            engine=self,
+            chosen_solution=chosen_solution,
+            all_candidates=all_candidates,
+            prev_voices=prev_voices
+        )
+    
+    def _get_rejected_alternatives(self, chosen_solution: Solution,
+                                   all_candidates: List[Solution],
+                                   prev_voices: Optional[Dict[Voice, int]]) -> List[Dict[str, any]]:
+        """Lists the candidates not chosen, with the reason each lost."""
         rejected = []
+        # Hard-violation messages per distinct chord; candidates often repeat
+        # a chord with another score, and the checks only depend on the notes
+        # (in the order the candidate lists them)
+        hard_messages_by_chord = {}
+        # Candidates are told apart from the chosen chord by their packed notes
+        chosen = pack_voices(chosen_solution.voices)
         for candidate in all_candidates:
-            if candidate.voices == chosen_solution.voices:
+            if pack_voices(candidate.voices) == chosen:
                 continue
             
             # Check why this candidate was rejected
-            violations = []
-            for voice, note_val in candidate.voices.items():
-                if voice != Voice.BASS:
-                    vs = self.constraint_checker.check_all_hard_constraints(
-                        voice, note_val, prev_voices, candidate.voices
-                    )
-                    violations.extend(vs)
-            
-            if prev_voices:
-                parallel_vs = self.constraint_checker.check_parallels(prev_voices, candidate.voices)
-                violations.extend(parallel_vs)
+            chord_key = tuple(candidate.voices.items())
+            hard_messages = hard_messages_by_chord.get(chord_key)
+            if hard_messages is None:
+                hard_messages = self._hard_violation_messages(
+                    candidate.voices, prev_voices, candidate.hard_violations
+                )
+                hard_messages_by_chord[chord_key] = hard_messages
             
-            hard_violations = [v for v in violations if v.severity == "hard"]
-            if hard_violations:
+            if hard_messages:
                 rejected.append({
                     "voices": candidate.voices,
                     "reason": "hard_constraint_violation",
-                    "violations": [v.description for v in hard_violations]
+                    "violations": list(hard_messages)
                 })
             elif candidate.score > chosen_solution.score:
                 rejected.append({
@@ -77,31 +169,95 @@ class ExplanationEngine:
                     "chosen_score": chosen_solution.score
                 })
         
-        # Get positive factors
-        positive_factors = self._get_positive_factors(chosen_solution, prev_voices)
-        
-        # Get active constraints
-        active_constraints = self._get_active_constraints(chosen_solution, prev_voices)
+        return rejected
+    
+    def _candidate_stats(self, chosen_solution: Solution,
+                         all_candidates: List[Solution],
+                         prev_voices: Dict[Voice, int]) -> List[_CandidateStats]:
+        """Collects _CandidateStats for every candidate other than the chosen one."""
+        chosen = pack_voices(chosen_solution.voices)
+        prev = pack_voices(prev_voices)
+        stats = []
+        for candidate in all_candidates:
+            curr = pack_voices(candidate.voices)
+            if curr == chosen:
+                continue
+            same_notes = sum(1 for curr_note, chosen_note in zip(curr[:B_IDX], chosen[:B_IDX])
+                             if curr_note == chosen_note)
+            stats.append(_CandidateStats(
+                candidate, same_notes,
+                self._calculate_total_motion(curr, prev),
+                self._count_contrary_motions(curr, prev),
+            ))
+        return stats
+    
+    def _hard_violation_messages(self, voices: Dict[Voice, int],
+                                 prev_voices: Optional[Dict[Voice, int]],
+                                 chord_violations: Optional[Tuple[ConstraintViolation, ...]] = None) -> List[str]:
+        """
+        Descriptions of the hard violations that reject a candidate chord.
         
-        # Explain why this solution was chosen
-        why_chosen = self._explain_why_chosen(chosen_solution, all_candidates, prev_voices)
+        Args:
+            voices: candidate chord
+            prev_voices: previous voices
+            chord_violations: the chord's own violations if already checked
+                (Solution.hard_violations), None to check them here
+        """
+        if chord_violations == ():
+            # The solver already found the chord itself valid, which leaves
+            # only its motion from the previous chord to check
+            if (not prev_voices or voices == prev_voices
+                    or not self.constraint_checker.parallels_mask(prev_voices, voices)):
+                return []
+            parallels = self.constraint_checker.check_parallels(prev_voices, voices)
+            return [v.description for v in parallels if v.severity == "hard"]
+        
+        # Messages are only built for chords whose masks flag a rule
+        if not self._rejection_mask(voices, prev_voices):
+            return []
+        violations = self._rejection_violations(voices, prev_voices)
+        return [v.description for v in violations if v.severity == "hard"]
+    
+    def _rejection_mask(self, voices: Dict[Voice, int],
+                        prev_voices: Optional[Dict[Voice, int]]) -> int:
+        """
+        RuleCode bits of the rules checked by _rejection_violations.
         
-        # Identify potential error locations
-        potential_errors = self._identify_potential_errors(chosen_solution, prev_voices, all_candidates)
+        Returns 0 when every rule holds. The chord rules are checked first
+        and, if any fails, their bits are returned without checking the
+        parallels, since one failing rule is enough to reject.
+        """
+        checker = self.constraint_checker
+        upper_notes = [(voice, note_val) for voice, note_val in voices.items()
+                       if voice != Voice.BASS]
+        mask = checker.chord_mask(voices) if upper_notes else 0
+        for voice, note_val in upper_notes:
+            mask |= checker.hard_constraint_mask(voice, note_val)
+        if mask:
+            return mask
+        
+        # Parallels need at least two voices in motion, so a chord that
+        # repeats the previous one cannot have any
+        if prev_voices and voices != prev_voices:
+            mask |= checker.parallels_mask(prev_voices, voices)
+        return mask
+    
+    def _rejection_violations(self, voices: Dict[Voice, int],
+                              prev_voices: Optional[Dict[Voice, int]]) -> List[ConstraintViolation]:
+        """Hard-constraint and parallel violations of a candidate chord."""
+        violations = []
+        for voice, note_val in voices.items():
+            if voice != Voice.BASS:
+                vs = self.constraint_checker.check_all_hard_constraints(
+                    voice, note_val, prev_voices, voices
+                )
+                violations.extend(vs)
         
-        # Explain tradeoffs
-        tradeoffs = self._explain_tradeoffs(chosen_solution, all_candidates, prev_voices)
+        if prev_voices:
+            parallel_vs = self.constraint_checker.check_parallels(prev_voices, voices)
+            violations.extend(parallel_vs)
         
-        return DecisionExplanation(
-            time_step=time_step,
-            chosen_voices=chosen_solution.voices,
-            rejected_alternatives=rejected,
-            positive_factors=positive_factors,
-            active_constraints=active_constraints,
-            why_chosen=why_chosen,
-            potential_errors=potential_errors,
-            tradeoffs=tradeoffs
-        )
+        return violations
     
     def _get_positive_factors(self, solution: Solution, 
                               prev_voices: Optional[Dict[Voice, int]]) -> List[str]:
@@ -112,10 +268,9 @@ class ExplanationEngine:
             return ["Initial chord - no motion constraints"]
         
         # Check voice motion
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-            prev_note = prev_voices.get(voice)
-            curr_note = solution.voices.get(voice)
-            
+        curr, prev = pack_voices(solution.voices), pack_voices(prev_voices)
+        bass_motion = solution.voices[Voice.BASS] - prev_voices[Voice.BASS]
+        for voice, curr_note, prev_note in zip(UPPER_VOICES, curr, prev):
             if prev_note and curr_note:
                 motion = abs(curr_note - prev_note)
                 if motion == 0:
@@ -124,14 +279,12 @@ class ExplanationEngine:
                     factors.append(f"{voice.value} moves stepwise ({motion} semitones)")
                 
                 # Check counterpoint with bass
-                bass_motion = solution.voices[Voice.BASS] - prev_voices[Voice.BASS]
                 voice_motion = curr_note - prev_note
                 if bass_motion != 0 and voice_motion != 0 and (bass_motion * voice_motion < 0):
                     factors.append(f"{voice.value} moves contrary to bass (good counterpoint)")
         
         # Check doubling
-        root_pc = solution.voices[Voice.BASS] % 12
-        root_count = sum(1 for v in solution.voices.values() if v % 12 == root_pc)
+        root_count = _root_count(curr)
         if root_count >= 2:
             factors.append(f"Root is doubled ({root_count} times)")
         
@@ -163,7 +316,7 @@ class ExplanationEngine:
         return constraints
     
     def _explain_why_chosen(self, chosen_solution: Solution,
-                           all_candidates: List[Solution],
+                           candidate_stats: List[_CandidateStats],
                            prev_voices: Optional[Dict[Voice, int]]) -> List[str]:
         """Explains why this solution was chosen over alternatives."""
         explanations = []
@@ -173,21 +326,13 @@ class ExplanationEngine:
             return explanations
         
         # Find similar alternatives for comparison
-        similar_candidates = []
-        for candidate in all_candidates:
-            if candidate.voices == chosen_solution.voices:
-                continue
-            # Count number of identical notes
-            same_notes = sum(1 for v in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR] 
-                           if candidate.voices.get(v) == chosen_solution.voices.get(v))
-            if same_notes >= 2:  # Similar solutions (2+ identical notes)
-                similar_candidates.append((candidate, same_notes))
-        
-        # Sort by similarity
-        similar_candidates.sort(key=lambda x: x[1], reverse=True)
+        # Similar solutions (2+ identical notes)
+        similar_candidates = [stats for stats in candidate_stats if stats.same_notes >= 2]
         
         if similar_candidates:
-            best_alt = similar_candidates[0][0]
+            # Most similar; the first one found wins ties
+            best_stats = max(similar_candidates, key=lambda stats: stats.same_notes)
+            best_alt = best_stats.candidate
             score_diff = best_alt.score - chosen_solution.score
             
             explanations.append(f"Chosen over {len(similar_candidates)} similar alternatives.")
@@ -195,14 +340,14 @@ class ExplanationEngine:
             
             # Compare specific factors
             chosen_motion = self._calculate_total_motion(chosen_solution.voices, prev_voices)
-            alt_motion = self._calculate_total_motion(best_alt.voices, prev_voices)
+            alt_motion = best_stats.motion
             
             if chosen_motion < alt_motion:
                 explanations.append(f"Chosen solution has less total voice motion ({chosen_motion} semitones vs {alt_motion})")
             
             # Check counterpoint
             chosen_contrary = self._count_contrary_motions(chosen_solution.voices, prev_voices)
-            alt_contrary = self._count_contrary_motions(best_alt.voices, prev_voices)
+            alt_contrary = best_stats.contrary
             
             if chosen_contrary > alt_contrary:
                 explanations.append(f"Chosen solution has more contrary motion with bass ({chosen_contrary} voices vs {alt_contrary})")
@@ -222,49 +367,39 @@ class ExplanationEngine:
         if not prev_voices:
             return ["Initial chord: ensure proper voice spacing and root doubling"]
         
+        curr, prev = pack_voices(solution.voices), pack_voices(prev_voices)
+        
         # Check edge cases
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-            note_val = solution.voices.get(voice)
+        for voice, note_val, (low_limit, high_limit) in zip(UPPER_VOICES, curr, _NEAR_RANGE_LIMITS):
             if note_val:
-                min_note, max_note = {
-                    Voice.SOPRANO: (60, 84),
-                    Voice.ALTO: (55, 72),
-                    Voice.TENOR: (48, 69)
-                }[voice]
-                
-                if note_val <= min_note + 2:
+                if note_val <= low_limit:
                     errors.append(f"{voice.value} is near lower range limit ({note_val}), risk of going out of range")
-                if note_val >= max_note - 2:
+                if note_val >= high_limit:
                     errors.append(f"{voice.value} is near upper range limit ({note_val}), risk of going out of range")
         
         # Check for potential parallelisms in next step
         # (hard to predict, but can warn)
         bass_motion = solution.voices[Voice.BASS] - prev_voices[Voice.BASS]
         if bass_motion != 0:
-            for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-                voice_motion = solution.voices[voice] - prev_voices.get(voice, solution.voices[voice])
+            for voice, curr_note, prev_note in zip(UPPER_VOICES, curr, prev):
+                voice_motion = curr_note - prev_note if prev_note is not None else 0
                 if voice_motion != 0 and (bass_motion * voice_motion > 0):
                     errors.append(f"{voice.value} moves parallel with bass - be careful in next step to avoid hidden parallelisms")
         
         # Check for large leaps
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-            prev_note = prev_voices.get(voice)
-            curr_note = solution.voices.get(voice)
+        for voice, curr_note, prev_note in zip(UPPER_VOICES, curr, prev):
             if prev_note and curr_note:
                 motion = abs(curr_note - prev_note)
                 if motion > 7:
                     errors.append(f"{voice.value} makes a large leap ({motion} semitones) - ensure proper voice leading in next step")
         
         # Check doublings
-        root_pc = solution.voices[Voice.BASS] % 12
-        root_count = sum(1 for v in solution.voices.values() if v % 12 == root_pc)
+        root_count = _root_count(curr)
         if root_count < 2:
             errors.append(f"Root is not doubled (only {root_count} occurrence) - may cause weak harmonic foundation")
         
         # Check chord spacing
-        s = solution.voices.get(Voice.SOPRANO)
-        a = solution.voices.get(Voice.ALTO)
-        t = solution.voices.get(Voice.TENOR)
+        s, a, t, _ = curr
         if s and a and t:
             sa_interval = abs(s - a)
             at_interval = abs(a - t)
@@ -274,7 +409,7 @@ class ExplanationEngine:
         return errors
     
     def _explain_tradeoffs(self, chosen_solution: Solution,
-                          all_candidates: List[Solution],
+                          candidate_stats: List[_CandidateStats],
                           prev_voices: Optional[Dict[Voice, int]]) -> List[str]:
         """Explains tradeoffs between different factors."""
         tradeoffs = []
@@ -293,22 +428,17 @@ class ExplanationEngine:
             tradeoffs.append("Contrary motion prioritized over minimal motion - more voice movement for better counterpoint")
         
         # Check if there are alternatives with better counterpoint but worse motion
-        better_contrary_candidates = []
-        for candidate in all_candidates:
-            if candidate.voices == chosen_solution.voices:
-                continue
-            alt_contrary = self._count_contrary_motions(candidate.voices, prev_voices)
-            alt_motion = self._calculate_total_motion(candidate.voices, prev_voices)
-            if alt_contrary > contrary_count and alt_motion > total_motion:
-                better_contrary_candidates.append((candidate, alt_contrary, alt_motion))
+        better_contrary_candidates = [
+            stats for stats in candidate_stats
+            if stats.contrary > contrary_count and stats.motion > total_motion
+        ]
         
         if better_contrary_candidates:
-            best_alt = max(better_contrary_candidates, key=lambda x: x[1])
-            tradeoffs.append(f"Alternative with better contrary motion ({best_alt[1]} vs {contrary_count}) rejected due to excessive voice motion ({best_alt[2]} vs {total_motion} semitones)")
+            best_alt = max(better_contrary_candidates, key=lambda stats: stats.contrary)
+            tradeoffs.append(f"Alternative with better contrary motion ({best_alt.contrary} vs {contrary_count}) rejected due to excessive voice motion ({best_alt.motion} vs {total_motion} semitones)")
         
         # Doubling vs spacing
-        root_pc = chosen_solution.voices[Voice.BASS] % 12
-        root_count = sum(1 for v in chosen_solution.voices.values() if v % 12 == root_pc)
+        root_count = _root_count(pack_voices(chosen_solution.voices))
         
         if root_count >= 2:
             # Check if we sacrificed spacing for doubling
@@ -322,35 +452,30 @@ class ExplanationEngine:
         
         return tradeoffs
     
-    def _calculate_total_motion(self, curr_voices: Dict[Voice, int],
-                               prev_voices: Dict[Voice, int]) -> int:
+    def _calculate_total_motion(self, curr_voices: ChordVoices,
+                               prev_voices: ChordVoices) -> int:
         """Calculates total motion of all voices."""
-        total = 0
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-            prev_note = prev_voices.get(voice)
-            curr_note = curr_voices.get(voice)
-            if prev_note and curr_note:
-                total += abs(curr_note - prev_note)
-        return total
+        curr, prev = pack_voices(curr_voices), pack_voices(prev_voices)
+        return sum(
+            abs(curr_note - prev_note)
+            for curr_note, prev_note in zip(curr[:B_IDX], prev[:B_IDX])
+            if prev_note and curr_note
+        )
     
-    def _count_contrary_motions(self, curr_voices: Dict[Voice, int],
-                               prev_voices: Dict[Voice, int]) -> int:
+    def _count_contrary_motions(self, curr_voices: ChordVoices,
+                               prev_voices: ChordVoices) -> int:
         """Counts number of voices moving contrapuntally with bass."""
-        count = 0
-        bass_motion = curr_voices[Voice.BASS] - prev_voices[Voice.BASS]
+        curr, prev = pack_voices(curr_voices), pack_voices(prev_voices)
+        bass_motion = curr[B_IDX] - prev[B_IDX]
         
         if bass_motion == 0:
             return 0
         
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR]:
-            prev_note = prev_voices.get(voice)
-            curr_note = curr_voices.get(voice)
-            if prev_note and curr_note:
-                voice_motion = curr_note - prev_note
-                if voice_motion != 0 and (bass_motion * voice_motion < 0):
-                    count += 1
-        
-        return count
+        # Opposite signs make the product negative (and rule out no motion)
+        return sum(
+            1 for curr_note, prev_note in zip(curr[:B_IDX], prev[:B_IDX])
+            if prev_note and curr_note and bass_motion * (curr_note - prev_note) < 0
+        )
     
     def _calculate_spacing_variance(self, s: int, a: int, t: int) -> float:
         """Calculates variance of intervals between upper voices."""
@@ -363,72 +488,82 @@ class ExplanationEngine:
     
     def format_explanation(self, explanation: DecisionExplanation) -> str:
         """Formats explanation into readable text."""
-        lines = []
-        lines.append(f"\n=== Measure {explanation.time_step + 1} ===")
-        lines.append("\nChosen harmony:")
+        out = io.StringIO()
+        self._write_explanation(explanation, out)
+        return out.getvalue()
+    
+    def _write_explanation(self, explanation: DecisionExplanation, out: TextIO):
+        """Writes the text of format_explanation to out (no trailing newline)."""
+        write = out.write
+        write(f"\n=== Measure {explanation.time_step + 1} ===")
+        write("\n\nChosen harmony:")
         
-        for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
+        for voice in ALL_VOICES:
             midi = explanation.chosen_voices.get(voice)
             if midi:
-                pc = midi % 12
-                note_name = pitch_class_to_name(pc)
-                octave = (midi // 12) - 1
-                lines.append(f"  {voice.value}: {note_name}{octave} (MIDI {midi})")
+                write(f"\n  {voice.value}: {midi_to_note_name(midi)} (MIDI {midi})")
         
         if explanation.positive_factors:
-            lines.append("\nPositive factors:")
+            write("\n\nPositive factors:")
             for factor in explanation.positive_factors:
-                lines.append(f"  ✓ {factor}")
+                write(f"\n  ✓ {factor}")
         
         if explanation.rejected_alternatives:
-            lines.append(f"\nRejected alternatives ({len(explanation.rejected_alternatives)}):")
+            write(f"\n\nRejected alternatives ({len(explanation.rejected_alternatives)}):")
             for i, alt in enumerate(explanation.rejected_alternatives[:5], 1):  # Show first 5
                 voices_str = ", ".join([f"{v.value}:{n}" for v, n in alt['voices'].items() if v != Voice.BASS])
                 if alt['reason'] == 'hard_constraint_violation':
-                    lines.append(f"  {i}. {voices_str}")
+                    write(f"\n  {i}. {voices_str}")
                     for violation in alt['violations'][:2]:  # First 2 violations
-                        lines.append(f"     ✗ {violation}")
+                        write(f"\n     ✗ {violation}")
                 else:
-                    lines.append(f"  {i}. {voices_str} (score: {alt.get('score', 'N/A')} > {alt.get('chosen_score', 'N/A')})")
+                    write(f"\n  {i}. {voices_str} (score: {alt.get('score', 'N/A')} > {alt.get('chosen_score', 'N/A')})")
         
         if explanation.active_constraints:
-            lines.append("\nActive constraints:")
+            write("\n\nActive constraints:")
             for constraint in explanation.active_constraints:
-                lines.append(f"  • {constraint}")
+                write(f"\n  • {constraint}")
         
         if explanation.why_chosen:
-            lines.append("\n" + "="*50)
-            lines.append("WHY THIS SOLUTION WAS CHOSEN:")
-            lines.append("="*50)
+            write(_WHY_CHOSEN_HEADER)
             for reason in explanation.why_chosen:
-                lines.append(f"  → {reason}")
+                write(f"\n  → {reason}")
         
         if explanation.tradeoffs:
-            lines.append("\n" + "="*50)
-            lines.append("TRADEOFFS AND COMPROMISES:")
-            lines.append("="*50)
+            write(_TRADEOFFS_HEADER)
             for tradeoff in explanation.tradeoffs:
-                lines.append(f"  ⚖ {tradeoff}")
+                write(f"\n  ⚖ {tradeoff}")
         
         if explanation.potential_errors:
-            lines.append("\n" + "="*50)
-            lines.append("⚠ POTENTIAL ERRORS TO WATCH FOR:")
-            lines.append("="*50)
+            write(_POTENTIAL_ERRORS_HEADER)
             for error in explanation.potential_errors:
-                lines.append(f"  ⚠ {error}")
-        
-        return "\n".join(lines)
+                write(f"\n  ⚠ {error}")
     
     def generate_full_explanation(self, solutions: List[Solution],
-                                 all_candidates_per_step: List[List[Solution]]) -> str:
-        """Generates full explanation for entire sequence."""
-        explanations = []
+                                 all_candidates_per_step: List[List[Solution]],
+                                 out: Optional[TextIO] = None) -> Optional[str]:
+        """
+        Generates full explanation for entire sequence.
+        
+        Args:
+            solutions: chosen solution for each step
+            all_candidates_per_step: candidates for each step
+            out: stream to write the explanation to as each step is
+                explained; when omitted the text is returned instead
+        
+        Returns:
+            The explanation text, or None when it was written to out
+        """
+        # All steps are written into one stream rather than joining the
+        # text of each step at the end
+        stream = out if out is not None else io.StringIO()
         prev_voices = None
         
         for i, (solution, candidates) in enumerate(zip(solutions, all_candidates_per_step)):
             expl = self.explain_decision(i, solution, candidates, prev_voices)
-            explanations.append(self.format_explanation(expl))
+            if i:
+                stream.write("\n")
+            self._write_explanation(expl, stream)
             prev_voices = solution.voices
         
-        return "\n".join(explanations)
-
+        return stream.getvalue() if out is None else None
@@ -2,7 +2,8 @@
 Harmonic function system for functional harmony.
 Supports Tonic (T), Subdominant (S), Dominant (D) with various parameters.
 """
-from typing import List, Dict, Optional, Set
+from typing import List, Optional, Set, Tuple
+from functools import lru_cache
 from dataclasses import dataclass
 from enum import Enum
 from music_utils import Voice, midi_to_pitch_class, pitch_class_to_name, get_chord_tones
@@ -17,14 +18,68 @@ class HarmonicFunctionType(Enum):
     CHOPIN = "Ch"
 
 
-@dataclass
+# A piece only uses a handful of distinct functions, so their chord tones
+# are computed once per distinct (type, root, extra, alterations, minor)
+@lru_cache(maxsize=512)
+def _compute_tones(func_type: HarmonicFunctionType, root: int,
+                   extra: Optional[Tuple[int, ...]],
+                   alterations: Optional[Tuple[Tuple[int, str], ...]],
+                   is_minor: bool) -> Tuple[int, ...]:
+    """Pitch classes of the chord tones of a harmonic function."""
+    # Base chord tones
+    if func_type == HarmonicFunctionType.TONIC:
+        if is_minor:
+            tones = [root, (root + 3) % 12, (root + 7) % 12]
+        else:
+            tones = [root, (root + 4) % 12, (root + 7) % 12]
+    elif func_type == HarmonicFunctionType.SUBDOMINANT:
+        if is_minor:
+            tones = [root, (root + 3) % 12, (root + 7) % 12]
+        else:
+            tones = [root, (root + 4) % 12, (root + 7) % 12]
+    elif func_type == HarmonicFunctionType.DOMINANT:
+        tones = [root, (root + 4) % 12, (root + 7) % 12]
+        if extra and 7 in extra:
+            tones.append((root + 10) % 12)
+        if extra and 9 in extra:
+            tones.append((root + 2) % 12)
+    elif func_type == HarmonicFunctionType.NEAPOLITAN:
+        # Neapolitan chord: bII
+        tones = [(root - 1) % 12, (root + 3) % 12, (root + 7) % 12]
+    elif func_type == HarmonicFunctionType.CHOPIN:
+        # Chopin chord: specific voicing
+        tones = [root, (root + 4) % 12, (root + 7) % 12, (root + 10) % 12]
+    else:
+        tones = [root, (root + 4) % 12, (root + 7) % 12]
+    
+    # Apply alterations
+    if alterations:
+        for interval, alt_type in alterations:
+            if alt_type == "<":  # Lowered
+                tones = [(t - 1) % 12 if (t - root) % 12 == interval else t for t in tones]
+            elif alt_type == ">":  # Raised
+                tones = [(t + 1) % 12 if (t - root) % 12 == interval else t for t in tones]
+    
+    return tuple(tones)
+
+
+@lru_cache(maxsize=512)
+def _tones_mask(tones: Tuple[int, ...]) -> int:
+    """12-bit set of pitch classes: bit pc is set for each pitch class in tones."""
+    mask = 0
+    for pc in tones:
+        mask |= 1 << pc
+    return mask
+
+
+@dataclass(frozen=True)
 class HarmonicFunction:
     """Represents a harmonic function with parameters."""
     func_type: HarmonicFunctionType
     root_pc: int  # Pitch class of root (0-11)
     position: Optional[int] = None  # Inversion: 1, 2, 3, or None for root
-    extra: Optional[List[int]] = None  # Extra tones: [7], [9], [7, 9], etc.
-    alterations: Optional[Dict[int, str]] = None  # Alterations: {5: "<"} for lowered 5th
+    extra: Optional[Tuple[int, ...]] = None  # Extra tones: (7,), (9,), (7, 9), etc.
+    alterations: Optional[Tuple[Tuple[int, str], ...]] = None  # Alterations: ((5, "<"),) for lowered 5th
     is_related_backwards: bool = False  # For deflections
     is_related_forwards: bool = False  # For deflections
     is_minor: bool = False  # Minor variant
@@ -41,7 +96,7 @@ class HarmonicFunction:
             parts.append(f"extra: {extra_str}")
         
         if self.alterations:
-            alt_str = ", ".join([f"{k}: {v}" for k, v in self.alterations.items()])
+            alt_str = ", ".join([f"{k}: {v}" for k, v in self.alterations])
             parts.append(f"alterations: {alt_str}")
         
         if self.is_related_backwards:
@@ -58,64 +113,45 @@ class HarmonicFunction:
     
     def get_chord_tones(self) -> List[int]:
         """Get pitch classes of chord tones."""
-        root = self.root_pc
-        
-        # Base chord tones
-        if self.func_type == HarmonicFunctionType.TONIC:
-            if self.is_minor:
-                tones = [root, (root + 3) % 12, (root + 7) % 12]
-            else:
-                tones = [root, (root + 4) % 12, (root + 7) % 12]
-        elif self.func_type == HarmonicFunctionType.SUBDOMINANT:
-            if self.is_minor:
-                tones = [root, (root + 3) % 12, (root + 7) % 12]
-            else:
-                tones = [root, (root + 4) % 12, (root + 7) % 12]
-        elif self.func_type == HarmonicFunctionType.DOMINANT:
-            tones = [root, (root + 4) % 12, (root + 7) % 12]
-            if self.extra and 7 in self.extra:
-                tones.append((root + 10) % 12)
-            if self.extra and 9 in self.extra:
-                tones.append((root + 2) % 12)
-        elif self.func_type == HarmonicFunctionType.NEAPOLITAN:
-            # Neapolitan chord: bII
-            tones = [(root - 1) % 12, (root + 3) % 12, (root + 7) % 12]
-        elif self.func_type == HarmonicFunctionType.CHOPIN:
-            # Chopin chord: specific voicing
-            tones = [root, (root + 4) % 12, (root + 7) % 12, (root + 10) % 12]
-        else:
-            tones = [root, (root + 4) % 12, (root + 7) % 12]
-        
-        # Apply alterations
-        if self.alterations:
-            for interval, alt_type in self.alterations.items():
-                if alt_type == "<":  # Lowered
-                    tones = [(t - 1) % 12 if (t - root) % 12 == interval else t for t in tones]
-                elif alt_type == ">":  # Raised
-                    tones = [(t + 1) % 12 if (t - root) % 12 == interval else t for t in tones]
+        return list(self._chord_tones())
+    
+    def get_chord_tones_mask(self) -> int:
+        """
+        Get chord tones as a 12-bit pitch-class set.
         
-        return tones
+        Returns:
+            int with bit pc set for every chord tone, so membership is
+            (mask >> pc) & 1 and shared tones are mask & other_mask
+        """
+        return _tones_mask(self._chord_tones())
+    
+    def _chord_tones(self) -> Tuple[int, ...]:
+        """Cached chord tones, shared between calls (do not mutate)."""
+        return _compute_tones(self.func_type, self.root_pc, self.extra,
+                              self.alterations, self.is_minor)
     
     def get_bass_note_pc(self) -> int:
         """Get pitch class of bass note based on position."""
-        tones = self.get_chord_tones()
+        tones = self._chord_tones()
+        position = self.position or 0
         
-        if self.position is None or self.position == 0:
-            return tones[0]  # Root position
-        elif self.position == 1 and len(tones) > 1:
-            return tones[1]  # First inversion
-        elif self.position == 2 and len(tones) > 2:
-            return tones[2]  # Second inversion
-        elif self.position == 3 and len(tones) > 3:
-            return tones[3]  # Third inversion
-        else:
-            return tones[0]  # Fallback to root
+        # Inversions 1-3 put that chord tone in the bass; root position,
+        # and any position the chord has no tone for, fall back to the root
+        if 0 < position <= 3 and position < len(tones):
+            return tones[position]
+        return tones[0]
 
 
+# Pieces repeat the same few function strings, and the parsed functions
+# are immutable (frozen, with tuple fields), so one instance is shared by
+# every parse of the same string
+@lru_cache(maxsize=256)
 def parse_harmonic_function(func_str: str, key_pc: int = 0) -> Optional[HarmonicFunction]:
     """
     Parse harmonic function string like "T{}", "D{extra: 7}", "S{position: 3}".
     
+    Results are cached; the returned function is immutable.
+    
     Args:
         func_str: Function string
         key_pc: Pitch class of key (0=C, 2=D, etc.)
@@ -159,15 +195,16 @@ def parse_harmonic_function(func_str: str, key_pc: int = 0) -> Optional[Harmonic
                     params["position"] = int(value)
                 elif key == "extra":
                     # Parse list like "7" or "7, 9"
-                    extra_list = [int(x.strip()) for x in value.split(",")]
-                    params["extra"] = extra_list
+                    params["extra"] = tuple(int(x.strip()) for x in value.split(","))
                 elif key == "alterations":
-                    # Parse dict like "5: <"
-                    params["alterations"] = {}
+                    # Parse pairs like "5: <"; a repeated interval keeps
+                    # its last alteration
+                    alterations = {}
                     for alt in value.split(","):
                         if ":" in alt:
                             k, v = alt.split(":", 1)
-                            params["alterations"][int(k.strip())] = v.strip()
+                            alterations[int(k.strip())] = v.strip()
+                    params["alterations"] = tuple(alterations.items())
             else:
                 # Boolean flags
                 if part == "isRelatedBackwards":
@@ -1,14 +1,15 @@
 """
 Main class for four-part harmony generation.
 """
-from typing import List, Dict, Optional
-from music_utils import Voice, parse_musicxml, export_to_musicxml
+from typing import IO, List, Dict, Optional, Iterator, Sequence, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from music_utils import Voice, ALL_VOICES, parse_musicxml, export_to_musicxml
 from solver import BeamSearchSolver, Solution
 from explanation import ExplanationEngine
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class HarmonizationResult:
     """Result of harmonization."""
     voices: List[Dict[Voice, int]]
@@ -17,27 +18,78 @@ class HarmonizationResult:
     error_message: Optional[str] = None
 
 
+# Shortest segment of a bass line worth handing to a worker process
+_MIN_SEGMENT_LENGTH = 16
+
+
+def _track_steps(solver: BeamSearchSolver, bass_line: List[int], chord_types: Sequence[str],
+                 start: int, end: int,
+                 prev_solutions: List[Solution]) -> Iterator[Tuple[List[Solution], List[Solution]]]:
+    """
+    Solves steps start..end-1 of a bass line after the given beam.
+    
+    Yields:
+        (solve_step result, beam carried to the next step) per step; the
+        beam differs from the result only when a step found no solution
+    """
+    for i in range(start, end):
+        bass_note = bass_line[i]
+        chord_type = chord_types[i] if i < len(chord_types) else "major"
+        
+        solutions = solver.solve_step(bass_note, prev_solutions, chord_type)
+        beam = solutions
+        if not solutions:
+            if prev_solutions:
+                prev_voices = prev_solutions[0].voices.copy()
+                prev_voices[Voice.BASS] = bass_note
+                beam = [Solution(voices=prev_voices, score=100.0, violations=[])]
+            else:
+                raise ValueError(f"No valid solution found for step {i}")
+        
+        yield solutions, beam
+        prev_solutions = beam
+
+
+def _solve_segment(solver: BeamSearchSolver, bass_line: List[int], chord_types: Sequence[str],
+                   start: int, end: int) -> Optional[List[Tuple[List[Solution], List[Solution]]]]:
+    """Worker side of the parallel solve: steps start..end-1 from an empty beam (None if that fails)."""
+    try:
+        return list(_track_steps(solver, bass_line, chord_types, start, end, []))
+    except ValueError:
+        return None
+
+
 class Harmonizer:
     """Main class for four-part harmony generation."""
     
-    def __init__(self, beam_width: int = 10):
+    def __init__(self, beam_width: int = 10, per_node_beam_size: Optional[int] = None,
+                 n_workers: int = 1, track_candidates: bool = True):
         """
         Initialize harmonizer.
         
         Args:
             beam_width: beam width for beam search
+            per_node_beam_size: previous solutions each candidate is checked
+                against for parallels (None for the whole beam)
+            n_workers: worker processes that solve segments of long bass
+                lines in parallel (1 solves in this process)
+            track_candidates: keep each step's candidates for explanations;
+                when False, nothing is kept and harmonize explains nothing
         """
-        self.solver = BeamSearchSolver(beam_width=beam_width)
+        self.solver = BeamSearchSolver(beam_width=beam_width, per_node_beam_size=per_node_beam_size)
+        self.n_workers = n_workers
+        self.track_candidates = track_candidates
         self.explanation_engine = ExplanationEngine()
         self.all_candidates_per_step = []  # For explanations
     
-    def harmonize(self, input_file: str, output_file: Optional[str] = None,
+    def harmonize(self, input_file: Union[str, IO[bytes]], output_file: Optional[str] = None,
                  chord_types: Optional[List[str]] = None) -> HarmonizationResult:
         """
         Generates four-part harmony based on bass line.
         
         Args:
-            input_file: path to input MusicXML file with bass line
+            input_file: path to input MusicXML file with bass line, or the
+                file opened in binary mode (e.g. io.BytesIO)
             output_file: path to output MusicXML file (optional)
             chord_types: list of chord types for each step
         
@@ -81,17 +133,19 @@ class Harmonizer:
                 )
             
             # Generate explanations
-            explanations_text = self.explanation_engine.generate_full_explanation(
-                [Solution(voices=s, score=0.0, violations=[]) for s in solutions],
-                self.all_candidates_per_step
-            )
+            explanations_text = ""
+            if self.track_candidates:
+                explanations_text = self.explanation_engine.generate_full_explanation(
+                    [Solution(voices=s, score=0.0, violations=[]) for s in solutions],
+                    self.all_candidates_per_step
+                )
             
             # Export result
             if output_file:
                 # Convert solution list to export format
-                all_voices = {voice: [] for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]}
+                all_voices = {voice: [] for voice in ALL_VOICES}
                 for solution_dict in solutions:
-                    for voice in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
+                    for voice in ALL_VOICES:
                         all_voices[voice].append(solution_dict.get(voice, 0))
                 
                 export_to_musicxml(all_voices, output_file)
@@ -113,33 +167,51 @@ class Harmonizer:
     def _solve_with_tracking(self, bass_line: List[int], 
                             chord_types: Optional[List[str]] = None) -> List[Dict[Voice, int]]:
         """Solves the problem while tracking all candidates for explanations."""
+        # _track_steps treats steps past the end of chord_types as major
         if chord_types is None:
-            chord_types = ["major"] * len(bass_line)
+            chord_types = ()
         
-        prev_solutions = []
-        all_solutions = []
-        self.all_candidates_per_step = []
+        if self.n_workers > 1 and len(bass_line) >= 2 * _MIN_SEGMENT_LENGTH:
+            steps = self._solve_segments_in_parallel(bass_line, chord_types)
+        else:
+            steps = list(_track_steps(self.solver, bass_line, chord_types, 0, len(bass_line), []))
         
-        for i, bass_note in enumerate(bass_line):
-            chord_type = chord_types[i] if i < len(chord_types) else "major"
-            
-            # Generate solutions
-            solutions = self.solver.solve_step(bass_note, prev_solutions, chord_type)
-            self.all_candidates_per_step.append(solutions)
-            
-            if not solutions:
-                if prev_solutions:
-                    prev_voices = prev_solutions[0].voices.copy()
-                    prev_voices[Voice.BASS] = bass_note
-                    solutions = [Solution(voices=prev_voices, score=100.0, violations=[])]
-                else:
-                    raise ValueError(f"No valid solution found for step {i}")
+        self.all_candidates_per_step = ([solutions for solutions, _ in steps]
+                                        if self.track_candidates else [])
+        return [beam[0].voices for _, beam in steps]
+    
+    def _solve_segments_in_parallel(self, bass_line: List[int],
+                                    chord_types: Sequence[str]) -> List[Tuple[List[Solution], List[Solution]]]:
+        """
+        Solves the steps of _track_steps over the whole bass line, with
+        segments of it solved in worker processes.
+        
+        Each worker starts its segment from an empty beam. Here, the
+        segment's first steps are solved again after the previous segment's
+        beam until the beam agrees with the worker's; every later step only
+        depends on that beam, so the rest of the worker's steps are taken
+        as they are and the result matches a sequential solve.
+        """
+        n = len(bass_line)
+        segment_length = max(_MIN_SEGMENT_LENGTH, -(-n // self.n_workers))
+        bounds = [(start, min(start + segment_length, n)) for start in range(0, n, segment_length)]
+        
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            # The first segment starts from the empty beam anyway
+            futures = [pool.submit(_solve_segment, self.solver, bass_line, chord_types, start, end)
+                       for start, end in bounds[1:]]
+            steps = list(_track_steps(self.solver, bass_line, chord_types, *bounds[0], []))
             
-            best_solution = solutions[0]
-            all_solutions.append(best_solution.voices)
-            prev_solutions = solutions
+            for (start, end), future in zip(bounds[1:], futures):
+                segment = future.result() or []
+                for i, step in enumerate(_track_steps(self.solver, bass_line, chord_types,
+                                                      start, end, steps[-1][1])):
+                    steps.append(step)
+                    if i < len(segment) and step == segment[i]:
+                        steps.extend(segment[i + 1:])
+                        break
         
-        return all_solutions
+        return steps
 
 
 if __name__ == "__main__":
@@ -1,9 +1,13 @@
 """
 Utilities for musical representation.
 """
-from typing import List, Tuple, Optional
+from typing import IO, List, Tuple, Optional, Dict, NamedTuple, Union
 from music21 import note, chord, stream, pitch, interval
 from enum import Enum
+from fractions import Fraction
+import re
+import xml.etree.ElementTree as ET
+from functools import lru_cache
 
 
 class Voice(Enum):
@@ -14,6 +18,11 @@ class Voice(Enum):
     BASS = "B"
 
 
+# Voices from top to bottom; module-level so loops don't rebuild the list
+ALL_VOICES: Tuple[Voice, ...] = (Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS)
+UPPER_VOICES: Tuple[Voice, ...] = (Voice.SOPRANO, Voice.ALTO, Voice.TENOR)
+
+
 # Voice ranges (MIDI notes)
 VOICE_RANGES = {
     Voice.SOPRANO: (60, 84),  # C4-C6
@@ -22,6 +31,65 @@ VOICE_RANGES = {
     Voice.BASS: (40, 60),      # E2-C4
 }
 
+# Each voice range as a set of MIDI notes: bit n is set when note n is in range
+VOICE_RANGE_MASKS: Dict[Voice, int] = {
+    voice: (1 << (max_note + 1)) - (1 << min_note)
+    for voice, (min_note, max_note) in VOICE_RANGES.items()
+}
+
+
+def in_voice_range(voice: Voice, midi: int) -> bool:
+    """Whether a MIDI note lies within the voice's range, as one bit test."""
+    return midi >= 0 and (VOICE_RANGE_MASKS[voice] >> midi) & 1 == 1
+
+
+# Positions of the voices in a VoiceVec
+S_IDX, A_IDX, T_IDX, B_IDX = range(4)
+
+
+class VoiceVec(NamedTuple):
+    """Fixed-layout chord: one MIDI note per voice, None for a missing voice."""
+    s: Optional[int]
+    a: Optional[int]
+    t: Optional[int]
+    b: Optional[int]
+    
+    @classmethod
+    def from_dict(cls, voices: Dict[Voice, int]) -> "VoiceVec":
+        """Builds a VoiceVec from a {Voice: midi} dict."""
+        get = voices.get
+        return cls(get(Voice.SOPRANO), get(Voice.ALTO), get(Voice.TENOR), get(Voice.BASS))
+    
+    def to_dict(self) -> Dict[Voice, int]:
+        """Converts back to a {Voice: midi} dict, leaving out missing voices."""
+        return {
+            voice: midi
+            for voice, midi in zip(ALL_VOICES, self)
+            if midi is not None
+        }
+
+
+# Lookup tables for the hot constraint checks. PC_TABLE is indexed by MIDI
+# note and the interval tables by the difference of two notes; negative
+# indices wrap around from the end, so both cover every pair of MIDI notes
+# (and then some) without any bounds checks. Notes must be MIDI note
+# numbers (0-127); the API rejects anything else before it gets here.
+PC_TABLE: Tuple[int, ...] = tuple(n % 12 for n in range(264))
+INTERVAL_CLASS: Tuple[int, ...] = tuple(abs(d if d < 256 else d - 512) % 12 for d in range(512))
+IS_P5: Tuple[bool, ...] = tuple(ic == 7 for ic in INTERVAL_CLASS)
+IS_P8: Tuple[bool, ...] = tuple(ic == 0 for ic in INTERVAL_CLASS)
+IS_DISSONANT: Tuple[bool, ...] = tuple(ic in (1, 2, 6, 10, 11) for ic in INTERVAL_CLASS)
+
+# Interval names indexed by interval class
+INTERVAL_NAMES: Tuple[str, ...] = (
+    "P1", "m2", "M2", "m3", "M3", "P4", "TT", "P5", "m6", "M6", "m7", "M7"
+)
+
+# Note names indexed by pitch class
+PITCH_CLASS_NAMES: Tuple[str, ...] = (
+    "C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"
+)
+
 
 def midi_to_pitch_class(midi: int) -> int:
     """Converts MIDI note number to pitch class (0-11)."""
@@ -30,42 +98,40 @@ def midi_to_pitch_class(midi: int) -> int:
 
 def pitch_class_to_name(pc: int) -> str:
     """Converts pitch class to note name."""
-    names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    return names[pc]
+    return PITCH_CLASS_NAMES[pc]
 
 
 def midi_to_note_name(midi: int) -> str:
     """Convert MIDI note to note name (e.g., 60 -> 'C4')."""
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
     octave = (midi // 12) - 1
-    note = note_names[midi % 12]
-    return f"{note}{octave}"
+    return f"{PITCH_CLASS_NAMES[midi % 12]}{octave}"
+
+
+# Pitch class of each note name note_name_to_midi accepts, sharps and flats
+_NOTE_NAME_PCS: Dict[str, int] = {
+    **{name: pc for pc, name in enumerate(PITCH_CLASS_NAMES)},
+    "Db": 1, "Eb": 3, "Gb": 6, "Ab": 8, "Bb": 10,
+}
+
+_NOTE_NAME_RE = re.compile(r'([A-G]#?b?)(-?\d+)')
 
 
 def note_name_to_midi(name: str) -> int:
-    """Convert note name to MIDI (e.g., 'C4' -> 60, 'Db4' -> 61)."""
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    flat_to_sharp = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
-    
-    # Parse note name (e.g., "C4", "C#4", "Db4")
-    import re
-    match = re.match(r'([A-G]#?b?)(\d+)', name)
+    """Convert note name to MIDI (e.g., 'C4' -> 60, 'Db4' -> 61, 'C-1' -> 0).
+
+    Octave -1 is the lowest MIDI octave, so its names (as written by
+    midi_to_note_name) read back to notes 0-11.
+    """
+    # Parse note name (e.g., "C4", "C#4", "Db4", "C-1")
+    match = _NOTE_NAME_RE.match(name)
     if not match:
         return 60  # Default to C4
     
-    note_name = match.group(1)
-    octave = int(match.group(2))
-    
-    # Handle flats
-    if note_name in flat_to_sharp:
-        note_name = flat_to_sharp[note_name]
-    
-    # Find note index
-    if note_name in note_names:
-        note_index = note_names.index(note_name)
-    else:
+    note_index = _NOTE_NAME_PCS.get(match.group(1))
+    if note_index is None:
         return 60  # Default to C4
     
+    octave = int(match.group(2))
     return (octave + 1) * 12 + note_index
 
 
@@ -76,34 +142,145 @@ def get_interval_semitones(note1: int, note2: int) -> int:
 
 def get_interval_type(note1: int, note2: int) -> Optional[str]:
     """Determines interval type (P5, P8, M3, etc.)."""
-    semitones = get_interval_semitones(note1, note2) % 12
-    interval_map = {
-        0: "P1", 1: "m2", 2: "M2", 3: "m3", 4: "M3",
-        5: "P4", 6: "TT", 7: "P5", 8: "m6", 9: "M6",
-        10: "m7", 11: "M7"
-    }
-    return interval_map.get(semitones)
+    return INTERVAL_NAMES[INTERVAL_CLASS[note1 - note2]]
 
 
 def is_perfect_fifth(note1: int, note2: int) -> bool:
     """Checks if interval is a perfect fifth."""
-    return get_interval_semitones(note1, note2) % 12 == 7
+    return IS_P5[note1 - note2]
 
 
 def is_perfect_octave(note1: int, note2: int) -> bool:
     """Checks if interval is a perfect octave."""
-    return get_interval_semitones(note1, note2) % 12 == 0
+    return IS_P8[note1 - note2]
+
+
+# Semitones above C of each MusicXML <step>
+_STEP_SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+
+def _group_by_offset(notes: List[Tuple[float, int]]) -> List[Tuple[float, List[int]]]:
+    """Groups (offset, midi) pairs sorted by offset into (offset, [midi, ...]) time steps."""
+    time_steps = []
+    for offset, midi in notes:
+        if time_steps and time_steps[-1][0] == offset:
+            time_steps[-1][1].append(midi)
+        else:
+            time_steps.append((offset, [midi]))
+    return time_steps
+
+
+def _part_notes(part) -> Optional[List[Tuple[float, int]]]:
+    """
+    (offset in quarter notes, midi) of every pitched note of a <part>, in
+    offset order; None if the part uses anything the fast parser doesn't
+    handle (grace notes, unpitched notes, microtonal alterations, divisions
+    that aren't positive, or more than one staff, whose notes would be
+    merged into one line).
+    """
+    notes = []
+    divisions = 1
+    measure_start = Fraction(0)
+    for measure in part.iter("measure"):
+        position = last_onset = Fraction(0)
+        measure_end = Fraction(0)
+        for element in measure:
+            if element.tag == "attributes":
+                divisions_text = element.findtext("divisions")
+                if divisions_text:
+                    divisions = int(divisions_text)
+                    if divisions <= 0:
+                        return None
+                # music21 splits a grand staff into one part per staff
+                if int(element.findtext("staves", "1")) > 1:
+                    return None
+            elif element.tag in ("backup", "forward"):
+                duration = Fraction(int(element.findtext("duration", "0")), divisions)
+                position += duration if element.tag == "forward" else -duration
+            elif element.tag == "note":
+                if element.find("grace") is not None or element.find("unpitched") is not None:
+                    return None
+                
+                # Chord notes sound with the previous note
+                onset = last_onset if element.find("chord") is not None else position
+                
+                pitch_element = element.find("pitch")
+                if pitch_element is not None:
+                    alter = float(pitch_element.findtext("alter", "0"))
+                    if not alter.is_integer():
+                        return None
+                    octave = int(pitch_element.findtext("octave"))
+                    midi = ((octave + 1) * 12 + _STEP_SEMITONES[pitch_element.findtext("step").strip()]
+                            + int(alter))
+                    notes.append((measure_start + onset, midi))
+                
+                if element.find("chord") is None:
+                    last_onset = position
+                    position += Fraction(int(element.findtext("duration", "0")), divisions)
+            measure_end = max(measure_end, position)
+        measure_start += measure_end
+    
+    notes.sort(key=lambda item: item[0])
+    return [(float(offset), midi) for offset, midi in notes]
+
+
+def _fast_parse_musicxml(filename: Union[str, IO[bytes]]) -> Optional[List[Tuple[float, List[int]]]]:
+    """
+    Reads the time steps of parse_musicxml straight from an uncompressed
+    partwise MusicXML file, without building a music21 score.
+    
+    Parts are parsed one at a time and discarded, keeping only the last.
+    
+    Returns:
+        Same as parse_musicxml, or None when the file isn't in a shape this
+        parser handles (the caller then falls back to music21)
+    """
+    try:
+        last_part = None
+        root_checked = False
+        for event, element in ET.iterparse(filename, events=("start", "end")):
+            if event == "start":
+                if not root_checked:
+                    if element.tag != "score-partwise":
+                        return None
+                    root_checked = True
+                continue
+            if element.tag == "part":
+                last_part = _part_notes(element)
+                if last_part is None:
+                    return None
+                element.clear()
+    except (ET.ParseError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    
+    if last_part is None:
+        return None
+    return _group_by_offset(last_part)
 
 
-def parse_musicxml(filename: str) -> List[Tuple[int, List[int]]]:
+def parse_musicxml(filename: Union[str, IO[bytes]]) -> List[Tuple[int, List[int]]]:
     """
     Parses MusicXML file and returns sequence of chords.
     
+    Plain partwise MusicXML is read directly; other files go through music21.
+    
+    Args:
+        filename: path of the file, or a seekable binary file object
+    
     Returns:
         List of (time_step, [bass_midi, ...]) tuples
     """
+    time_steps = _fast_parse_musicxml(filename)
+    if time_steps is not None:
+        return time_steps
+    
     from music21 import converter
-    score = converter.parse(filename)
+    if isinstance(filename, str):
+        score = converter.parse(filename)
+    else:
+        # The fast parser has read some of the file already
+        filename.seek(0)
+        score = converter.parseData(filename.read(), format="musicxml")
     
     # Extract bass line (lowest voice)
     parts = score.parts
@@ -117,7 +294,7 @@ def parse_musicxml(filename: str) -> List[Tuple[int, List[int]]]:
     current_time = 0
     current_notes = []
     
-    for element in bass_part.flat.notes:
+    for element in bass_part.flatten().notes:
         if element.offset > current_time:
             if current_notes:
                 time_steps.append((current_time, [n.pitch.midi for n in current_notes]))
@@ -135,6 +312,44 @@ def parse_musicxml(filename: str) -> List[Tuple[int, List[int]]]:
     return time_steps
 
 
+# Intervals above the root of each chord type, root position
+CHORD_INTERVALS: Dict[str, Tuple[int, ...]] = {
+    "major": (0, 4, 7),
+    "minor": (0, 3, 7),
+    "diminished": (0, 3, 6),
+    "augmented": (0, 4, 8),
+    "dominant7": (0, 4, 7, 10),
+    "major7": (0, 4, 7, 11),
+    "minor7": (0, 3, 7, 10),
+    "half_diminished7": (0, 3, 6, 10),
+    "fully_diminished7": (0, 3, 6, 9),
+}
+
+
+# Pitch-class mask of each chord type on C: bit i is set for each interval i
+CHORD_MASKS: Dict[str, int] = {
+    chord_type: sum(1 << interval for interval in intervals)
+    for chord_type, intervals in CHORD_INTERVALS.items()
+}
+
+
+def _rotate_mask(mask: int, semitones: int) -> int:
+    """Transposes a 12-bit pitch-class mask up by 0-11 semitones."""
+    return ((mask << semitones) | (mask >> (12 - semitones))) & 0xFFF
+
+
+# Chord tones depend only on the root's pitch class and the chord type,
+# and the solver asks for the same few chords at every step
+@lru_cache(maxsize=512)
+def _chord_tones_cached(root_pc: int, chord_type: str) -> Tuple[Tuple[int, ...], int]:
+    """Chord tone pitch classes and their 12-bit pitch-class mask."""
+    # Unknown chord types are treated as major
+    if chord_type not in CHORD_INTERVALS:
+        chord_type = "major"
+    tones = tuple((root_pc + interval) % 12 for interval in CHORD_INTERVALS[chord_type])
+    return tones, _rotate_mask(CHORD_MASKS[chord_type], root_pc)
+
+
 def get_chord_tones(root: int, chord_type: str = "major", inversion: int = 0) -> List[int]:
     """
     Returns chord tones in pitch class.
@@ -148,34 +363,16 @@ def get_chord_tones(root: int, chord_type: str = "major", inversion: int = 0) ->
     Returns:
         List of pitch classes that can be used in the chord
     """
-    root_pc = midi_to_pitch_class(root)
-    
-    # Base chord tones (root position)
-    if chord_type == "major":
-        tones = [root_pc, (root_pc + 4) % 12, (root_pc + 7) % 12]
-    elif chord_type == "minor":
-        tones = [root_pc, (root_pc + 3) % 12, (root_pc + 7) % 12]
-    elif chord_type == "diminished":
-        tones = [root_pc, (root_pc + 3) % 12, (root_pc + 6) % 12]
-    elif chord_type == "augmented":
-        tones = [root_pc, (root_pc + 4) % 12, (root_pc + 8) % 12]
-    elif chord_type == "dominant7":
-        tones = [root_pc, (root_pc + 4) % 12, (root_pc + 7) % 12, (root_pc + 10) % 12]
-    elif chord_type == "major7":
-        tones = [root_pc, (root_pc + 4) % 12, (root_pc + 7) % 12, (root_pc + 11) % 12]
-    elif chord_type == "minor7":
-        tones = [root_pc, (root_pc + 3) % 12, (root_pc + 7) % 12, (root_pc + 10) % 12]
-    elif chord_type == "half_diminished7":
-        tones = [root_pc, (root_pc + 3) % 12, (root_pc + 6) % 12, (root_pc + 10) % 12]
-    elif chord_type == "fully_diminished7":
-        tones = [root_pc, (root_pc + 3) % 12, (root_pc + 6) % 12, (root_pc + 9) % 12]
-    else:
-        tones = [root_pc, (root_pc + 4) % 12, (root_pc + 7) % 12]
-    
-    # Apply inversion - for inversions, we still allow all chord tones
-    # but the bass note indicates the inversion
-    # The function returns all possible chord tones that can be used
-    return tones
+    # Inversions still allow all chord tones; the bass note indicates the
+    # inversion, so the result does not depend on it
+    tones, _ = _chord_tones_cached(midi_to_pitch_class(root), chord_type)
+    return list(tones)
+
+
+def chord_tones_mask(root: int, chord_type: str = "major") -> int:
+    """Chord tones of get_chord_tones as a 12-bit pitch-class set (bit pc set per tone)."""
+    _, mask = _chord_tones_cached(midi_to_pitch_class(root), chord_type)
+    return mask
 
 
 def get_chord_inversion(bass_note: int, root: int, chord_type: str = "major") -> int:
@@ -191,52 +388,121 @@ def get_chord_inversion(bass_note: int, root: int, chord_type: str = "major") ->
         Inversion number (0 = root, 1 = first, 2 = second, 3 = third)
     """
     bass_pc = midi_to_pitch_class(bass_note)
-    root_pc = midi_to_pitch_class(root)
+    tones, mask = _chord_tones_cached(midi_to_pitch_class(root), chord_type)
     
-    tones = get_chord_tones(root, chord_type, 0)
+    # If bass note is not a chord tone, assume root position
+    if not (mask >> bass_pc) & 1:
+        return 0
     
-    # Find which chord tone is in the bass
-    if bass_pc == tones[0]:
-        return 0  # Root position
-    elif len(tones) > 1 and bass_pc == tones[1]:
-        return 1  # First inversion
-    elif len(tones) > 2 and bass_pc == tones[2]:
-        return 2  # Second inversion
-    elif len(tones) > 3 and bass_pc == tones[3]:
-        return 3  # Third inversion
+    # Otherwise the inversion is the position of the bass in the chord tones
+    return tones.index(bass_pc)
+
+
+# (step, alter) of each pitch class, spelled the way music21 spells a
+# pitch set from a MIDI number
+_PITCH_CLASS_SPELLINGS: Tuple[Tuple[str, int], ...] = (
+    ("C", 0), ("C", 1), ("D", 0), ("E", -1), ("E", 0), ("F", 0),
+    ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("B", -1), ("B", 0)
+)
+
+# Part name and (sign, line, octave change) of the clef of each voice
+_EXPORT_PARTS = {
+    Voice.SOPRANO: ("Soprano", ("G", 2, 0)),
+    Voice.ALTO: ("Alto", ("G", 2, 0)),
+    Voice.TENOR: ("Tenor", ("G", 2, -1)),
+    Voice.BASS: ("Bass", ("F", 4, 0)),
+}
+
+_BEATS_PER_MEASURE = 4
+
+
+def _note_xml(midi: int) -> str:
+    """One quarter note of the directly written MusicXML."""
+    step, alter = _PITCH_CLASS_SPELLINGS[midi % 12]
+    alter_xml = f"<alter>{alter}</alter>" if alter else ""
+    return (f"<note><pitch><step>{step}</step>{alter_xml}<octave>{midi // 12 - 1}</octave></pitch>"
+            f"<duration>1</duration><voice>1</voice><type>quarter</type></note>")
+
+
+def _part_xml(part_id: str, clef: Tuple[str, int, int], midi_notes: List[int]) -> str:
+    """A part of 4/4 measures of quarter notes, the last measure filled up with a rest."""
+    sign, line, octave_change = clef
+    clef_xml = f"<clef><sign>{sign}</sign><line>{line}</line>"
+    if octave_change:
+        clef_xml += f"<clef-octave-change>{octave_change}</clef-octave-change>"
+    clef_xml += "</clef>"
+    attributes = (f"<attributes><divisions>1</divisions><key><fifths>0</fifths></key>"
+                  f"<time><beats>{_BEATS_PER_MEASURE}</beats><beat-type>4</beat-type></time>"
+                  f"{clef_xml}</attributes>")
     
-    # If bass note is not a chord tone, assume root position
-    return 0
+    measures = []
+    for start in range(0, max(len(midi_notes), 1), _BEATS_PER_MEASURE):
+        beats = midi_notes[start:start + _BEATS_PER_MEASURE]
+        body = "".join(map(_note_xml, beats))
+        missing = _BEATS_PER_MEASURE - len(beats)
+        if missing:
+            body += f"<note><rest/><duration>{missing}</duration><voice>1</voice></note>"
+        number = start // _BEATS_PER_MEASURE + 1
+        measures.append(f'<measure number="{number}">{attributes if number == 1 else ""}{body}</measure>')
+    return f'<part id="{part_id}">{"".join(measures)}</part>'
+
+
+def _write_quarter_note_musicxml(voices: dict, output_file: str) -> bool:
+    """
+    Writes the four parts of export_to_musicxml directly as partwise MusicXML.
+    
+    Returns:
+        False, without writing anything, when a voice holds something other
+        than MIDI note numbers (the caller then goes through music21)
+    """
+    lines = [voices.get(voice_enum, []) for voice_enum in ALL_VOICES]
+    if not all(type(midi) is int and 0 <= midi <= 127 for line in lines for midi in line):
+        return False
+    
+    part_list = "".join(
+        f'<score-part id="P{i}"><part-name>{_EXPORT_PARTS[voice_enum][0]}</part-name></score-part>'
+        for i, voice_enum in enumerate(ALL_VOICES, 1)
+    )
+    parts = "".join(
+        _part_xml(f"P{i}", _EXPORT_PARTS[voice_enum][1], line)
+        for i, (voice_enum, line) in enumerate(zip(ALL_VOICES, lines), 1)
+    )
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" '
+                '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+                f'<score-partwise version="3.1"><part-list>{part_list}</part-list>{parts}</score-partwise>\n')
+    return True
 
 
 def export_to_musicxml(voices: dict, output_file: str):
     """
     Exports four-part harmony to MusicXML.
     
+    MIDI note lines are written directly as quarter notes in 4/4; anything
+    else goes through music21.
+    
     Args:
         voices: dict {Voice: List[int]} - MIDI notes for each voice
         output_file: path to output file
     """
-    score = stream.Score()
+    if _write_quarter_note_musicxml(voices, output_file):
+        return
     
-    voice_names = {
-        Voice.SOPRANO: "Soprano",
-        Voice.ALTO: "Alto",
-        Voice.TENOR: "Tenor",
-        Voice.BASS: "Bass"
-    }
+    score = stream.Score()
     
-    for voice_enum in [Voice.SOPRANO, Voice.ALTO, Voice.TENOR, Voice.BASS]:
+    for voice_enum in ALL_VOICES:
         part = stream.Part()
-        part.id = voice_names[voice_enum]
+        part.id = _EXPORT_PARTS[voice_enum][0]
         
+        # Notes are built up front and appended to the part in one call
+        notes = []
         for midi_note in voices.get(voice_enum, []):
-            n = note.Note()
+            n = note.Note(quarterLength=1.0)  # Default quarter note
             n.pitch.midi = midi_note
-            n.quarterLength = 1.0  # Default quarter note
-            part.append(n)
+            notes.append(n)
+        part.append(notes)
         
         score.append(part)
     
     score.write('musicxml', output_file)
-
@@ -1,44 +1,126 @@
 """
 Solver for four-part harmony generation (beam search).
 """
-from typing import List, Dict, Optional, Tuple
-from music_utils import Voice, VOICE_RANGES, get_chord_tones, midi_to_pitch_class
-from constraints import ConstraintChecker, SoftConstraintScorer
-from dataclasses import dataclass
+from typing import List, Dict, Iterator, Optional, Tuple
+import heapq
+from operator import itemgetter
+from itertools import chain, repeat
+from functools import lru_cache
+from music_utils import Voice, ALL_VOICES, VOICE_RANGES, chord_tones_mask, midi_to_pitch_class
+from constraints import (
+    ConstraintChecker, ConstraintViolation, SoftConstraintScorer, MOTION_SCORE, pack_voices, total_score_kernel
+)
+from dataclasses import dataclass, field
 
 
-@dataclass
+# Candidate notes depend only on the voice, the bass pitch class and the
+# chord type, and every step asks for them again for each voice
+@lru_cache(maxsize=512)
+def _candidate_notes(voice: Voice, bass_pc: int, chord_type: str) -> Tuple[int, ...]:
+    """MIDI notes in the voice's range that are tones of the chord over bass_pc."""
+    min_note, max_note = VOICE_RANGES[voice]
+    
+    tones_mask = chord_tones_mask(bass_pc, chord_type)
+    return tuple(
+        midi for midi in range(min_note, max_note + 1)
+        if (tones_mask >> (midi % 12)) & 1
+    )
+
+
+# Motion costs depend on the bass motion only through its direction, so
+# there are a few hundred tables at most, and steps keep asking for them
+@lru_cache(maxsize=1024)
+def _motion_costs(prev_note: Optional[int], bass_direction: int) -> Tuple[float, ...]:
+    """
+    Voice motion and contrary motion part of total_score_kernel for one
+    upper voice, indexed by its new MIDI note.
+    
+    Args:
+        prev_note: the voice's previous note (None costs nothing)
+        bass_direction: sign of the bass motion (-1, 0 or 1)
+    """
+    if prev_note is None:
+        return (0.0,) * 128
+    costs = []
+    for midi in range(128):
+        motion = midi - prev_note
+        cost = MOTION_SCORE[abs(motion)]
+        if prev_note and bass_direction and motion:
+            cost += -2.0 if (bass_direction * motion) < 0 else 2.0
+        costs.append(cost)
+    return tuple(costs)
+
+
+def _ordered_voicings(s_candidates: List[int], a_candidates: List[int],
+                      t_candidates: List[int], bass_note: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yields the (soprano, alto, tenor) combinations that pass the chord's
+    hard constraints, in the order of the full triple loop.
+    
+    The candidates are already within their voice ranges, which leaves
+    voice order (S >= A >= T >= B) and spacing (S-A and A-T at most an
+    octave); each is tested at the outermost loop it depends on, so a
+    failing soprano-alto pair never reaches the tenor loop.
+    """
+    for s_note in s_candidates:
+        for a_note in a_candidates:
+            if a_note > s_note or s_note - a_note > 12:
+                continue
+            for t_note in t_candidates:
+                if t_note > a_note or a_note - t_note > 12 or t_note < bass_note:
+                    continue
+                yield s_note, a_note, t_note
+
+
+# The voicings that pass the chord's own hard constraints only depend on the
+# bass note and the chord type, which repeat across a piece; only the
+# checks against the previous chord differ from step to step
+@lru_cache(maxsize=1024)
+def _step_voicings(bass_note: int, chord_type: str) -> Tuple[Tuple[int, int, int], ...]:
+    """The (soprano, alto, tenor) voicings of _ordered_voicings over one bass note."""
+    bass_pc = midi_to_pitch_class(bass_note)
+    return tuple(_ordered_voicings(
+        _candidate_notes(Voice.SOPRANO, bass_pc, chord_type),
+        _candidate_notes(Voice.ALTO, bass_pc, chord_type),
+        _candidate_notes(Voice.TENOR, bass_pc, chord_type),
+        bass_note
+    ))
+
+
+@dataclass(slots=True)
 class Solution:
     """Solution for one time step."""
     voices: Dict[Voice, int]
     score: float
     violations: List
+    # Hard violations of the chord itself (range, voice order, spacing)
+    # found when it was generated; None when it was never checked
+    hard_violations: Optional[Tuple[ConstraintViolation, ...]] = None
+    # voices packed as an (S, A, T, B) tuple by the solver that built it;
+    # None when unknown (use pack_voices on voices instead)
+    packed: Optional[Tuple[int, int, int, int]] = field(default=None, repr=False, compare=False)
 
 
 class BeamSearchSolver:
     """Beam search solver."""
     
-    def __init__(self, beam_width: int = 10):
+    def __init__(self, beam_width: int = 10, per_node_beam_size: Optional[int] = None):
+        """
+        Args:
+            beam_width: number of solutions kept per step
+            per_node_beam_size: number of the previous step's best solutions
+                a candidate is checked against for parallels (None for all
+                of them); the chosen line only ever follows the best one
+        """
         self.beam_width = beam_width
+        self.per_node_beam_size = per_node_beam_size
         self.constraint_checker = ConstraintChecker()
         self.scorer = SoftConstraintScorer()
     
     def generate_candidate_notes(self, voice: Voice, bass_note: int, 
                                  chord_type: str = "major") -> List[int]:
         """Generates candidates for voice based on chord."""
-        candidates = []
-        min_note, max_note = VOICE_RANGES[voice]
-        
-        # Get chord tones
-        chord_tones_pc = get_chord_tones(bass_note, chord_type)
-        
-        # Generate all possible notes in voice range
-        for midi in range(min_note, max_note + 1):
-            pc = midi_to_pitch_class(midi)
-            if pc in chord_tones_pc:
-                candidates.append(midi)
-        
-        return candidates
+        return list(_candidate_notes(voice, midi_to_pitch_class(bass_note), chord_type))
     
     def solve_step(self, bass_note: int, prev_solutions: List[Solution],
                   chord_type: str = "major") -> List[Solution]:
@@ -57,108 +139,98 @@ class BeamSearchSolver:
             # First step - generate initial solutions
             return self._solve_first_step(bass_note, chord_type)
         
-        # Generate all possible combinations for three upper voices
-        s_candidates = self.generate_candidate_notes(Voice.SOPRANO, bass_note, chord_type)
-        a_candidates = self.generate_candidate_notes(Voice.ALTO, bass_note, chord_type)
-        t_candidates = self.generate_candidate_notes(Voice.TENOR, bass_note, chord_type)
-        
-        solutions = []
-        
-        # Iterate through all combinations
-        for s_note in s_candidates:
-            for a_note in a_candidates:
-                for t_note in t_candidates:
-                    curr_voices = {
-                        Voice.SOPRANO: s_note,
-                        Voice.ALTO: a_note,
-                        Voice.TENOR: t_note,
-                        Voice.BASS: bass_note
-                    }
-                    
-                    # Check hard constraints
-                    violations = []
-                    
-                    # Check for each voice
-                    for voice, note_val in curr_voices.items():
-                        if voice != Voice.BASS:  # Bass already checked
-                            vs = self.constraint_checker.check_all_hard_constraints(
-                                voice, note_val, None, curr_voices
-                            )
-                            violations.extend(vs)
-                    
-                    # Check parallelisms with previous step
-                    for prev_sol in prev_solutions:
-                        parallel_violations = self.constraint_checker.check_parallels(
-                            prev_sol.voices, curr_voices
-                        )
-                        violations.extend(parallel_violations)
-                    
-                    # If there are hard violations, skip
-                    hard_violations = [v for v in violations if v.severity == "hard"]
-                    if hard_violations:
-                        continue
-                    
-                    # Calculate score
-                    prev_voices = prev_solutions[0].voices if prev_solutions else None
-                    bass_motion = bass_note - prev_voices[Voice.BASS] if prev_voices else 0
-                    
-                    root_pc = midi_to_pitch_class(bass_note)
-                    score = self.scorer.total_score(
-                        prev_voices, curr_voices, bass_motion, root_pc
-                    )
-                    
-                    solutions.append(Solution(
-                        voices=curr_voices,
-                        score=score,
-                        violations=violations
-                    ))
-        
-        # Sort by score and return best
-        solutions.sort(key=lambda s: s.score)
-        return solutions[:self.beam_width]
+        # The previous beam is packed once for all candidates of the step,
+        # cut to the solutions candidates are checked against
+        prev_chords = [prev_sol.packed or pack_voices(prev_sol.voices)
+                       for prev_sol in prev_solutions[:self.per_node_beam_size]]
+        
+        # Score inputs shared by every candidate of the step, scored
+        # against the best previous chord
+        prev_chord = prev_chords[0]
+        bass_motion = bass_note - prev_solutions[0].voices[Voice.BASS]
+        root_pc = midi_to_pitch_class(bass_note)
+        parallels_mask = self.constraint_checker.parallels_mask
+        
+        # The combinations of the three upper voices that keep voice order
+        # and spacing, with a lower bound of each one's score: the motion
+        # part of the score, less 1 for the best doubling score (the
+        # spacing score is never negative)
+        voicings = _step_voicings(bass_note, chord_type)
+        bass_direction = (bass_motion > 0) - (bass_motion < 0)
+        s_motion, a_motion, t_motion = (
+            _motion_costs(prev_chord[i], bass_direction) for i in range(3)
+        )
+        bounds = [s_motion[s_note] + a_motion[a_note] + t_motion[t_note] - 1.0
+                  for s_note, a_note, t_note in voicings]
+        
+        # Candidates are tried from the lowest bound up, keeping the scores
+        # of the beam_width best so far negated in a max-heap; once a bound
+        # is above the worst of them, no later candidate can make the beam
+        beam_width = self.beam_width
+        beam = []
+        cutoff = float("inf")
+        passed = []  # (voicing index, score, packed chord)
+        
+        for k in sorted(range(len(voicings)), key=bounds.__getitem__):
+            if bounds[k] > cutoff:
+                break
+            
+            s_note, a_note, t_note = voicings[k]
+            curr = (s_note, a_note, t_note, bass_note)
+            
+            # Check parallelisms with previous step as RuleCode masks; any
+            # set bit rejects the chord, so the scan stops at the first one
+            if any(parallels_mask(prev, curr) for prev in prev_chords):
+                continue
+            
+            # Calculate score on the packed chords
+            score = total_score_kernel(prev_chord, curr, bass_motion, root_pc, None)
+            passed.append((k, score, curr))
+            
+            if len(beam) < beam_width:
+                heapq.heappush(beam, -score)
+                if len(beam) == beam_width:
+                    cutoff = -beam[0]
+            elif score < cutoff:
+                heapq.heapreplace(beam, -score)
+                cutoff = -beam[0]
+        
+        # Back in voicing order, so that equal scores rank as in a full scan
+        passed.sort(key=itemgetter(0))
+        scores = [score for _, score, _ in passed]
+        chords = [curr for _, _, curr in passed]
+        
+        return self._best_solutions(scores, chords)
     
     def _solve_first_step(self, bass_note: int, chord_type: str) -> List[Solution]:
         """Solves first time step."""
-        s_candidates = self.generate_candidate_notes(Voice.SOPRANO, bass_note, chord_type)
-        a_candidates = self.generate_candidate_notes(Voice.ALTO, bass_note, chord_type)
-        t_candidates = self.generate_candidate_notes(Voice.TENOR, bass_note, chord_type)
-        
-        solutions = []
-        
-        for s_note in s_candidates:
-            for a_note in a_candidates:
-                for t_note in t_candidates:
-                    curr_voices = {
-                        Voice.SOPRANO: s_note,
-                        Voice.ALTO: a_note,
-                        Voice.TENOR: t_note,
-                        Voice.BASS: bass_note
-                    }
-                    
-                    # Check hard constraints
-                    violations = []
-                    for voice, note_val in curr_voices.items():
-                        if voice != Voice.BASS:
-                            vs = self.constraint_checker.check_all_hard_constraints(
-                                voice, note_val, None, curr_voices
-                            )
-                            violations.extend(vs)
-                    
-                    hard_violations = [v for v in violations if v.severity == "hard"]
-                    if hard_violations:
-                        continue
-                    
-                    # For first step score = 0 (no motion)
-                    score = self.scorer.total_score(None, curr_voices, 0, midi_to_pitch_class(bass_note))
-                    
-                    solutions.append(Solution(
-                        voices=curr_voices,
-                        score=score,
-                        violations=violations
-                    ))
-        
-        solutions.sort(key=lambda s: s.score)
-        return solutions[:self.beam_width]
+        root_pc = midi_to_pitch_class(bass_note)
+        chords = [(s_note, a_note, t_note, bass_note)
+                  for s_note, a_note, t_note in _step_voicings(bass_note, chord_type)]
+        # For first step score = 0 (no motion)
+        scores = [total_score_kernel(None, curr, 0, root_pc, None) for curr in chords]
+        
+        return self._best_solutions(scores, chords)
+    
+    def _best_solutions(self, scores: List[float],
+                        chords: List[Tuple[int, int, int, int]]) -> List[Solution]:
+        """
+        Keeps the beam_width best-scoring packed chords as Solutions.
+        
+        Equivalent to a stable sort by score cut to the beam width, but
+        only selects the top indices and only builds their Solutions.
+        """
+        best = heapq.nsmallest(self.beam_width, range(len(scores)), key=scores.__getitem__)
+        return [
+            Solution(
+                voices=dict(zip(ALL_VOICES, chords[i])),
+                score=scores[i],
+                violations=[],
+                hard_violations=(),
+                packed=chords[i]
+            )
+            for i in best
+        ]
     
     def solve(self, bass_line: List[int], chord_types: Optional[List[str]] = None) -> List[Dict[Voice, int]]:
         """
@@ -171,14 +243,14 @@ class BeamSearchSolver:
         Returns:
             List of solutions for each time step
         """
-        if chord_types is None:
-            chord_types = ["major"] * len(bass_line)
+        # Steps past the end of chord_types (all of them when it is None)
+        # are major
+        step_chord_types = chain(chord_types or (), repeat("major"))
         
         prev_solutions = []
         all_solutions = []
         
-        for i, bass_note in enumerate(bass_line):
-            chord_type = chord_types[i] if i < len(chord_types) else "major"
+        for i, (bass_note, chord_type) in enumerate(zip(bass_line, step_chord_types)):
             solutions = self.solve_step(bass_note, prev_solutions, chord_type)
             
             if not solutions:
@@ -1,27 +1,79 @@
 """
 Integration tests for backend API.
 """
+import asyncio
 import unittest
-from fastapi.testclient import TestClient
-from backend.main import app
+from unittest import mock
+import fakeredis
+import httpx
+import pytest
 
 
+# Request sent for each endpoint test, as (path, JSON body)
+REQUESTS = {
+    "harmonize": ("/api/harmonize", {
+        "bass_line": [48, 50, 52, 48],
+        "figured_bass": ["", "", "", ""],
+        "chord_types": ["major", "minor", "major", "major"]
+    }),
+    "harmonize_melody": ("/api/harmonize-melody", {
+        "melody": [60, 62, 64, 65, 67],
+        "chord_types": ["major", "minor", "major", "major", "major"]
+    }),
+    "export_pdf": ("/api/export-pdf", {
+        "voices": [
+            {"S": 72, "A": 67, "T": 60, "B": 48},
+            {"S": 74, "A": 69, "T": 62, "B": 50}
+        ],
+        "settings": {
+            "title": "Test Exercise",
+            "key_signature": "C"
+        }
+    }),
+    # Notes outside the MIDI range
+    "invalid_note": ("/api/check-errors", {
+        "voices": [{"S": 200, "A": 67, "T": 60, "B": 48}]
+    }),
+    "invalid_bass_note": ("/api/harmonize", {
+        "bass_line": [48, -3],
+        "chord_types": ["major", "major"]
+    }),
+    # Invalid bass line
+    "error_handling": ("/api/harmonize", {
+        "bass_line": [],
+        "figured_bass": [],
+        "chord_types": []
+    }),
+}
+
+
+async def _post_all(app):
+    """Sends every request in REQUESTS at once, within one run of the app's lifespan."""
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(*(
+                client.post(path, json=data) for path, data in REQUESTS.values()
+            ))
+    return dict(zip(REQUESTS, responses))
+
+
+# Starts the whole app; deselected by default (see pytest.ini)
+@pytest.mark.slow
 class TestBackendAPI(unittest.TestCase):
     """Test backend API endpoints."""
 
-    def setUp(self):
-        """Set up test client."""
-        self.client = TestClient(app)
+    @classmethod
+    def setUpClass(cls):
+        """Send the requests of all tests concurrently; each test checks its response."""
+        # Imported here so that collecting the tests doesn't load the app
+        from backend.main import app
+        cls.responses = asyncio.run(_post_all(app))
 
     def test_harmonize_endpoint(self):
         """Test /api/harmonize endpoint."""
-        request_data = {
-            "bass_line": [48, 50, 52, 48],
-            "figured_bass": ["", "", "", ""],
-            "chord_types": ["major", "minor", "major", "major"]
-        }
-        
-        response = self.client.post("/api/harmonize", json=request_data)
+        _, request_data = REQUESTS["harmonize"]
+        response = self.responses["harmonize"]
         
         self.assertEqual(response.status_code, 200)
         data = response.json()
@@ -31,12 +83,7 @@ class TestBackendAPI(unittest.TestCase):
 
     def test_harmonize_melody_endpoint(self):
         """Test /api/harmonize-melody endpoint."""
-        request_data = {
-            "melody": [60, 62, 64, 65, 67],
-            "chord_types": ["major", "minor", "major", "major", "major"]
-        }
-        
-        response = self.client.post("/api/harmonize-melody", json=request_data)
+        response = self.responses["harmonize_melody"]
         
         self.assertEqual(response.status_code, 200)
         data = response.json()
@@ -44,36 +91,77 @@ class TestBackendAPI(unittest.TestCase):
 
     def test_export_pdf_endpoint(self):
         """Test /api/export-pdf endpoint."""
-        request_data = {
-            "voices": [
-                {"S": 72, "A": 67, "T": 60, "B": 48},
-                {"S": 74, "A": 69, "T": 62, "B": 50}
-            ],
-            "settings": {
-                "title": "Test Exercise",
-                "key_signature": "C"
-            }
-        }
-        
-        response = self.client.post("/api/export-pdf", json=request_data)
+        response = self.responses["export_pdf"]
         
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.headers["content-type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF-"))
+
+    def test_invalid_midi_notes(self):
+        """Test that notes outside 0-127 are rejected as invalid input."""
+        for name in ("invalid_note", "invalid_bass_note"):
+            with self.subTest(request=name):
+                self.assertEqual(self.responses[name].status_code, 422)
 
     def test_error_handling(self):
         """Test error handling for invalid requests."""
-        # Invalid bass line
-        request_data = {
-            "bass_line": [],
-            "figured_bass": [],
-            "chord_types": []
-        }
-        
-        response = self.client.post("/api/harmonize", json=request_data)
+        response = self.responses["error_handling"]
         # Should handle gracefully
         self.assertIn(response.status_code, [200, 400, 422, 500])
 
 
+
+# Starts the whole app; deselected by default (see pytest.ini)
+@pytest.mark.slow
+class TestHarmonizeStepCache(unittest.TestCase):
+    """Test that /api/harmonize resumes from the cached steps of a shorter bass line."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Import the app and its cache (see TestBackendAPI.setUpClass)."""
+        from backend import cache, main
+        cls.cache = cache
+        cls.main = main
+
+    def harmonize(self, redis_client, bass_line):
+        """
+        Posts bass_line with redis_client as the cache and an empty local
+        LRU; returns the response and the number of steps solved.
+        """
+        async def post():
+            transport = httpx.ASGITransport(app=self.main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await client.post("/api/harmonize", json={"bass_line": bass_line, "chord_types": []})
+        
+        self.cache._L1.clear()
+        solver = self.main.SOLVER
+        with mock.patch.object(self.cache, "redis_client", redis_client), \
+                mock.patch.object(solver, "solve_step", wraps=solver.solve_step) as solve_step:
+            response = asyncio.run(post())
+        self.assertEqual(response.status_code, 200)
+        return response, solve_step.call_count
+
+    def test_resume_from_cached_prefix(self):
+        """Test that an extended bass line only solves the steps past its cached prefix."""
+        interval = self.main.STEP_CACHE_INTERVAL
+        short = ([48, 50, 52, 53, 55, 57, 59, 60] * interval)[:2 * interval + 3]
+        extended = short + [55, 53, 52, 50, 48]
+        redis_client = fakeredis.FakeAsyncRedis()
+        
+        response, steps_solved = self.harmonize(redis_client, short)
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertEqual(steps_solved, len(short))
+        # One entry per whole interval of steps
+        step_keys = asyncio.run(redis_client.keys(f"{self.cache.STEP_KEY_PREFIX}*"))
+        self.assertEqual(len(step_keys), 2)
+        
+        response, steps_solved = self.harmonize(redis_client, extended)
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertEqual(steps_solved, len(extended) - 2 * interval)
+        
+        fresh_response, _ = self.harmonize(fakeredis.FakeAsyncRedis(), extended)
+        self.assertEqual(response.json()["voices"], fresh_response.json()["voices"])
+
+
 if __name__ == '__main__':
     unittest.main()
-
@@ -0,0 +1,168 @@
+"""
+Unit tests for backend cache module.
+"""
+import asyncio
+import unittest
+from unittest import mock
+import fakeredis
+from backend import cache
+from backend.cache import (
+    cache_key, step_cache_keys, get_by_key, set_by_key, mget_by_keys, mset_by_keys,
+    STEP_KEY_PREFIX
+)
+
+
+class TestCacheKey(unittest.TestCase):
+    """Test cache key generation."""
+
+    def test_key_is_deterministic(self):
+        """Test that equal parameters produce equal keys regardless of order."""
+        key1 = cache_key("harmonize", bass_line=[48, 50, 52], chord_types=["major"])
+        key2 = cache_key("harmonize", chord_types=["major"], bass_line=[48, 50, 52])
+        self.assertEqual(key1, key2)
+        self.assertTrue(key1.startswith("harmony:"))
+
+    def test_key_distinguishes_parameters(self):
+        """Test that different parameters produce different keys."""
+        base = cache_key("harmonize", bass_line=[48, 50], chord_types=[])
+        self.assertNotEqual(base, cache_key("harmonize", bass_line=[48, 51], chord_types=[]))
+        self.assertNotEqual(base, cache_key("harmonize", bass_line=[48, 50], chord_types=["major"]))
+        self.assertNotEqual(base, cache_key("melody", bass_line=[48, 50], chord_types=[]))
+
+
+class TestStepCacheKeys(unittest.TestCase):
+    """Test cache keys for the prefixes of a bass line."""
+
+    def test_keys_identify_prefixes(self):
+        """Test that a prefix gets the same key within any longer bass line."""
+        keys = step_cache_keys("harmonize_step", [48, 50, 52, 53], ["major", "minor"])
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(len(set(keys)), 4)
+        self.assertTrue(all(key.startswith(STEP_KEY_PREFIX) for key in keys))
+        self.assertEqual(step_cache_keys("harmonize_step", [48, 50, 52], ["major", "minor"]), keys[:3])
+        self.assertEqual(step_cache_keys("harmonize_step", [48, 50], ["major", "minor", "major"]), keys[:2])
+
+    def test_keys_distinguish_steps(self):
+        """Test that a different note, chord type or operation changes the key from that step on."""
+        keys = step_cache_keys("harmonize_step", [48, 50, 52], ["major", "minor", "major"])
+        other = step_cache_keys("harmonize_step", [48, 51, 52], ["major", "minor", "major"])
+        self.assertEqual(other[0], keys[0])
+        self.assertNotEqual(other[1], keys[1])
+        self.assertNotEqual(other[2], keys[2])
+        self.assertNotEqual(step_cache_keys("harmonize_step", [48, 50, 52], ["major", "major", "major"])[1],
+                            keys[1])
+        self.assertNotEqual(step_cache_keys("melody_step", [48], ["major"])[0], keys[0])
+
+    def test_interval(self):
+        """Test that keys are only made for every interval-th prefix."""
+        bass_line = list(range(40, 50))
+        keys = step_cache_keys("harmonize_step", bass_line, [])
+        self.assertEqual(step_cache_keys("harmonize_step", bass_line, [], interval=4), [keys[3], keys[7]])
+
+
+class TestLocalCache(unittest.TestCase):
+    """Test the process-local LRU in front of Redis."""
+
+    def setUp(self):
+        """Use a Redis that fails every command and an empty local LRU."""
+        server = fakeredis.FakeServer()
+        server.connected = False
+        for patcher in (mock.patch.object(cache, "redis_client", fakeredis.FakeAsyncRedis(server=server)),
+                        mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache._L1.clear()
+        self.addCleanup(cache._L1.clear)
+
+    def test_hit_without_redis(self):
+        """Test that a written solution is read back from the LRU while Redis fails."""
+        key = cache_key("harmonize", bass_line=[48])
+        
+        async def check():
+            missed = await get_by_key(key)
+            await set_by_key(key, {"voices": [1]})
+            return missed, await get_by_key(key)
+        
+        self.assertEqual(asyncio.run(check()), (None, {"voices": [1]}))
+
+    def test_eviction_order(self):
+        """Test that the least recently used entry is evicted first."""
+        keys = [cache_key("harmonize", bass_line=[48 + i]) for i in range(3)]
+        with mock.patch.object(cache, "L1_CACHE_SIZE", 2):
+            cache._l1_put(keys[0], {"voices": [0]})
+            cache._l1_put(keys[1], {"voices": [1]})
+            # Reading the first key makes the second the least recently used
+            self.assertEqual(cache._l1_get(keys[0]), {"voices": [0]})
+            cache._l1_put(keys[2], {"voices": [2]})
+        self.assertEqual(list(cache._L1), [keys[0], keys[2]])
+        self.assertIsNone(cache._l1_get(keys[1]))
+
+    def test_step_entries_bypass_lru(self):
+        """Test that step entries are not kept in the LRU."""
+        step_key = step_cache_keys("harmonize_step", [48], [])[0]
+        asyncio.run(mset_by_keys([(step_key, {"voices": []})]))
+        self.assertNotIn(step_key, cache._L1)
+
+
+class TestBatchCache(unittest.TestCase):
+    """Test pipelined cache reads and writes against an in-memory Redis."""
+
+    def setUp(self):
+        """Use a fresh fake Redis and an empty local LRU."""
+        self.redis = fakeredis.FakeAsyncRedis()
+        patcher = mock.patch.object(cache, "redis_client", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache._L1.clear()
+        self.addCleanup(cache._L1.clear)
+
+    def test_mset_then_mget(self):
+        """Test that solutions written in one pipeline read back from Redis in another."""
+        items = [(cache_key("harmonize", bass_line=[48 + i]), {"voices": [i]}) for i in range(3)]
+        missing_key = cache_key("harmonize", bass_line=[60])
+        
+        async def check():
+            await mset_by_keys(items, ttl=60)
+            # Read from Redis, not from the LRU filled by the write
+            cache._L1.clear()
+            results = await mget_by_keys([key for key, _ in items] + [missing_key])
+            ttl = await self.redis.ttl(items[0][0])
+            return results, ttl
+        
+        results, ttl = asyncio.run(check())
+        self.assertEqual(results, [solution for _, solution in items] + [None])
+        self.assertGreater(ttl, 0)
+        self.assertLessEqual(ttl, 60)
+
+    def test_mget_skips_keys_in_lru(self):
+        """Test that keys found in the local LRU are not requested from Redis."""
+        key = cache_key("harmonize", bass_line=[48])
+        cache._l1_put(key, {"voices": []})
+        
+        async def check():
+            with mock.patch.object(self.redis, "pipeline") as pipeline:
+                results = await mget_by_keys([key])
+            return results, pipeline.called
+        
+        results, pipeline_called = asyncio.run(check())
+        self.assertEqual(results, [{"voices": []}])
+        self.assertFalse(pipeline_called)
+
+    def test_redis_unavailable(self):
+        """Test that batch reads miss and batch writes return when Redis fails."""
+        server = fakeredis.FakeServer()
+        server.connected = False
+        key = cache_key("harmonize", bass_line=[48])
+        
+        async def check():
+            with mock.patch.object(cache, "redis_client", fakeredis.FakeAsyncRedis(server=server)):
+                await mset_by_keys([(key, {"voices": []})])
+                cache._L1.clear()
+                return await mget_by_keys([key])
+        
+        with mock.patch("builtins.print"):
+            self.assertEqual(asyncio.run(check()), [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,16 +2,53 @@
 Unit tests for constraints module.
 """
 import unittest
-from constraints import ConstraintChecker, ConstraintViolation
+from types import MappingProxyType
+from constraints import ConstraintChecker, ConstraintViolation, RuleCode, SoftConstraintScorer
 from music_utils import Voice
 
 
+# Voices shared by the tests, read-only so that no test can change them
+# for another; tests that need to change one copy it with dict()
+
+# Well-spaced C major chord in root position
+C_MAJOR = MappingProxyType({Voice.SOPRANO: 72, Voice.ALTO: 67, Voice.TENOR: 60, Voice.BASS: 48})
+
+# C major to D minor with soprano and bass in octaves: G-E-C-C to A-F-D-D
+C_MAJOR_TO_D_MINOR = (
+    MappingProxyType({Voice.SOPRANO: 67, Voice.ALTO: 64, Voice.TENOR: 60, Voice.BASS: 48}),
+    MappingProxyType({Voice.SOPRANO: 69, Voice.ALTO: 65, Voice.TENOR: 62, Voice.BASS: 50}),
+)
+
+# (check method, previous voices, current voices, rule expected to be found)
+TRANSITION_SCENARIOS = [
+    # C-A-F-C to F-D-Bb-F: soprano and tenor a fifth apart in both chords
+    ("check_parallel_fifths",
+     MappingProxyType({Voice.SOPRANO: 60, Voice.ALTO: 57, Voice.TENOR: 53, Voice.BASS: 48}),
+     MappingProxyType({Voice.SOPRANO: 65, Voice.ALTO: 62, Voice.TENOR: 58, Voice.BASS: 53}),
+     "parallel_fifths"),
+    # Soprano and bass move C to E an octave apart
+    ("check_parallel_octaves",
+     MappingProxyType({Voice.SOPRANO: 60, Voice.BASS: 48}),
+     MappingProxyType({Voice.SOPRANO: 64, Voice.BASS: 52}),
+     "parallel_octaves"),
+]
+
+# (check method, voices, expected rule name or None)
+CHORD_SCENARIOS = [
+    ("check_spacing", C_MAJOR, None),
+    ("check_voice_order", C_MAJOR, None),
+    # Soprano below alto
+    ("check_voice_order", MappingProxyType({**C_MAJOR, Voice.SOPRANO: 55}), "voice_crossing"),
+]
+
+
 class TestConstraints(unittest.TestCase):
     """Test constraint checking functions."""
 
-    def setUp(self):
-        """Set up test fixtures."""
-        self.checker = ConstraintChecker()
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures once; no test depends on state left by another."""
+        cls.checker = ConstraintChecker()
 
     def test_check_voice_range(self):
         """Test voice range validation."""
@@ -23,70 +60,55 @@ class TestConstraints(unittest.TestCase):
         violation = self.checker.check_voice_range(Voice.SOPRANO, 50)  # Too low
         self.assertIsNotNone(violation)
         self.assertEqual(violation.rule_name, "voice_range")
+        self.assertEqual(violation.rule_kind, RuleCode.VOICE_RANGE)
         self.assertEqual(violation.severity, "hard")
 
-    def test_check_parallel_fifths(self):
-        """Test parallel fifths detection."""
-        prev_voices = {
-            Voice.SOPRANO: 60,  # C
-            Voice.ALTO: 57,      # A
-            Voice.TENOR: 53,    # F
-            Voice.BASS: 48      # C
-        }
-        curr_voices = {
-            Voice.SOPRANO: 65,  # F
-            Voice.ALTO: 62,     # D
-            Voice.TENOR: 58,    # Bb
-            Voice.BASS: 53      # F
-        }
-        violations = self.checker.check_parallel_fifths(prev_voices, curr_voices)
-        # Should detect parallel fifths between voices if present
-        self.assertIsInstance(violations, list)
-
-    def test_check_parallel_octaves(self):
-        """Test parallel octaves detection."""
-        prev_voices = {
-            Voice.SOPRANO: 60,  # C
-            Voice.BASS: 48       # C (octave below)
-        }
-        curr_voices = {
-            Voice.SOPRANO: 64,  # E
-            Voice.BASS: 52       # E (octave below)
-        }
-        violations = self.checker.check_parallel_octaves(prev_voices, curr_voices)
-        # Should detect parallel octaves
-        self.assertIsInstance(violations, list)
-
-    def test_check_spacing(self):
-        """Test spacing validation."""
-        voices = {
-            Voice.SOPRANO: 72,
-            Voice.ALTO: 67,
-            Voice.TENOR: 60,
-            Voice.BASS: 48
-        }
-        violation = self.checker.check_spacing(voices)
-        # Should check proper spacing between adjacent voices
-        # Good spacing should return None
-        self.assertIsNone(violation)
+    def test_check_transitions(self):
+        """Test the two-chord checks on each scenario of TRANSITION_SCENARIOS."""
+        for check, prev_voices, curr_voices, expected in TRANSITION_SCENARIOS:
+            with self.subTest(check=check):
+                violations = getattr(self.checker, check)(prev_voices, curr_voices)
+                self.assertIsInstance(violations, list)
+                self.assertIn(expected, [v.rule_name for v in violations])
 
-    def test_check_voice_order(self):
-        """Test voice order validation."""
-        # Correct order
-        voices = {
-            Voice.SOPRANO: 72,
-            Voice.ALTO: 67,
-            Voice.TENOR: 60,
-            Voice.BASS: 48
-        }
-        violation = self.checker.check_voice_order(voices)
-        self.assertIsNone(violation)
+    def test_check_chords(self):
+        """Test the one-chord checks on each scenario of CHORD_SCENARIOS."""
+        for check, voices, expected in CHORD_SCENARIOS:
+            with self.subTest(check=check, voices=voices):
+                violation = getattr(self.checker, check)(voices)
+                if expected is None:
+                    self.assertIsNone(violation)
+                else:
+                    self.assertIsNotNone(violation)
+                    self.assertEqual(violation.rule_name, expected)
 
-        # Voice crossing
-        voices[Voice.SOPRANO] = 55  # Below alto
-        violation = self.checker.check_voice_order(voices)
-        self.assertIsNotNone(violation)
-        self.assertEqual(violation.rule_name, "voice_crossing")
+    def test_check_parallels_matches_individual_checks(self):
+        """Test that check_parallels reports the same violations as the three individual checks."""
+        prev_voices, curr_voices = C_MAJOR_TO_D_MINOR
+        expected = (self.checker.check_parallel_fifths(prev_voices, curr_voices)
+                    + self.checker.check_parallel_octaves(prev_voices, curr_voices)
+                    + self.checker.check_hidden_fifths_octaves(prev_voices, curr_voices))
+        violations = self.checker.check_parallels(prev_voices, curr_voices)
+        self.assertEqual(violations, expected)
+        self.assertIn("parallel_octaves", [v.rule_name for v in violations])
+
+    def test_hard_constraint_mask(self):
+        """Test that rule masks name the same rules as the violation lists."""
+        voices = dict(C_MAJOR)
+        voices[Voice.SOPRANO] = 55  # Below alto and out of range
+        mask = self.checker.hard_constraint_mask(Voice.SOPRANO, 55, voices)
+        self.assertEqual(mask, RuleCode.VOICE_RANGE | RuleCode.VOICE_CROSSING)
+        violations = self.checker.check_all_hard_constraints(Voice.SOPRANO, 55, None, voices)
+        self.assertEqual(RuleCode(mask).rule_names(), [v.rule_name for v in violations])
+
+        voices[Voice.SOPRANO] = 72
+        self.assertEqual(self.checker.hard_constraint_mask(Voice.SOPRANO, 72, voices), 0)
+
+    def test_score_large_voice_motion(self):
+        """Test that motions beyond the score table score like any large leap."""
+        scorer = SoftConstraintScorer()
+        self.assertEqual(scorer.score_voice_motion(0, 300), scorer.score_voice_motion(0, 12))
+        self.assertEqual(scorer.score_voice_motion(300, 0), 10.0)
 
 
 if __name__ == '__main__':
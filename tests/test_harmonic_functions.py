@@ -0,0 +1,32 @@
+"""
+Unit tests for harmonic_functions module.
+"""
+import dataclasses
+import unittest
+from harmonic_functions import parse_harmonic_function, HarmonicFunctionType
+
+
+class TestHarmonicFunctions(unittest.TestCase):
+    """Test harmonic function parsing."""
+
+    def test_parse_alterations(self):
+        """Test that alterations parse into hashable (interval, alteration) pairs."""
+        function = parse_harmonic_function("D{extra: 7; alterations: 5: <}")
+        self.assertEqual(function.func_type, HarmonicFunctionType.DOMINANT)
+        self.assertEqual(function.extra, (7,))
+        self.assertEqual(function.alterations, ((5, "<"),))
+        self.assertEqual(hash(function), hash(parse_harmonic_function("D{extra: 7; alterations: 5: <}")))
+        self.assertEqual(str(function), "D{extra: 7; alterations: 5: <}")
+
+
+    def test_cached_function_is_immutable(self):
+        """Test that the instance shared by repeated parses cannot be changed."""
+        function = parse_harmonic_function("T{alterations: 7: >}")
+        self.assertIs(parse_harmonic_function("T{alterations: 7: >}"), function)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            function.alterations = ()
+        self.assertIsInstance(function.alterations, tuple)
+
+
+if __name__ == '__main__':
+    unittest.main()
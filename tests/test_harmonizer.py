@@ -2,8 +2,7 @@
 Unit tests for harmonizer module.
 """
 import unittest
-import tempfile
-import os
+from pathlib import Path
 from harmonizer import Harmonizer, HarmonizationResult
 from music_utils import Voice, export_to_musicxml
 
@@ -11,57 +10,21 @@ from music_utils import Voice, export_to_musicxml
 class TestHarmonizer(unittest.TestCase):
     """Test Harmonizer class."""
 
-    def setUp(self):
-        """Set up test fixtures."""
-        self.harmonizer = Harmonizer()
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures once; no test depends on state left by another."""
+        cls.harmonizer = Harmonizer()
+        # Two-note bass line; harmonize only reads it
+        cls.fixture_path = str(Path(__file__).parent / "fixtures" / "minimal_bass.xml")
 
     def test_harmonize_bass_line(self):
         """Test bass line harmonization."""
-        # Create a temporary MusicXML file with bass line
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
-            temp_file = f.name
-            # Create minimal MusicXML
-            xml_content = '''<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" "http://www.musicxml.org/dtds/partwise.dtd">
-<score-partwise version="3.1">
-  <part-list>
-    <score-part id="P1">
-      <part-name>Bass</part-name>
-    </score-part>
-  </part-list>
-  <part id="P1">
-    <measure number="1">
-      <note>
-        <pitch>
-          <step>C</step>
-          <octave>3</octave>
-        </pitch>
-        <duration>1</duration>
-        <type>quarter</type>
-      </note>
-      <note>
-        <pitch>
-          <step>D</step>
-          <octave>3</octave>
-        </pitch>
-        <duration>1</duration>
-        <type>quarter</type>
-      </note>
-    </measure>
-  </part>
-</score-partwise>'''
-            f.write(xml_content)
+        result = self.harmonizer.harmonize(self.fixture_path)
         
-        try:
-            result = self.harmonizer.harmonize(temp_file)
-            
-            self.assertIsNotNone(result)
-            self.assertIsInstance(result, HarmonizationResult)
-            if result.success:
-                self.assertGreater(len(result.voices), 0)
-        finally:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
+        self.assertIsNotNone(result)
+        self.assertIsInstance(result, HarmonizationResult)
+        if result.success:
+            self.assertGreater(len(result.voices), 0)
 
     def test_harmonize_with_explanations(self):
         """Test harmonization with explanations."""
@@ -97,6 +60,37 @@ class TestHarmonizer(unittest.TestCase):
             self.assertIn(Voice.BASS, voices)
             self.assertEqual(voices[Voice.BASS], bass_note)
 
+    def test_parallel_solve_matches_sequential(self):
+        """Test that solving segments in worker processes gives the sequential result."""
+        bass_line = [48, 50, 52, 53, 55, 53, 52, 50] * 5
+        chord_types = ["major", "minor", "minor", "major", "dominant7", "major", "minor", "minor"] * 5
+        
+        expected = self.harmonizer._solve_with_tracking(bass_line, chord_types)
+        expected_candidates = self.harmonizer.all_candidates_per_step
+        
+        harmonizer = Harmonizer(n_workers=2)
+        self.assertEqual(harmonizer._solve_with_tracking(bass_line, chord_types), expected)
+        self.assertEqual(harmonizer.all_candidates_per_step, expected_candidates)
+
+    def test_untracked_candidates(self):
+        """Test that candidates are only kept when tracking is on."""
+        bass_line = [48, 50, 52, 48]
+        harmonizer = Harmonizer(track_candidates=False)
+        
+        self.assertEqual(harmonizer._solve_with_tracking(bass_line),
+                         self.harmonizer._solve_with_tracking(bass_line))
+        self.assertEqual(harmonizer.all_candidates_per_step, [])
+        self.assertEqual(len(self.harmonizer.all_candidates_per_step), len(bass_line))
+
+
+    def test_instances_share_no_state(self):
+        """Test that harmonizers keep their solver state and candidates to themselves."""
+        other = Harmonizer()
+        for attribute in ("solver", "explanation_engine", "all_candidates_per_step"):
+            with self.subTest(attribute=attribute):
+                self.assertIsNot(getattr(other, attribute), getattr(self.harmonizer, attribute))
+        self.assertIsNot(other.solver.constraint_checker, self.harmonizer.solver.constraint_checker)
+        self.assertIsNot(other.solver.scorer, self.harmonizer.solver.scorer)
 
 if __name__ == '__main__':
     unittest.main()
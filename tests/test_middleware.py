@@ -0,0 +1,133 @@
+"""
+Unit tests for backend middleware module.
+"""
+import asyncio
+import time
+import types
+import unittest
+from unittest import mock
+import fakeredis
+import httpx
+from fastapi import FastAPI
+from backend import cache, middleware
+from backend.middleware import ObservabilityMiddleware, _memory_request_count
+
+
+# Requests each client may make per window in these tests
+MAX_REQUESTS = 3
+
+
+def _make_app():
+    """A one-route app behind the rate-limiting middleware."""
+    app = FastAPI()
+    app.add_middleware(ObservabilityMiddleware, rate_limit=True)
+    
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+    
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+    
+    return app
+
+
+class RateLimitTestCase(unittest.TestCase):
+    """Shared set-up: a small limit, a controlled clock and an empty fallback store."""
+
+    # Whether Redis answers; when False, every Redis command fails
+    redis_available = False
+
+    @classmethod
+    def setUpClass(cls):
+        """Build the app once; no test depends on state left by another."""
+        cls.app = _make_app()
+
+    def setUp(self):
+        """Start each test at the beginning of a window with no requests counted."""
+        self.now = 6000.0
+        server = fakeredis.FakeServer()
+        server.connected = self.redis_available
+        self.redis = fakeredis.FakeAsyncRedis(server=server)
+        clock = types.SimpleNamespace(time=lambda: self.now, monotonic=time.monotonic)
+        for patcher in (
+            mock.patch.object(cache, "redis_client", self.redis),
+            mock.patch.object(middleware, "time", clock),
+            mock.patch.object(middleware, "rate_limit_max_requests", MAX_REQUESTS),
+            mock.patch.dict(middleware.rate_limit_store, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, path="/api/ping", ip="10.0.0.1"):
+        """Sends a GET request from a client IP and returns the status code."""
+        async def send():
+            transport = httpx.ASGITransport(app=self.app, client=(ip, 12345))
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await client.get(path)
+        
+        return asyncio.run(send()).status_code
+
+    def assert_limit(self, ip="10.0.0.1"):
+        """Asserts that the client gets MAX_REQUESTS responses, then a 429."""
+        for _ in range(MAX_REQUESTS):
+            self.assertEqual(self.get(ip=ip), 200)
+        self.assertEqual(self.get(ip=ip), 429)
+
+
+class TestRedisRateLimit(RateLimitTestCase):
+    """Test the fixed-window rate limit counted in Redis."""
+
+    redis_available = True
+
+    def test_limit_per_client(self):
+        """Test that each client is limited on its own, in a counter kept in Redis."""
+        self.assert_limit()
+        self.assertEqual(self.get(ip="10.0.0.2"), 200)
+        bucket = int(self.now // middleware.rate_limit_window)
+        self.assertEqual(asyncio.run(self.redis.get(f"rl:10.0.0.1:{bucket}")), b"4")
+        # The fallback store is not used while Redis works
+        self.assertEqual(len(middleware.rate_limit_store), 0)
+
+    def test_window_expiry(self):
+        """Test that the limit resets when the next window starts."""
+        self.assert_limit()
+        self.now += middleware.rate_limit_window
+        self.assertEqual(self.get(), 200)
+
+    def test_skipped_paths(self):
+        """Test that health checks are never limited."""
+        self.assert_limit()
+        self.assertEqual(self.get("/health"), 200)
+
+
+class TestMemoryRateLimit(RateLimitTestCase):
+    """Test the in-memory sliding window used while Redis is unavailable."""
+
+    def test_limit_and_expiry(self):
+        """Test the 429 threshold and that requests expire one window after they were made."""
+        self.assert_limit()
+        self.now += middleware.rate_limit_window - 1
+        self.assertEqual(self.get(), 429)
+        # Every counted request is now one window old
+        self.now += 1
+        self.assertEqual(self.get(), 200)
+        self.assertEqual(self.get(ip="10.0.0.2"), 200)
+
+    def test_rejected_requests_not_counted(self):
+        """Test that requests over the limit do not extend it."""
+        self.assert_limit()
+        self.assertEqual(len(middleware.rate_limit_store["10.0.0.1"]), MAX_REQUESTS)
+
+    def test_client_cap(self):
+        """Test that the least recently seen client is dropped past the client cap."""
+        with mock.patch.object(middleware, "rate_limit_max_clients", 2):
+            for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.3"):
+                _memory_request_count(ip, self.now)
+        self.assertEqual(list(middleware.rate_limit_store), ["10.0.0.1", "10.0.0.3"])
+        self.assertEqual(len(middleware.rate_limit_store["10.0.0.1"]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
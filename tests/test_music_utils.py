@@ -1,31 +1,71 @@
 """
 Unit tests for music_utils module.
 """
+import io
+import os
+import tempfile
 import unittest
+from pathlib import Path
+from music21 import converter
 from music_utils import (
     midi_to_note_name, note_name_to_midi, get_chord_tones,
-    get_chord_inversion, Voice
+    chord_tones_mask, get_chord_inversion, parse_musicxml, export_to_musicxml,
+    in_voice_range, Voice, VoiceVec, _fast_parse_musicxml
 )
 
 
+# Two parts; the last one has a chord, a rest and a flat across two measures
+TWO_PART_MUSICXML = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="3.1">
+  <part-list>
+    <score-part id="P1"><part-name>Top</part-name></score-part>
+    <score-part id="P2"><part-name>Bass</part-name></score-part>
+  </part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes><divisions>1</divisions></attributes>
+      <note><pitch><step>C</step><octave>5</octave></pitch><duration>4</duration></note>
+    </measure>
+  </part>
+  <part id="P2">
+    <measure number="1">
+      <attributes><divisions>2</divisions></attributes>
+      <note><pitch><step>C</step><octave>3</octave></pitch><duration>2</duration></note>
+      <note><chord/><pitch><step>G</step><octave>3</octave></pitch><duration>2</duration></note>
+      <note><rest/><duration>2</duration></note>
+      <note><pitch><step>B</step><alter>-1</alter><octave>2</octave></pitch><duration>4</duration></note>
+    </measure>
+    <measure number="2">
+      <note><pitch><step>F</step><octave>2</octave></pitch><duration>8</duration></note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+# (MIDI note, note name) pairs that convert into each other
+NOTE_NAMES = [(60, "C4"), (61, "C#4"), (69, "A4"), (21, "A0"), (108, "C8"), (0, "C-1"), (11, "B-1")]
+
+
 class TestMusicUtils(unittest.TestCase):
     """Test music utility functions."""
 
-    def test_midi_to_note_name(self):
-        """Test MIDI to note name conversion."""
-        self.assertEqual(midi_to_note_name(60), "C4")
-        self.assertEqual(midi_to_note_name(61), "C#4")
-        self.assertEqual(midi_to_note_name(69), "A4")
-        self.assertEqual(midi_to_note_name(21), "A0")
-        self.assertEqual(midi_to_note_name(108), "C8")
-
-    def test_note_name_to_midi(self):
-        """Test note name to MIDI conversion."""
-        self.assertEqual(note_name_to_midi("C4"), 60)
-        self.assertEqual(note_name_to_midi("C#4"), 61)
+    def test_note_name_conversions(self):
+        """Test MIDI to note name conversion and back on each row of NOTE_NAMES."""
+        for midi, name in NOTE_NAMES:
+            with self.subTest(midi=midi, name=name):
+                self.assertEqual(midi_to_note_name(midi), name)
+                self.assertEqual(note_name_to_midi(name), midi)
+        # Flats are read but never written
         self.assertEqual(note_name_to_midi("Db4"), 61)
-        self.assertEqual(note_name_to_midi("A4"), 69)
-        self.assertEqual(note_name_to_midi("A0"), 21)
+        # Octave -1 is read as such, not as octave 1 or the C4 default
+        self.assertEqual(note_name_to_midi("Db-1"), 1)
+
+    def test_note_name_round_trip(self):
+        """Test that every MIDI note reads back from its name."""
+        for midi in range(128):
+            with self.subTest(midi=midi):
+                self.assertEqual(note_name_to_midi(midi_to_note_name(midi)), midi)
 
     def test_get_chord_tones(self):
         """Test chord tone extraction."""
@@ -47,6 +87,15 @@ class TestMusicUtils(unittest.TestCase):
         self.assertIn(3, tones)  # Eb (pitch class)
         self.assertIn(6, tones)  # Gb (pitch class)
 
+    def test_chord_tones_mask(self):
+        """Test chord tones as a pitch-class bitmask."""
+        # G dominant seventh: G, B, D, F
+        self.assertEqual(chord_tones_mask(55, "dominant7"),
+                         (1 << 7) | (1 << 11) | (1 << 2) | (1 << 5))
+        # Returned lists are copies, not the cached tones
+        get_chord_tones(60, "major").append(1)
+        self.assertEqual(get_chord_tones(60, "major"), [0, 4, 7])
+
     def test_get_chord_inversion(self):
         """Test chord inversion detection."""
         # Root position (C major, bass is C)
@@ -58,6 +107,53 @@ class TestMusicUtils(unittest.TestCase):
         # Second inversion (C major, bass is G)
         self.assertEqual(get_chord_inversion(67, 60, "major"), 2)
 
+    def test_parse_musicxml(self):
+        """Test reading the last part of a MusicXML file as time steps."""
+        time_steps = parse_musicxml(io.BytesIO(TWO_PART_MUSICXML.encode()))
+        self.assertEqual(time_steps, [(0.0, [48, 55]), (2.0, [46]), (4.0, [41])])
+
+    def test_parse_grand_staff(self):
+        """Test that a two-staff part is read as music21 reads it: the lower staff only."""
+        fixture_path = str(Path(__file__).parent / "fixtures" / "grand_staff.xml")
+        # The fast parser leaves multi-staff parts to music21
+        self.assertIsNone(_fast_parse_musicxml(fixture_path))
+        
+        lower_staff = converter.parse(fixture_path).parts[-1]
+        expected = [(float(n.offset), [n.pitch.midi]) for n in lower_staff.flatten().notes]
+        self.assertEqual(expected, [(0.0, [48]), (1.0, [43])])
+        self.assertEqual(parse_musicxml(fixture_path), expected)
+
+    def test_fast_parse_unsupported_divisions(self):
+        """Test that the fast parser leaves files without positive divisions to music21."""
+        document = TWO_PART_MUSICXML.replace("<divisions>2</divisions>", "<divisions>0</divisions>")
+        self.assertIsNone(_fast_parse_musicxml(io.BytesIO(document.encode())))
+
+    def test_export_to_musicxml_round_trip(self):
+        """Test that exported voices read back as the bass line."""
+        voices = {
+            Voice.SOPRANO: [72, 74, 72, 71, 72],
+            Voice.ALTO: [67, 67, 66, 67, 67],
+            Voice.TENOR: [64, 62, 62, 62, 64],
+            Voice.BASS: [48, 47, 45, 43, 48],
+        }
+        with tempfile.NamedTemporaryFile(suffix=".musicxml", delete=False) as f:
+            temp_file = f.name
+        try:
+            export_to_musicxml(voices, temp_file)
+            time_steps = parse_musicxml(temp_file)
+        finally:
+            os.remove(temp_file)
+        self.assertEqual(time_steps, [(float(i), [midi]) for i, midi in enumerate(voices[Voice.BASS])])
+
+    def test_in_voice_range(self):
+        """Test the range bit test at and just past the ends of a range."""
+        # Bass range is E2-C4 (40-60)
+        self.assertTrue(in_voice_range(Voice.BASS, 40))
+        self.assertTrue(in_voice_range(Voice.BASS, 60))
+        self.assertFalse(in_voice_range(Voice.BASS, 39))
+        self.assertFalse(in_voice_range(Voice.BASS, 61))
+        self.assertFalse(in_voice_range(Voice.BASS, -1))
+
     def test_voice_enum(self):
         """Test Voice enum values."""
         self.assertEqual(Voice.SOPRANO.value, "S")
@@ -65,6 +161,13 @@ class TestMusicUtils(unittest.TestCase):
         self.assertEqual(Voice.TENOR.value, "T")
         self.assertEqual(Voice.BASS.value, "B")
 
+    def test_voice_vec_round_trip(self):
+        """Test conversion between voice dicts and VoiceVec."""
+        voices = {Voice.SOPRANO: 72, Voice.ALTO: 67, Voice.BASS: 48}
+        vec = VoiceVec.from_dict(voices)
+        self.assertEqual(vec, (72, 67, None, 48))
+        self.assertEqual(vec.to_dict(), voices)
+
 
 if __name__ == '__main__':
     unittest.main()
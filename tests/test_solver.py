@@ -9,9 +9,10 @@ from music_utils import Voice
 class TestSolver(unittest.TestCase):
     """Test harmony solver."""
 
-    def setUp(self):
-        """Set up test fixtures."""
-        self.solver = BeamSearchSolver()
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures once; no test depends on state left by another."""
+        cls.solver = BeamSearchSolver()
 
     def test_solve_step(self):
         """Test solving a single step."""
@@ -57,6 +58,15 @@ class TestSolver(unittest.TestCase):
         for i, sol in enumerate(solutions):
             self.assertEqual(sol.voices[Voice.BASS], bass_line[i])
 
+    def test_per_node_beam_size(self):
+        """Test that a step checks parallels only against the kept previous solutions."""
+        prev_solutions = self.solver.solve_step(48, [], "major")
+        solver = BeamSearchSolver(per_node_beam_size=1)
+        
+        narrow = solver.solve_step(50, prev_solutions, "minor")
+        self.assertEqual(narrow, solver.solve_step(50, prev_solutions[:1], "minor"))
+        self.assertGreater(len(narrow), 0)
+
 
 if __name__ == '__main__':
     unittest.main()